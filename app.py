@@ -1,64 +1,96 @@
 import os
 import sys
-import logging
-from logging.handlers import RotatingFileHandler
+
+import click
 
 from flask import Flask, jsonify, request, current_app
 from flask_smorest import Api 
-from werkzeug.exceptions import HTTPException, NotFound, BadRequest, Unauthorized, TooManyRequests, Conflict, UnprocessableEntity
-from models import db, migrate, bcrypt_obj, User
+from werkzeug.exceptions import HTTPException, NotFound, BadRequest, Unauthorized, TooManyRequests, Conflict, PreconditionFailed, UnprocessableEntity, ServiceUnavailable
+from models import db, migrate, bcrypt_obj, User, install_search_index, install_user_counter, install_change_log, add_version_column, add_user_autoincrement, install_user_indexes, normalize_emails, configure_sqlite_profile, apply_sqlite_pragmas
 from schemas import ma 
 from auth import configure_auth, jwt 
-from routes import configure_routes_smorest, limiter, cache
+from routes import configure_routes_smorest, limiter
+from caching import configure_cache
+from changes import configure_change_log
+from replicas import configure_replicas
+from hashing import hashing_pool
+from instrumentation import configure_instrumentation
+from structured_logging import configure_logging
+
+def bootstrap_database(app, seed_test_user=True):
+    """Preparação única do banco, idempotente: tabelas, índice de busca e usuário de teste.
+
+    Fica fora do `create_app()` para que cada worker do gunicorn suba sem tocar no banco
+    (sem corrida entre workers e sem o hash bcrypt do usuário de teste na partida).
+    """
+    with app.app_context():
+        os.makedirs(app.instance_path, exist_ok=True)
+        db.create_all() # Cria as tabelas se não existirem
+        with db.engine.begin() as connection:
+            add_version_column(connection) # Bancos criados antes do versionamento (ETag)
+            add_user_autoincrement(connection) # ... antes dos ids sem reutilização (recria `user`)
+            install_user_indexes(connection) # ... antes do índice de `name` (cursor com sort_by=name)
+            install_search_index(connection) # Bancos criados antes do índice de busca
+            install_user_counter(connection) # ... antes do contador de usuários
+            install_change_log(connection) # ... e antes do log de alterações
+            conflicting = normalize_emails(connection) # E-mails gravados antes da normalização
+        if conflicting:
+            current_app.logger.warning("%d e-mails diferem de outro só em maiúsculas e não foram normalizados.", conflicting)
+        if not seed_test_user:
+            return
+        # Adição usuário de teste
+        if not User.query.filter_by(email="test@example.com").first():
+            test_user = User(name="Test User", email="test@example.com")
+            test_user.set_password("password") # Definir uma senha para o usuário de teste
+            db.session.add(test_user)
+            db.session.commit()
+            current_app.logger.info("Usuário de teste 'test@example.com' criado.")
+        else:
+            current_app.logger.info("Usuário de teste 'test@example.com' já existe.")
 
 def create_app(config_object='config.Config'):
     """Cria e configura o aplicativo Flask."""
     app = Flask(__name__)
     app.config.from_object(config_object)
 
-    instance_path = os.path.join(app.root_path, 'instance')
-    if not os.path.exists(instance_path):
-        os.makedirs(instance_path)
-
-    # Configuração de Logging
-    if not app.debug and not app.testing:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/flask_crud.log', maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
+    # Configuração de Logging: JSON em arquivo por uma thread de fundo, sem bloquear as requisições
+    configure_logging(app)
 
     # Inicializa extensões Flask
+    configure_sqlite_profile(app) # Opções do engine (WAL, pragmas, pool) conforme SQLITE_PROFILE
     db.init_app(app)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.extensions['sqlite_profile']['pragmas'])
+        configure_instrumentation(app, db.engine) # Server-Timing e /metrics
+    configure_replicas(app) # Réplicas de leitura (SQLALCHEMY_REPLICA_URIS)
     migrate.init_app(app, db)
     bcrypt_obj.init_app(app) 
+    hashing_pool.init_app(app) # Pool de processos do bcrypt
     ma.init_app(app) 
     limiter.init_app(app)
-    cache.init_app(app)
+    configure_cache(app) # Cache de respostas e /cache/stats
     configure_auth(app) # Configura JWT
+    configure_change_log(app) # flask compact-changes
 
     api = Api(app, spec_kwargs={"openapi_version": app.config["OPENAPI_VERSION"]})
 
     @app.errorhandler(NotFound) 
     def handle_not_found_error(e):
         """Captura erros 404."""
-        current_app.logger.error(f"404 Not Found: {e.description}")
+        current_app.logger.error("404 Not Found: %s", e.description)
         return jsonify({'message': 'Recurso não encontrado', 'code': 404}), 404
 
     @app.errorhandler(BadRequest)
     def handle_bad_request_error(e):
         """Captura erros 400."""
-        current_app.logger.error(f"400 Bad Request: {e.description}")
+        current_app.logger.error("400 Bad Request: %s", e.description)
         errors_detail = e.messages if hasattr(e, 'messages') else e.description
         return jsonify({'message': 'Requisição inválida', 'errors': errors_detail, 'code': 400}), 400
 
     @app.errorhandler(Unauthorized) 
     def handle_unauthorized_error(e):
         """Captura erros 401."""
-        current_app.logger.error(f"401 Unauthorized: {e.description}")
+        current_app.logger.error("401 Unauthorized: %s", e.description)
         if e.response:
             return e.response, e.code
         return jsonify({'message': 'Autenticação inválida', 'errors': e.description, 'code': 401}), 401
@@ -66,26 +98,40 @@ def create_app(config_object='config.Config'):
     @app.errorhandler(UnprocessableEntity) 
     def handle_smorest_bad_request_error(e):
         """Captura erros 422."""
-        current_app.logger.error(f"422 Unprocessable Entity: {e.description}")
+        current_app.logger.error("422 Unprocessable Entity: %s", e.description)
         errors_detail = e.messages if hasattr(e, 'messages') else e.description
         return jsonify({'message': 'Dados de entrada inválidos', 'errors': errors_detail, 'code': 422}), 422
     
     @app.errorhandler(TooManyRequests) 
     def handle_too_many_requests_error(e):
         """Captura erros 429."""
-        current_app.logger.error(f"429 Too Many Requests: {e.description}")
+        current_app.logger.error("429 Too Many Requests: %s", e.description)
         return jsonify({'message': 'Muitas requisições', 'errors': e.description, 'code': 429}), 429
 
     @app.errorhandler(Conflict) 
     def handle_conflict_error(e):
         """Captura erros 409."""
-        current_app.logger.error(f"409 Conflict: {e.description}")
+        current_app.logger.error("409 Conflict: %s", e.description)
         return jsonify({'message': 'Conflito de recurso', 'errors': e.description, 'code': 409}), 409
 
+    @app.errorhandler(PreconditionFailed)
+    def handle_precondition_failed_error(e):
+        """Captura erros 412 (If-Match com uma versão desatualizada)."""
+        current_app.logger.warning("412 Precondition Failed: %s", e.description)
+        return jsonify({'message': 'Pré-condição falhou', 'errors': e.description, 'code': 412}), 412
+
+    @app.errorhandler(ServiceUnavailable) 
+    def handle_service_unavailable_error(e):
+        """Captura erros 503 (ex.: fila do bcrypt cheia)."""
+        current_app.logger.warning("503 Service Unavailable: %s", e.description)
+        response = jsonify({'message': 'Serviço temporariamente indisponível', 'errors': e.description, 'code': 503})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
     @app.errorhandler(HTTPException) 
     def handle_http_exception(e):
         """Captura erros HTTP."""
-        current_app.logger.error(f"HTTP Exception caught: {e.code} - {e.description}", exc_info=True)
+        current_app.logger.error("HTTP Exception caught: %s - %s", e.code, e.description, exc_info=True)
         if e.response:
             return e.response, e.code 
         return jsonify({
@@ -96,28 +142,23 @@ def create_app(config_object='config.Config'):
     @app.errorhandler(Exception) 
     def handle_generic_error(e):
         """Captura erros genéricos."""
-        current_app.logger.exception(f"Erro interno do servidor: {e}") # Loga a exceção completa
+        current_app.logger.exception("Erro interno do servidor: %s", e) # Loga a exceção completa
         return jsonify({'message': 'Ocorreu um erro interno no servidor', 'error': 'Erro inesperado'}), 500
 
 
     # Registra os Blueprints do Flask-Smorest
     configure_routes_smorest(api)
 
-    with app.app_context():
-        print(app.config['SQLALCHEMY_DATABASE_URI'])
-        db.create_all() # Cria as tabelas se não existirem
-        # Adição usuário de teste 
-        if not User.query.filter_by(email="test@example.com").first():
-            test_user = User(name="Test User", email="test@example.com")
-            test_user.set_password("password") # Definir uma senha para o usuário de teste
-            db.session.add(test_user)
-            db.session.commit()
-            current_app.logger.info("Usuário de teste 'test@example.com' criado.")
-        else:
-            current_app.logger.info("Usuário de teste 'test@example.com' já existe.")
+    @app.cli.command('bootstrap')
+    @click.option('--no-test-user', is_flag=True, help="Não cria o usuário de teste.")
+    def bootstrap_command(no_test_user):
+        """Cria as tabelas, o índice de busca e o usuário de teste (uma vez, antes de subir os workers)."""
+        click.echo(app.config['SQLALCHEMY_DATABASE_URI'])
+        bootstrap_database(app, seed_test_user=not no_test_user)
 
     return app
 
 if __name__ == '__main__':
     """Execução do aplicativo Flask."""
     app = create_app()
+    bootstrap_database(app)
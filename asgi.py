@@ -0,0 +1,361 @@
+"""Modo de implantação assíncrono (ASGI).
+
+Alternativa ao `create_app()` servido por workers síncronos do gunicorn: atende o mesmo contrato
+de `/login` e `/v1/users` com Starlette e uma engine SQLAlchemy assíncrona (aiosqlite), de modo que
+um worker continua atendendo outras requisições enquanto espera o SQLite ou o bcrypt. Reaproveita
+os schemas, as consultas de `queries.py`, os formatos de erro de `app.py`/`auth.py` e o mesmo
+formato de JWT do Flask-JWT-Extended (tokens valem nos dois modos). Execução:
+
+    uvicorn --factory asgi:create_asgi_app --workers 2
+
+A configuração vem de `APP_CONFIG` (padrão `config.Config`). Cache de respostas, rate limit e os
+endpoints adicionais da API Flask não fazem parte deste modo.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import jwt
+from marshmallow import EXCLUDE, ValidationError
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from werkzeug.utils import import_string
+
+import hashing
+import serializers
+from blocklist import token_blocklist
+from conditional import etag, not_modified, precondition_holds
+from models import User, normalize_email, sqlite_engine_profile, apply_sqlite_pragmas
+from queries import list_statement, total_statement, page_count, keyset_statement, keyset_page
+from schemas import UserSchema, UserInputSchema, UserQueryArgsSchema
+from serializers import selected_fields, dump_page
+
+logger = logging.getLogger('asgi')
+
+# Descrição padrão do 422 do webargs, repetida para manter o mesmo payload da API Flask
+UNPROCESSABLE_DESCRIPTION = "The request was well-formed but was unable to be followed due to semantic errors."
+CONFLICT_DESCRIPTION = ("409 Conflict: A conflict happened while processing the request. "
+                        "The resource might have been modified while the request was being processed.")
+
+class FlaskJSONResponse(Response):
+    """JSON serializado como o `jsonify` do Flask (chaves ordenadas, ASCII, compacto, com quebra de linha)."""
+    media_type = 'application/json'
+
+    def render(self, content):
+        return serializers.encode(content) or serializers.stdlib_encode(content)
+
+class ApiError(Exception):
+    """Erro com o mesmo payload e status dos handlers de app.py/auth.py."""
+
+    def __init__(self, status_code, payload, headers=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = headers
+
+def not_found():
+    return ApiError(404, {'message': 'Recurso não encontrado', 'code': 404})
+
+def unprocessable():
+    return ApiError(422, {'message': 'Dados de entrada inválidos', 'errors': UNPROCESSABLE_DESCRIPTION, 'code': 422})
+
+def precondition_failed():
+    return ApiError(412, {'message': 'Pré-condição falhou', 'code': 412,
+                          'errors': "O usuário foi alterado por outra requisição; obtenha a versão atual (ETag) e tente novamente."})
+
+def unauthorized(errors):
+    return ApiError(401, {'message': "Autenticação inválida", 'errors': errors, 'code': 401})
+
+class AsyncHasher:
+    """Versão assíncrona do pool de hashing.py: mesmo limite (`BCRYPT_POOL_SIZE + BCRYPT_QUEUE_DEPTH`)
+    e a mesma resposta 503 quando a fila enche, sem bloquear o event loop."""
+
+    def __init__(self, config):
+        self.size = config.get('BCRYPT_POOL_SIZE', 2)
+        self.depth = config.get('BCRYPT_QUEUE_DEPTH', 16)
+        self.timeout = config.get('BCRYPT_TIMEOUT', 10)
+        self.rounds = config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.handle_long_passwords = config.get('BCRYPT_HANDLE_LONG_PASSWORDS', False)
+        self.pending = 0
+        self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= max(self.size, 1) + self.depth:
+            raise ApiError(503, {'message': 'Serviço temporariamente indisponível',
+                                 'errors': "Fila de processamento de senhas cheia, tente novamente.", 'code': 503},
+                           headers={'Retry-After': '1'})
+        self.pending += 1
+        try:
+            for _ in range(2):
+                if self.size > 0 and self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.size,
+                                                         mp_context=multiprocessing.get_context(hashing.START_METHOD))
+                executor = self._executor
+                try:
+                    # Sem pool (BCRYPT_POOL_SIZE = 0) o bcrypt roda numa thread do executor padrão
+                    future = asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+                    return await asyncio.wait_for(future, self.timeout)
+                except BrokenProcessPool:
+                    # Um filho morto quebra o executor inteiro: descarta e tenta uma vez num novo
+                    if self._executor is executor:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        self._executor = None
+            raise ApiError(503, {'message': 'Serviço temporariamente indisponível',
+                                 'errors': "Processamento de senhas indisponível, tente novamente.", 'code': 503},
+                           headers={'Retry-After': '1'})
+        except asyncio.TimeoutError:
+            raise ApiError(503, {'message': 'Serviço temporariamente indisponível',
+                                 'errors': "Tempo esgotado no processamento da senha, tente novamente.", 'code': 503},
+                           headers={'Retry-After': '1'})
+        finally:
+            self.pending -= 1
+
+    async def hash_password(self, password):
+        encoded = hashing.encode_password(password, self.handle_long_passwords)
+        return await self._run(hashing.bcrypt_hash, encoded, self.rounds)
+
+    async def check_password(self, password_hash, password):
+        if not isinstance(password, str) or not password_hash:
+            return False
+        encoded = hashing.encode_password(password, self.handle_long_passwords)
+        return await self._run(hashing.bcrypt_check, password_hash.encode('utf-8'), encoded)
+
+    def needs_rehash(self, password_hash):
+        rounds = hashing.hash_rounds(password_hash)
+        return rounds is not None and rounds != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def async_database_url(uri, instance_path):
+    """Converte a URI síncrona para o driver assíncrono, resolvendo caminhos SQLite relativos na
+    pasta `instance`, como faz o Flask-SQLAlchemy."""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite':
+        return url
+    database = url.database
+    if database and database != ':memory:' and not database.startswith('file:') and not os.path.isabs(database):
+        database = os.path.join(instance_path, database)
+    return url.set(drivername='sqlite+aiosqlite', database=database)
+
+def _load_config(config_object):
+    if config_object is None:
+        config_object = os.environ.get('APP_CONFIG', 'config.Config')
+    if isinstance(config_object, str):
+        config_object = import_string(config_object)
+    return {key: getattr(config_object, key) for key in dir(config_object) if key.isupper()}
+
+def create_asgi_app(config_object=None):
+    """Cria a aplicação ASGI. Não abre conexões: a engine conecta na primeira requisição."""
+    config = _load_config(config_object)
+    instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+    database_url = async_database_url(config['SQLALCHEMY_DATABASE_URI'], instance_path)
+    _, engine_options, pragmas = sqlite_engine_profile(config, database_url) # Mesmo perfil do create_app()
+    engine = create_async_engine(database_url, **engine_options)
+    apply_sqlite_pragmas(engine.sync_engine, pragmas)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    hasher = AsyncHasher(config)
+    token_blocklist.sync_interval = config.get('JWT_BLOCKLIST_SYNC_INTERVAL', 1.0)
+    user_schema = UserSchema()
+
+    # --- Autenticação (mesmo formato de token do Flask-JWT-Extended) ---
+    def create_access_token(identity):
+        now = datetime.now(timezone.utc)
+        claims = {
+            'fresh': False, 'iat': now, 'jti': str(uuid.uuid4()), 'type': 'access', 'sub': identity,
+            'nbf': now, 'csrf': str(uuid.uuid4()), 'exp': now + config['JWT_ACCESS_TOKEN_EXPIRES'],
+        }
+        return jwt.encode(claims, config['JWT_SECRET_KEY'], algorithm=config.get('JWT_ALGORITHM', 'HS256'))
+
+    async def current_user(request, session):
+        header = request.headers.get('Authorization')
+        if not header:
+            raise unauthorized("Token de autorização não fornecido ou inválido. Detalhe: Missing Authorization Header")
+        parts = header.split()
+        if len(parts) != 2 or parts[0] != 'Bearer':
+            raise unauthorized("Token de autorização não fornecido ou inválido. "
+                               "Detalhe: Missing 'Bearer' type in 'Authorization' header. Expected 'Authorization: Bearer <JWT>'")
+        try:
+            claims = jwt.decode(parts[1], config['JWT_SECRET_KEY'], algorithms=[config.get('JWT_ALGORITHM', 'HS256')])
+        except jwt.ExpiredSignatureError:
+            raise unauthorized("Seu token de autorização expirou.")
+        except jwt.InvalidTokenError as e:
+            raise unauthorized(f"Seu token de autorização é inválido. Detalhe: {e}")
+        if claims.get('type') != 'access':
+            raise unauthorized("Seu token de autorização é inválido. Detalhe: Only non-refresh tokens are allowed")
+        # Mesma blocklist em memória do modo Flask (blocklist.py), sincronizada pela sessão assíncrona
+        if token_blocklist.due():
+            token_blocklist.refresh((await session.execute(token_blocklist.pending_statement())).all())
+        if token_blocklist.is_revoked(claims):
+            raise unauthorized("Seu token de autorização foi revogado.")
+        row = (await session.execute(select(User.id).filter_by(id=claims['sub']))).first()
+        if row is None:
+            raise ApiError(401, {'msg': f"Error loading the user {claims['sub']}"})
+        return claims['sub']
+
+    async def load_json(request, schema):
+        try:
+            data = await request.json()
+        except ValueError:
+            raise ApiError(400, {'message': 'Requisição inválida', 'errors': "Failed to decode JSON object", 'code': 400})
+        try:
+            return schema.load(data)
+        except ValidationError:
+            raise unprocessable()
+
+    async def get_user_or_404(session, user_id):
+        user = await session.get(User, user_id)
+        if user is None:
+            raise not_found()
+        return user
+
+    def conflict():
+        return ApiError(409, {'message': 'Um usuário com este e-mail já existe', 'error': CONFLICT_DESCRIPTION})
+
+    # --- Rotas ---
+    async def login(request):
+        try:
+            body = await request.json()
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            raise ApiError(400, {'message': 'Requisição inválida', 'errors': "Failed to decode JSON object", 'code': 400})
+        email, password = normalize_email(body.get('email')), body.get('password')
+        async with sessions() as session:
+            user = (await session.scalars(select(User).filter_by(email=email).limit(1))).first()
+            if not user or not await hasher.check_password(user.password_hash, password):
+                logger.warning("Login falhou para: %s", email)
+                return FlaskJSONResponse({'message': "Autenticação inválida", 'errors': "Email ou senha inválidos"}, 401)
+            if hasher.needs_rehash(user.password_hash): # Sem trocar a versão (ETag), como em auth.py
+                await session.execute(update(User).filter_by(id=user.id).values(
+                    password_hash=await hasher.hash_password(password)), execution_options={'synchronize_session': False})
+                await session.commit()
+            return FlaskJSONResponse({'access_token': create_access_token(user.id)})
+
+    async def user_list(request):
+        async with sessions() as session:
+            if request.method == 'POST':
+                await current_user(request, session)
+                data = await load_json(request, UserInputSchema())
+                user = User(name=data['name'], email=data['email'],
+                            password_hash=await hasher.hash_password(data['password']))
+                session.add(user)
+                await commit_write(session) # E-mail repetido: índice UNIQUE -> 409
+                return FlaskJSONResponse(user_schema.dump(user), 201)
+
+            try:
+                # EXCLUDE como o webargs na query do Flask: parâmetros extras (ex.: cache-buster) são ignorados
+                args = UserQueryArgsSchema(unknown=EXCLUDE).load(dict(request.query_params))
+            except ValidationError:
+                raise unprocessable()
+            use_index = config.get('USER_SEARCH_INDEX', True) and engine.dialect.name == 'sqlite'
+            per_page = args.get('per_page', config.get('PER_PAGE', 10))
+            if per_page > config.get('PUBLIC_MAX_PER_PAGE', 100):
+                await current_user(request, session) # Como no modo Flask: páginas maiores só com token
+            fields = selected_fields(args)
+            if 'cursor' in args:
+                statement, sort_by, order = keyset_statement(args, per_page, use_index, fields)
+                page = keyset_page((await session.execute(statement)).all(), per_page, sort_by, order)
+            else:
+                statement = list_statement(args, use_index, fields)
+                counting = total_statement(args, statement, engine.dialect.name == 'sqlite', config.get('COUNT_ESTIMATE_SAMPLE', 10000))
+                total = await session.scalar(counting) if counting is not None else None
+                items = (await session.execute(statement.limit(per_page).offset((args['page'] - 1) * per_page))).all()
+                page = {'page': args['page'], 'per_page': per_page, 'total_pages': page_count(total, per_page),
+                        'total_items': total, 'items': items}
+            return FlaskJSONResponse(dump_page(page, fields))
+
+    async def user_resource(request):
+        user_id = request.path_params['user_id']
+        async with sessions() as session:
+            if request.method == 'GET':
+                user = await get_user_or_404(session, user_id)
+                headers = {'ETag': etag(user.version_id)}
+                if not_modified(request.headers.get('If-None-Match'), user.version_id):
+                    return Response(status_code=304, headers=headers)
+                return FlaskJSONResponse(user_schema.dump(user), headers=headers)
+
+            await current_user(request, session)
+            if request.method == 'DELETE':
+                user = await get_user_or_404(session, user_id)
+                if not precondition_holds(request.headers.get('If-Match'), user.version_id):
+                    raise precondition_failed()
+                await session.delete(user)
+                await commit_write(session)
+                return Response(status_code=204)
+
+            data = await load_json(request, UserInputSchema(partial=True))
+            user = await get_user_or_404(session, user_id)
+            if not precondition_holds(request.headers.get('If-Match'), user.version_id):
+                raise precondition_failed()
+            for key, value in data.items():
+                if key == 'password':
+                    user.password_hash = await hasher.hash_password(value)
+                else:
+                    setattr(user, key, value)
+            await commit_write(session)
+            return FlaskJSONResponse(user_schema.dump(user), headers={'ETag': etag(user.version_id)})
+
+    async def commit_write(session):
+        # O ORM confere a versão lida no WHERE (version_id_col): outra escrita no meio vira 412.
+        # A unicidade do e-mail fica a cargo do índice UNIQUE, sem consulta prévia.
+        try:
+            await session.commit()
+        except StaleDataError:
+            await session.rollback()
+            raise precondition_failed()
+        except IntegrityError:
+            await session.rollback()
+            raise conflict()
+
+    # --- Erros (mesmos payloads de app.py) ---
+    async def handle_api_error(request, exc):
+        return FlaskJSONResponse(exc.payload, exc.status_code, headers=exc.headers)
+
+    async def handle_not_found(request, exc):
+        return FlaskJSONResponse({'message': 'Recurso não encontrado', 'code': 404}, 404)
+
+    async def handle_method_not_allowed(request, exc):
+        return FlaskJSONResponse({'message': 'The method is not allowed for the requested URL.', 'code': 405}, 405)
+
+    async def handle_generic_error(request, exc):
+        logger.exception("Erro interno do servidor: %s", exc)
+        return FlaskJSONResponse({'message': 'Ocorreu um erro interno no servidor', 'error': 'Erro inesperado'}, 500)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        hasher.shutdown()
+        await engine.dispose()
+
+    routes = [
+        Route('/login', login, methods=['POST']),
+        Route('/v1/users', user_list, methods=['GET', 'POST']),
+        Route('/v1/users/{user_id:int}', user_resource, methods=['GET', 'PUT', 'DELETE']),
+    ]
+    app = Starlette(
+        routes=routes,
+        exception_handlers={
+            ApiError: handle_api_error,
+            404: handle_not_found,
+            405: handle_method_not_allowed,
+            Exception: handle_generic_error,
+        },
+        lifespan=lifespan,
+    )
+    app.state.engine = engine
+    app.state.hasher = hasher
+    return app
@@ -1,27 +1,64 @@
 import sys
+import time
+import click
+from collections import namedtuple
 from flask import request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity
-from models import User 
-from models import bcrypt_obj 
+from flask_jwt_extended import create_access_token, jwt_required, JWTManager, get_jwt_identity, get_jwt
+from models import db, User, normalize_email
+from caching import identity_cache, identity_key
+from instrumentation import phase
+import hashing
+from blocklist import token_blocklist, revoke, purge_revoked
 
 jwt = JWTManager()
 
+# Versão enxuta do usuário autenticado guardada no cache de identidades (sem sessão do ORM)
+CurrentUser = namedtuple('CurrentUser', ['id', 'name', 'email'])
+
 def configure_auth(app):
     """Configura a autenticação do aplicativo Flask."""
     jwt.init_app(app)
+    token_blocklist.sync_interval = app.config.get('JWT_BLOCKLIST_SYNC_INTERVAL', 1.0)
 
     # Callback para carregar um objeto de usuário a partir do ID contido no token
     @jwt.user_lookup_loader
     def user_lookup_callback(_jwt_header, jwt_data):
         """Carrega um objeto de usuário a partir do ID contido no token."""
-        identity = jwt_data["sub"] # onde sub é o padrão do JWT
-        return User.query.filter_by(id=identity).one_or_none()
+        identity = str(jwt_data["sub"]) # onde sub é o padrão do JWT
+        with phase('jwt'):
+            key = identity_key(identity)
+            user = identity_cache.get(key)
+            if user is None:
+                row = db.session.execute(
+                    db.select(User.id, User.name, User.email).filter_by(id=identity)).one_or_none()
+                if row is None:
+                    return None
+                user = CurrentUser(*row)
+                identity_cache.set(key, user)
+        return user
+
+    # Revogação: consulta à cópia em memória da blocklist (blocklist.py), sincronizada de tempos em tempos
+    @jwt.token_in_blocklist_loader
+    def token_in_blocklist_callback(_jwt_header, jwt_data):
+        """Indica se o token foi revogado (logout ou revogação administrativa)."""
+        token_blocklist.sync_if_due(db.engine)
+        return token_blocklist.is_revoked(jwt_data)
+
+    @jwt.revoked_token_loader
+    def revoked_token_response(jwt_header, jwt_data):
+        """Lida com tokens revogados."""
+        current_app.logger.warning("JWT Revoked: Token %s de %s revogado.", jwt_data['jti'], jwt_data['sub'])
+        return jsonify({
+            'message': "Autenticação inválida",
+            'errors': "Seu token de autorização foi revogado.",
+            'code': 401
+        }), 401
 
     # Callback para lidar com tokens não fornecidos ou inválidos
     @jwt.unauthorized_loader
     def unauthorized_response(callback_error):
         """Lida com tokens não fornecidos ou inválidos."""
-        current_app.logger.warning(f"JWT Unauthorized: {callback_error}")
+        current_app.logger.warning("JWT Unauthorized: %s", callback_error)
         return jsonify({
             'message': "Autenticação inválida",
             'errors': f"Token de autorização não fornecido ou inválido. Detalhe: {callback_error}",
@@ -32,7 +69,7 @@ def configure_auth(app):
     @jwt.expired_token_loader
     def expired_token_response(jwt_header, jwt_data):
         """Lida com tokens expirados."""
-        current_app.logger.warning(f"JWT Expired: Token de {jwt_data['sub']} expirou.")
+        current_app.logger.warning("JWT Expired: Token de %s expirou.", jwt_data['sub'])
         return jsonify({
             'message': "Autenticação inválida",
             'errors': "Seu token de autorização expirou.",
@@ -43,7 +80,7 @@ def configure_auth(app):
     @jwt.invalid_token_loader
     def invalid_token_response(callback_error):
         """Lida com tokens inválidos."""
-        current_app.logger.warning(f"JWT Invalid Token: {callback_error}")
+        current_app.logger.warning("JWT Invalid Token: %s", callback_error)
         return jsonify({
             'message': "Autenticação inválida",
             'errors': f"Seu token de autorização é inválido. Detalhe: {callback_error}",
@@ -55,15 +92,57 @@ def configure_auth(app):
     @app.route('/login', methods=['POST'])
     def login():
         """Rota de login."""
-        email = request.json.get('email', None)
+        email = normalize_email(request.json.get('email', None))
         password = request.json.get('password', None)
 
         user = User.query.filter_by(email=email).first()
 
         if not user or not user.check_password(password):
-            current_app.logger.warning(f"Login falhou para: {email}")
+            current_app.logger.warning("Login falhou para: %s", email)
             return jsonify({'message': "Autenticação inválida", 'errors': "Email ou senha inválidos"}), 401
 
+        # Hash gerado com um custo antigo: aproveita a senha validada para atualizá-lo
+        # (UPDATE direto: a senha não faz parte da representação, então a versão/ETag não muda)
+        if user.password_needs_rehash():
+            db.session.execute(db.update(User).filter_by(id=user.id).values(password_hash=hashing.hash_password(password)),
+                               execution_options={'synchronize_session': False})
+            db.session.commit()
+            current_app.logger.info("Hash de senha atualizado para: %s", email)
+
         access_token = create_access_token(identity=user.id)
-        current_app.logger.info(f"Login bem-sucedido para: {email}")
+        current_app.logger.info("Login bem-sucedido para: %s", email)
         return jsonify(access_token=access_token)
+
+    # Rota de logout: revoga o token usado na requisição
+    @app.route('/logout', methods=['POST'])
+    @jwt_required()
+    def logout():
+        """Rota de logout."""
+        claims = get_jwt()
+        revoke(db.session, claims['exp'], jti=claims['jti'])
+        current_app.logger.info("Logout de: %s", claims['sub'])
+        return jsonify(message="Logout realizado")
+
+    # Revogação administrativa: um token (`jti`) ou todos os tokens de um usuário (`user_id`)
+    @app.route('/admin/tokens/revoke', methods=['POST'])
+    @jwt_required()
+    def admin_revoke():
+        """Revoga um token ou todos os tokens já emitidos para um usuário (só ADMIN_USER_IDS)."""
+        admin_id = get_jwt_identity()
+        if str(admin_id) not in {str(user_id) for user_id in current_app.config.get('ADMIN_USER_IDS', ())}:
+            current_app.logger.warning("Revogação negada para: %s", admin_id)
+            return jsonify({'message': "Acesso negado", 'errors': "Apenas administradores podem revogar tokens.", 'code': 403}), 403
+        data = request.get_json(silent=True) or {}
+        jti, user_id = data.get('jti'), data.get('user_id')
+        if not (isinstance(jti, str) and jti) and not (isinstance(user_id, int) and not isinstance(user_id, bool)):
+            return jsonify({'message': 'Dados de entrada inválidos', 'errors': "Informe `jti` (texto) ou `user_id` (inteiro).", 'code': 422}), 422
+        # Nenhum token emitido agora vale além de JWT_ACCESS_TOKEN_EXPIRES: depois disso a entrada é descartável
+        expires_at = time.time() + current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()
+        row = revoke(db.session, expires_at, jti=jti or None, user_id=user_id)
+        current_app.logger.info("Usuário %s revogou tokens: jti=%s user_id=%s", admin_id, row.jti, row.user_id)
+        return jsonify(id=row.id, jti=row.jti, user_id=row.user_id, expires_at=row.expires_at)
+
+    @app.cli.command('purge-revoked-tokens')
+    def purge_revoked_tokens_command():
+        """Remove do banco as revogações de tokens já expirados."""
+        click.echo(f"{purge_revoked(db.session)} revogações expiradas removidas")
@@ -0,0 +1,94 @@
+"""Comparação entre o app Flask no gunicorn (workers síncronos) e o modo ASGI no uvicorn.
+
+Os dois servidores recebem a mesma carga com alta concorrência: leituras de
+GET /v1/users/<id> e uma fração de logins (bcrypt). Uso:
+
+    python benchmarks/bench_async.py --users 10000 --concurrency 200 --duration 15 --workers 2
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from common import (ROOT, make_config, temp_db_path, seed_users, free_port, wait_for_port,
+                    http_request, summarize, print_report)
+from app import create_app, bootstrap_database
+
+SERVER_CONFIG = 'benchmarks.common.ServerBenchConfig'
+
+def server_command(kind, port, workers):
+    if kind == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+                f"app:create_app('{SERVER_CONFIG}')"]
+    return [sys.executable, '-m', 'uvicorn', '--factory', 'asgi:create_asgi_app', '--workers', str(workers),
+            '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+
+def run_load(port, users, concurrency, duration, login_ratio):
+    stop = threading.Event()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client():
+        rng = random.Random()
+        local, failures = [], 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                if rng.random() < login_ratio:
+                    status, _ = http_request('127.0.0.1', port, 'POST', '/login',
+                                             {'email': 'test@example.com', 'password': 'password'})
+                else:
+                    status, _ = http_request('127.0.0.1', port, 'GET', f'/v1/users/{rng.randint(1, users)}')
+                if status >= 500:
+                    failures += 1
+            except OSError:
+                failures += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors.append(failures)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return dict(summarize(latencies), rps=round(len(latencies) / duration), errors=sum(errors))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--login-ratio', type=float, default=0.05)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = create_app(make_config(db_path, BCRYPT_LOG_ROUNDS=10))
+    bootstrap_database(app)
+    seed_users(app, args.users)
+
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', APP_CONFIG=SERVER_CONFIG, BCRYPT_LOG_ROUNDS='10')
+    rows = []
+    for kind in ('gunicorn', 'uvicorn'):
+        port = free_port()
+        server = subprocess.Popen(server_command(kind, port, args.workers), cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            rows.append((f'{kind} ({args.workers} workers)',
+                         run_load(port, args.users, args.concurrency, args.duration, args.login_ratio)))
+        finally:
+            server.terminate()
+            server.wait()
+    print_report(f'{args.concurrency} clientes concorrentes, {args.login_ratio:.0%} logins', rows)
+
+if __name__ == '__main__':
+    main()
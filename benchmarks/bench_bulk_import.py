@@ -0,0 +1,62 @@
+"""Vazão (linhas/s) da importação em lote comparada a um POST /v1/users por usuário.
+
+O custo do bcrypt domina as duas rotas; use `--rounds` para medir com o custo de produção
+ou com o mínimo (padrão) para isolar o restante do caminho. Uso:
+
+    python benchmarks/bench_bulk_import.py --rows 2000 --rounds 4
+"""
+import argparse
+import json
+import time
+
+from common import make_config, temp_db_path, print_report
+from app import create_app, bootstrap_database
+from models import db
+
+def login(client):
+    response = client.post('/login', json={'email': 'test@example.com', 'password': 'password'})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+def make_rows(prefix, count):
+    return [{'name': f'{prefix} {i}', 'email': f'{prefix}{i}@bench.example.com', 'password': 'senha123'}
+            for i in range(count)]
+
+def bench_single(client, headers, rows):
+    start = time.perf_counter()
+    for row in rows:
+        assert client.post('/v1/users', json=row, headers=headers).status_code == 201
+    return time.perf_counter() - start
+
+def bench_bulk(client, headers, rows):
+    body = '\n'.join(json.dumps(row) for row in rows)
+    start = time.perf_counter()
+    response = client.post('/v1/users/bulk', data=body, content_type='application/x-ndjson', headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.json['created'] == len(rows), response.json
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=4, help='BCRYPT_LOG_ROUNDS')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app(make_config(temp_db_path(), BCRYPT_LOG_ROUNDS=args.rounds,
+                                 BULK_IMPORT_CHUNK_SIZE=args.chunk_size))
+    bootstrap_database(app)
+    client = app.test_client()
+    headers = login(client)
+
+    single = bench_single(client, headers, make_rows('single', args.rows))
+    bulk = bench_bulk(client, headers, make_rows('bulk', args.rows))
+    with app.app_context():
+        db.engine.dispose()
+
+    print_report(f'Importação de {args.rows} usuários (bcrypt custo {args.rounds})', [
+        ('POST /v1/users (um a um)', {'seconds': round(single, 2), 'rows_per_sec': round(args.rows / single)}),
+        ('POST /v1/users/bulk', {'seconds': round(bulk, 2), 'rows_per_sec': round(args.rows / bulk)}),
+    ])
+
+if __name__ == '__main__':
+    main()
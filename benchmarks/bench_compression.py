@@ -0,0 +1,96 @@
+"""Listagens grandes: bytes enviados por codificação e pico de memória do servidor, com e sem stream.
+
+Para cada `per_page` (100, 1000 e 10000 por padrão), mede num processo Python novo a memória de pico
+alocada ao gerar a página inteira, montada na memória (`buffered`) ou em stream (`stream`,
+`serializers.stream_page`), e os bytes do corpo sem compressão e com cada codificação disponível
+(gzip sempre; br e zstd com `brotli`/`zstandard` instalados). O pico vem do `tracemalloc`: o
+`ru_maxrss` do processo (também informado) é dominado pela partida do app e quase não varia por
+requisição. Uso:
+
+    python benchmarks/bench_compression.py --users 20000
+    python benchmarks/bench_compression.py --per-page 100 1000 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import ROOT, ServerBenchConfig, temp_db_path, seed_users, print_report
+
+# Executado no processo novo: argv = per_page, modo; o corpo é lido em blocos, sem guardá-lo
+PROBE = """
+import json, resource, sys, time, tracemalloc
+import app as app_module
+from compression import supported_encodings
+from flask_jwt_extended import create_access_token
+
+per_page, mode = int(sys.argv[1]), sys.argv[2]
+application = app_module.create_app('benchmarks.common.ServerBenchConfig')
+if mode == 'buffered':
+    application.config['STREAM_MIN_PER_PAGE'] = 10 ** 9
+with application.app_context():
+    token = create_access_token(identity=1)
+client = application.test_client()
+
+def fetch(encoding, per_page=per_page):
+    headers = {'Authorization': f'Bearer {token}', 'Accept-Encoding': encoding}
+    response = client.get(f'/v1/users?per_page={per_page}&page=2', headers=headers, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    assert response.status_code == 200, response.status_code
+    return size
+
+fetch('identity', per_page=1) # Aquecimento (imports, conexões, consultas compiladas) sem subir o pico
+tracemalloc.start()
+start = time.perf_counter()
+identity = fetch('identity')
+elapsed = time.perf_counter() - start
+peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+sizes = {'identity': identity}
+for encoding in sorted(supported_encodings()):
+    sizes[encoding] = fetch(encoding)
+print(json.dumps({'peak_kb': peak // 1024, 'identity_ms': round(elapsed * 1000, 2), 'bytes': sizes,
+                  'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+def prepare_database(users):
+    """Banco temporário com `users` usuários gerados."""
+    from app import create_app, bootstrap_database
+    db_path = temp_db_path('compression.db')
+    config = type('CompressionBenchConfig', (ServerBenchConfig,),
+                  {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'BCRYPT_LOG_ROUNDS': 4})
+    app = create_app(config)
+    bootstrap_database(app)
+    seed_users(app, users)
+    return db_path
+
+def probe(db_path, per_page, mode):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    output = subprocess.run([sys.executable, '-c', PROBE, str(per_page), mode], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure(users, per_pages):
+    db_path = prepare_database(users)
+    return {f'per_page={per_page} {mode}': probe(db_path, per_page, mode)
+            for per_page in per_pages for mode in ('buffered', 'stream')}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000, help='Usuários no banco (acima de 2 * maior per_page)')
+    parser.add_argument('--per-page', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    result = measure(args.users, args.per_page)
+    if args.json:
+        print(json.dumps(result))
+        return
+    print_report('Listagem: memória de pico e bytes por codificação', [
+        (name, {'peak_kb': sample['peak_kb'], 'rss_kb': sample['rss_kb'], 'identity_ms': sample['identity_ms'], **sample['bytes']})
+        for name, sample in result.items()])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Latência de GET /v1/users/<id> durante uma rajada de logins.
+
+Compara o bcrypt inline (BCRYPT_POOL_SIZE=0) com o pool de processos limitado. O servidor
+é multithread, como o gunicorn com `--threads`. Uso:
+
+    python benchmarks/bench_login_storm.py --logins 32 --duration 10
+"""
+import argparse
+import threading
+import time
+
+from common import make_config, temp_db_path, serve, http_request, summarize, print_report
+from app import create_app, bootstrap_database
+from models import db, User
+
+def run_scenario(pool_size, logins, duration, rounds):
+    config = make_config(temp_db_path(), BCRYPT_POOL_SIZE=pool_size, BCRYPT_LOG_ROUNDS=rounds,
+                         BCRYPT_QUEUE_DEPTH=logins)
+    app = create_app(config)
+    bootstrap_database(app)
+    with app.app_context():
+        user_id = User.query.filter_by(email='test@example.com').first().id
+
+    stop = threading.Event()
+    login_status = {}
+
+    def login_loop():
+        while not stop.is_set():
+            status, _ = http_request(host, port, 'POST', '/login',
+                                     {'email': 'test@example.com', 'password': 'password'})
+            login_status[status] = login_status.get(status, 0) + 1
+
+    def measure_gets(seconds):
+        latencies = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            http_request(host, port, 'GET', f'/v1/users/{user_id}')
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.005)
+        return latencies
+
+    with serve(app) as (host, port):
+        idle = measure_gets(min(duration, 3))
+        workers = [threading.Thread(target=login_loop, daemon=True) for _ in range(logins)]
+        for worker in workers:
+            worker.start()
+        storm = measure_gets(duration)
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    return summarize(idle), summarize(storm), login_status
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=32, help='Threads disparando /login')
+    parser.add_argument('--duration', type=float, default=10, help='Segundos de rajada')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS')
+    parser.add_argument('--pool-size', type=int, default=2)
+    args = parser.parse_args()
+
+    rows = []
+    for label, pool_size in (('inline', 0), (f'pool ({args.pool_size})', args.pool_size)):
+        idle, storm, logins = run_scenario(pool_size, args.logins, args.duration, args.rounds)
+        rows.append((f'{label} / ocioso', idle))
+        rows.append((f'{label} / rajada', dict(storm, logins=logins)))
+    print_report('GET /v1/users/<id> durante rajada de login', rows)
+
+if __name__ == '__main__':
+    main()
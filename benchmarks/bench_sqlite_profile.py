@@ -0,0 +1,107 @@
+"""Leituras e escritas concorrentes no SQLite: perfil "default" x "production" (SQLITE_PROFILE).
+
+Vários processos (como os workers do gunicorn), cada um com várias threads, executam uma mistura
+de leituras (GET de um usuário) e escritas (UPDATE + commit) sobre o mesmo banco em arquivo.
+Reporta vazão, latências e erros "database is locked". Uso:
+
+    python benchmarks/bench_sqlite_profile.py --workers 2 --threads 8 --write-ratio 0.2 --duration 10
+"""
+import argparse
+import multiprocessing
+import random
+import threading
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+
+from common import make_config, temp_db_path, seed_users, summarize, print_report
+from app import create_app, bootstrap_database
+from models import db, User
+
+def worker(config, threads, write_ratio, duration, user_ids, results):
+    app = create_app(config)
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+
+    def loop(seed):
+        rng = random.Random(seed)
+        deadline = time.perf_counter() + duration
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                user_id = rng.choice(user_ids)
+                is_write = rng.random() < write_ratio
+                start = time.perf_counter()
+                try:
+                    if is_write:
+                        db.session.execute(update(User).where(User.id == user_id).values(name=f'Usuario {rng.random()}'))
+                        db.session.commit()
+                    else:
+                        db.session.execute(select(User).where(User.id == user_id)).scalar_one()
+                        db.session.rollback() # Encerra a transação de leitura (libera o snapshot do WAL)
+                except OperationalError as e:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(str(e.orig))
+                    continue
+                elapsed = time.perf_counter() - start
+                with lock:
+                    (writes if is_write else reads).append(elapsed)
+
+    pool = [threading.Thread(target=loop, args=(index,)) for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((reads, writes, errors))
+
+def run_scenario(profile, args):
+    config = make_config(temp_db_path(), SQLITE_PROFILE=profile)
+    app = create_app(config)
+    bootstrap_database(app, seed_test_user=False)
+    seed_users(app, args.users)
+    with app.app_context():
+        user_ids = db.session.scalars(select(User.id)).all()
+        db.session.remove()
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(config, args.threads, args.write_ratio, args.duration, user_ids, results))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    reads, writes, errors = [], [], []
+    for _ in processes:
+        worker_reads, worker_writes, worker_errors = results.get()
+        reads += worker_reads
+        writes += worker_writes
+        errors += worker_errors
+    for process in processes:
+        process.join()
+    operations = len(reads) + len(writes)
+    return {
+        'ops_s': round(operations / args.duration, 1),
+        'locked': sum('locked' in error for error in errors),
+        'errors': len(errors),
+    }, summarize(reads), summarize(writes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='Processos (workers do gunicorn)')
+    parser.add_argument('--threads', type=int, default=8, help='Threads por processo')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Fração de escritas')
+    parser.add_argument('--duration', type=float, default=10, help='Segundos por perfil')
+    parser.add_argument('--users', type=int, default=10000, help='Usuários no banco')
+    args = parser.parse_args()
+
+    rows = []
+    for profile in ('default', 'production'):
+        totals, reads, writes = run_scenario(profile, args)
+        rows.append((f'{profile} / total', totals))
+        rows.append((f'{profile} / leitura', reads))
+        rows.append((f'{profile} / escrita', writes))
+    print_report(f'Leituras e escritas concorrentes ({args.workers} processos x {args.threads} threads)', rows)
+
+if __name__ == '__main__':
+    main()
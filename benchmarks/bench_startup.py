@@ -0,0 +1,76 @@
+"""Tempo de partida de um worker: import do app, `create_app()` e a primeira requisição.
+
+Cada rodada é um processo Python novo (como um worker do gunicorn recém-criado) sobre um banco
+já preparado pelo `bootstrap_database()`. Também informa se o `create_app()` abriu conexões com
+o banco, o que não deve acontecer. Uso:
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --runs 1 --json # usado por tests/test_app.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from common import ROOT, ServerBenchConfig, temp_db_path, summarize, print_report
+
+# Executado no processo novo; mede com perf_counter desde antes do primeiro import do projeto
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+connects = []
+event.listen(Engine, 'connect', lambda *args: connects.append(1))
+application = app_module.create_app('benchmarks.common.ServerBenchConfig')
+created = time.perf_counter()
+factory_connects = len(connects)
+response = application.test_client().get('/v1/users/1')
+first = time.perf_counter()
+print(json.dumps({'import_s': imported - start, 'create_app_s': created - imported,
+                  'first_request_s': first - created, 'status': response.status_code,
+                  'factory_connects': factory_connects}))
+"""
+
+def prepare_database():
+    """Banco temporário com as tabelas e o usuário de teste (id 1)."""
+    from app import create_app, bootstrap_database
+    db_path = temp_db_path('startup.db')
+    config = type('StartupBenchConfig', (ServerBenchConfig,),
+                  {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'BCRYPT_LOG_ROUNDS': 4})
+    bootstrap_database(create_app(config))
+    return db_path
+
+def probe(db_path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def measure(runs):
+    db_path = prepare_database()
+    samples = [probe(db_path) for _ in range(runs)]
+    return {
+        'runs': samples,
+        'summary': {name: summarize([sample[name] for sample in samples])
+                    for name in ('import_s', 'create_app_s', 'first_request_s')},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    if args.json:
+        print(json.dumps(result))
+        return
+    print_report('Partida do worker (processo novo)', list(result['summary'].items()))
+    print(f"conexões abertas pelo create_app(): {max(sample['factory_connects'] for sample in result['runs'])}")
+
+if __name__ == '__main__':
+    main()
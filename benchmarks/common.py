@@ -0,0 +1,121 @@
+"""Utilitários compartilhados pelos benchmarks (executar a partir da raiz do repositório)."""
+import os
+import sys
+import json
+import math
+import logging
+import tempfile
+import threading
+import http.client
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+from werkzeug.serving import make_server
+from config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ServerBenchConfig(Config):
+    """Config dos servidores iniciados em subprocesso (banco vindo de DATABASE_URL)."""
+    RATELIMIT_ENABLED = False
+    CACHE_TYPE = 'NullCache'
+    LOG_FILE = None
+
+def make_config(db_path, **overrides):
+    """Config de benchmark: banco em arquivo, sem rate limit e sem cache de respostas."""
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'RATELIMIT_ENABLED': False,
+        'CACHE_TYPE': 'NullCache',
+        'LOG_FILE': None,
+    }
+    attrs.update(overrides)
+    return type('BenchConfig', (Config,), attrs)
+
+def temp_db_path(name='bench.db'):
+    return os.path.join(tempfile.mkdtemp(prefix='pp-bench-'), name)
+
+def percentile(values, p):
+    """Percentil pelo método nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize(latencies):
+    """Resumo em milissegundos de uma lista de latências em segundos."""
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+@contextmanager
+def serve(app, threaded=True):
+    """Sobe o app num servidor HTTP local (werkzeug) numa thread e devolve (host, porta)."""
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app.logger.setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=threaded)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.host, server.port
+    finally:
+        server.shutdown()
+        thread.join()
+
+def http_request(host, port, method, path, body=None, headers=None):
+    """Requisição HTTP simples; retorna (status, corpo em bytes)."""
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    try:
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        request_headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        request_headers.update(headers or {})
+        connection.request(method, path, body=payload, headers=request_headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+def print_report(title, rows):
+    print(f"\n== {title}")
+    for name, values in rows:
+        details = '  '.join(f"{key}={value}" for key, value in values.items())
+        print(f"{name:<28} {details}")
+
+def seed_users(app, count, batch_size=10000):
+    """Insere `count` usuários gerados (com o mesmo hash de senha) em lotes via executemany."""
+    from models import db, User
+    from hashing import hash_password
+    with app.app_context():
+        password_hash = hash_password('benchpass')
+        start = db.session.query(User).count()
+        for offset in range(0, count, batch_size):
+            rows = [{'name': f'Usuario {start + i}', 'email': f'user{start + i}@bench.example.com',
+                     'password_hash': password_hash}
+                    for i in range(offset, min(offset + batch_size, count))]
+            db.session.execute(insert(User), rows)
+            db.session.commit()
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port, timeout=30):
+    import socket
+    import time
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Servidor não respondeu na porta {port}")
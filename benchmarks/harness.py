@@ -0,0 +1,287 @@
+"""Suíte de carga reproduzível para os endpoints de /login e /v1/users.
+
+Popula o banco configurado (DATABASE_URL) com N usuários e reexecuta uma mistura de requisições
+descrita em JSONL contra o `create_app()`, no próprio processo (test client) ou por HTTP (servidor
+local ou `--url` de um gunicorn já em execução). Reporta vazão e p50/p95/p99 por endpoint, salva
+um baseline e falha (código de saída 1) quando o resultado piora além do limite. Uso:
+
+    python benchmarks/harness.py seed --users 100000
+    python benchmarks/harness.py run --mode inprocess --requests 5000 --save-baseline baseline.json
+    python benchmarks/harness.py run --mode http --requests 5000 --baseline baseline.json --threshold 0.2
+
+Formato da mistura (uma requisição por linha):
+
+    {"name": "get", "method": "GET", "path": "/v1/users/{user_id}", "weight": 40}
+    {"name": "post", "method": "POST", "path": "/v1/users", "auth": true, "expect": 201,
+     "body": {"name": "Bench {uid}", "email": "bench-{uid}@bench.example.com", "password": "benchpass"}}
+
+Com `--requests N` as linhas são sorteadas pelo `weight` (mistura gerada, reproduzível com `--seed`);
+sem ele o arquivo é reexecutado na ordem (mistura gravada). Marcadores substituídos a cada requisição:
+`{user_id}` (usuário populado), `{victim_id}` (usuário criado antes da medição, para DELETE), `{uid}`
+(único), `{name_term}` (nome de um usuário populado), `{deep_page}` (página entre as 10% finais com
+`per_page=20`), `{deep_cursor}` (cursor equivalente) e `{login_email}`.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlsplit
+
+from sqlalchemy import func, insert, select
+
+from common import ServerBenchConfig, seed_users, serve, http_request, summarize, print_report
+from app import create_app, bootstrap_database
+from models import db, User
+from schemas import CursorField
+
+MIX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mix.jsonl')
+DEEP_PER_PAGE = 20
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+class BenchConfig(ServerBenchConfig):
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+
+def load_mix(path):
+    with open(path, encoding='utf-8') as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+    for entry in entries:
+        entry.setdefault('name', f"{entry['method']} {entry['path']}")
+        entry.setdefault('weight', 1)
+        entry.setdefault('expect', 200)
+    return entries
+
+# --- Preparação: dados do banco usados pelos marcadores ---
+class Dataset:
+    def __init__(self, app, rng):
+        self.rng = rng
+        self.uid = 0
+        with app.app_context():
+            # Só os usuários populados: os criados/excluídos por execuções anteriores ficam de fora
+            self.user_ids = db.session.scalars(
+                select(User.id).where(User.email.like('user%@bench.example.com')).order_by(User.id)).all()
+            if not self.user_ids:
+                raise SystemExit("Banco vazio: execute `harness.py seed` antes.")
+            self.total = db.session.scalar(select(func.count()).select_from(User))
+            self.login_email, self.password_hash = db.session.execute(
+                select(User.email, User.password_hash).where(User.id == self.user_ids[0])).one()
+        self.victims = []
+
+    def create_victims(self, app, count):
+        """Usuários criados fora da medição para os DELETEs (um por requisição)."""
+        if not count:
+            return
+        prefix = uuid.uuid4().hex[:8]
+        rows = [{'name': f'Victim {prefix} {i}', 'email': f'victim-{prefix}-{i}@bench.example.com',
+                 'password_hash': self.password_hash} for i in range(count)]
+        with app.app_context():
+            self.victims = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), rows).all()
+            db.session.commit()
+
+    def value(self, name):
+        if name == 'user_id':
+            return self.rng.choice(self.user_ids)
+        if name == 'victim_id':
+            return self.victims.pop()
+        if name == 'uid':
+            self.uid += 1
+            return f'{os.getpid()}-{self.uid}-{self.rng.getrandbits(32):08x}'
+        if name == 'name_term':
+            return f'Usuario {self.rng.randint(0, len(self.user_ids) - 1)}'
+        if name == 'deep_page':
+            pages = max(1, math.ceil(self.total / DEEP_PER_PAGE))
+            return self.rng.randint(max(1, int(pages * 0.9)), pages)
+        if name == 'deep_cursor':
+            position = self.rng.choice(self.user_ids[int(len(self.user_ids) * 0.9):])
+            return CursorField()._serialize({'sort_by': 'id', 'order': 'asc', 'value': position, 'id': position}, None, None)
+        if name == 'login_email':
+            return self.login_email
+        raise SystemExit(f"Marcador desconhecido na mistura: {{{name}}}")
+
+def resolve(template, dataset, in_path=False):
+    if isinstance(template, str):
+        encode = (lambda value: quote(str(value), safe='')) if in_path else str
+        return PLACEHOLDER.sub(lambda match: encode(dataset.value(match.group(1))), template)
+    if isinstance(template, dict):
+        return {key: resolve(value, dataset) for key, value in template.items()}
+    if isinstance(template, list):
+        return [resolve(value, dataset) for value in template]
+    return template
+
+def build_requests(entries, dataset, app, count):
+    """Lista concreta de requisições (a aleatoriedade fica toda aqui, antes da medição)."""
+    if count:
+        plan = dataset.rng.choices(entries, weights=[entry['weight'] for entry in entries], k=count)
+    else:
+        plan = list(entries)
+    dataset.create_victims(app, sum('{victim_id}' in entry['path'] for entry in plan))
+    return [{
+        'name': entry['name'], 'method': entry['method'], 'expect': entry['expect'],
+        'auth': entry.get('auth', False), 'path': resolve(entry['path'], dataset, in_path=True),
+        'body': resolve(entry.get('body'), dataset),
+    } for entry in plan]
+
+# --- Execução ---
+def inprocess_sender(app):
+    local = threading.local()
+
+    def send(method, path, body, headers):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+    return send
+
+def http_sender(host, port):
+    def send(method, path, body, headers):
+        return http_request(host, port, method, path, body, headers)
+    return send
+
+def login(send, email):
+    status, body = send('POST', '/login', {'email': email, 'password': 'benchpass'}, {})
+    if status != 200:
+        raise SystemExit(f"Login do benchmark falhou ({status}): {body[:200]!r}")
+    return {'Authorization': f"Bearer {json.loads(body)['access_token']}"}
+
+def replay(send, requests, auth_headers, concurrency):
+    results = {}
+    lock = threading.Lock()
+    position = iter(range(len(requests)))
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                index = next(position, None)
+            if index is None:
+                break
+            request = requests[index]
+            headers = auth_headers if request['auth'] else {}
+            start = time.perf_counter()
+            try:
+                status, _ = send(request['method'], request['path'], request['body'], headers)
+            except OSError:
+                status = None
+            local.append((request['name'], time.perf_counter() - start, status == request['expect']))
+        with lock:
+            for name, latency, ok in local:
+                entry = results.setdefault(name, {'latencies': [], 'errors': 0})
+                entry['latencies'].append(latency)
+                entry['errors'] += not ok
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = {}
+    for name, entry in sorted(results.items()):
+        report[name] = dict(summarize(entry['latencies']), rps=round(len(entry['latencies']) / elapsed, 1),
+                            errors=entry['errors'])
+    total = sum(len(entry['latencies']) for entry in results.values())
+    return report, {'requests': total, 'seconds': round(elapsed, 2), 'rps': round(total / elapsed, 1)}
+
+# --- Baseline ---
+def compare(report, baseline, threshold, min_delta_ms):
+    """Endpoints que pioraram: p95 acima de (1 + threshold) x baseline (e mais que `min_delta_ms`)
+    ou vazão abaixo de (1 - threshold) x baseline. Erros novos também contam como regressão."""
+    regressions = []
+    for name, previous in baseline['endpoints'].items():
+        current = report.get(name)
+        if current is None:
+            continue
+        if (current['p95_ms'] > previous['p95_ms'] * (1 + threshold)
+                and current['p95_ms'] - previous['p95_ms'] > min_delta_ms):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['rps'] < previous['rps'] * (1 - threshold):
+            regressions.append(f"{name}: vazão {previous['rps']}/s -> {current['rps']}/s")
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: erros {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+def command_seed(args):
+    app = create_app(args.config)
+    bootstrap_database(app, seed_test_user=False)
+    seed_users(app, args.users)
+    with app.app_context():
+        print(f"{db.session.scalar(select(func.count()).select_from(User))} usuários em "
+              f"{app.config['SQLALCHEMY_DATABASE_URI']}")
+
+def command_run(args):
+    app = create_app(args.config)
+    app.logger.setLevel(logging.WARNING)
+    dataset = Dataset(app, random.Random(args.seed))
+    requests = build_requests(load_mix(args.mix), dataset, app, args.requests)
+
+    if args.mode == 'inprocess':
+        send = inprocess_sender(app)
+        report, totals = replay(send, requests, login(send, dataset.login_email), args.concurrency)
+    elif args.url:
+        parts = urlsplit(args.url)
+        send = http_sender(parts.hostname, parts.port or 80)
+        report, totals = replay(send, requests, login(send, dataset.login_email), args.concurrency)
+    else:
+        with serve(app) as (host, port):
+            send = http_sender(host, port)
+            report, totals = replay(send, requests, login(send, dataset.login_email), args.concurrency)
+
+    print_report(f"{args.mode}: {totals['requests']} requisições em {totals['seconds']}s "
+                 f"({totals['rps']}/s, {dataset.total} usuários, concorrência {args.concurrency})",
+                 list(report.items()))
+    result = {'mode': args.mode, 'users': dataset.total, 'concurrency': args.concurrency,
+              'totals': totals, 'endpoints': report}
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=2)
+        print(f"\nBaseline salvo em {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegressões acima de {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nSem regressões acima de {args.threshold:.0%} em relação a {args.baseline}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', default='benchmarks.harness.BenchConfig',
+                        help='Objeto de configuração do create_app() (banco em DATABASE_URL)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed = subparsers.add_parser('seed', help='Popula o banco com usuários gerados')
+    seed.add_argument('--users', type=int, default=10000, help='Ex.: 10000, 100000, 1000000')
+
+    run = subparsers.add_parser('run', help='Reexecuta a mistura de requisições e reporta as latências')
+    run.add_argument('--mix', default=MIX_PATH, help='Arquivo JSONL com a mistura de requisições')
+    run.add_argument('--requests', type=int, default=2000, help='Requisições sorteadas pelo peso; 0 = arquivo na ordem')
+    run.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess')
+    run.add_argument('--url', help='Com --mode http: servidor já em execução (ex.: gunicorn) em vez do servidor local')
+    run.add_argument('--concurrency', type=int, default=4)
+    run.add_argument('--seed', type=int, default=42, help='Semente do sorteio da mistura')
+    run.add_argument('--save-baseline', help='Salva o resultado como baseline (JSON)')
+    run.add_argument('--baseline', help='Compara com um baseline salvo e falha se houver regressão')
+    run.add_argument('--threshold', type=float, default=0.2, help='Piora relativa tolerada (0.2 = 20%%)')
+    run.add_argument('--min-delta-ms', type=float, default=1.0, help='Piora absoluta mínima do p95 para contar')
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        command_seed(args)
+        return 0
+    return command_run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
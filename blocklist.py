@@ -0,0 +1,98 @@
+"""Revogação de tokens JWT (`/logout` e `/admin/tokens/revoke`).
+
+As revogações ficam na tabela `revoked_token`: um `jti` (um token) ou um `user_id` (todos os tokens do
+usuário emitidos até o instante da revogação). Cada worker guarda uma cópia em memória (`TokenBlocklist`)
+e a verificação feita em cada `@jwt_required()` são duas consultas a dicionários, sem SQL. A cópia é
+atualizada no máximo a cada `JWT_BLOCKLIST_SYNC_INTERVAL` segundos lendo só as linhas com `id` maior que
+o último visto (AUTOINCREMENT: ids nunca são reutilizados), então uma revogação feita em outro worker
+vale em todos depois desse intervalo; no worker que a registrou vale na hora.
+
+Uma entrada só é necessária até o token expirar: sai da memória na sincronização seguinte e do banco
+com `flask purge-revoked-tokens` (para um cron).
+"""
+import threading
+import time
+from sqlalchemy import select, insert, delete
+from models import RevokedToken
+
+REVOKED_COLUMNS = (RevokedToken.id, RevokedToken.jti, RevokedToken.user_id, RevokedToken.revoked_at, RevokedToken.expires_at)
+
+class TokenBlocklist:
+    """Tokens revogados ainda válidos (por processo), sincronizados de forma incremental com o banco."""
+
+    def __init__(self, sync_interval=1.0):
+        self._lock = threading.Lock()
+        self.sync_interval = sync_interval
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.jtis = {} # jti -> expiração (epoch)
+            self.cutoffs = {} # sub -> (revogado em, expiração)
+            self.last_id = 0
+            self._next_sync = 0.0
+
+    def is_revoked(self, claims):
+        if claims.get('jti') in self.jtis:
+            return True
+        cutoff = self.cutoffs.get(str(claims.get('sub')))
+        # `iat` tem resolução de segundos: um token emitido no mesmo segundo da revogação também cai
+        return cutoff is not None and claims.get('iat', 0) <= cutoff[0]
+
+    def apply(self, rows):
+        """Incorpora linhas de `revoked_token` (com `REVOKED_COLUMNS`)."""
+        with self._lock:
+            for row in rows:
+                if row.jti is not None:
+                    self.jtis[row.jti] = row.expires_at
+                if row.user_id is not None:
+                    current = self.cutoffs.get(str(row.user_id))
+                    if current is None or row.revoked_at > current[0]:
+                        self.cutoffs[str(row.user_id)] = (row.revoked_at, row.expires_at)
+                self.last_id = max(self.last_id, row.id)
+
+    def purge(self, now):
+        """Remove da memória as entradas de tokens que já expiraram."""
+        with self._lock:
+            self.jtis = {jti: expires_at for jti, expires_at in self.jtis.items() if expires_at > now}
+            self.cutoffs = {sub: entry for sub, entry in self.cutoffs.items() if entry[1] > now}
+
+    def due(self):
+        """Indica se a cópia deve ser atualizada e, nesse caso, reserva a próxima janela (uma thread por vez)."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_sync:
+                return False
+            self._next_sync = now + self.sync_interval
+            return True
+
+    def pending_statement(self):
+        """Consulta das revogações ainda não vistas por este processo (busca pela chave primária)."""
+        return select(*REVOKED_COLUMNS).where(RevokedToken.id > self.last_id).order_by(RevokedToken.id)
+
+    def refresh(self, rows):
+        self.apply(rows)
+        self.purge(time.time())
+
+    def sync_if_due(self, engine):
+        """Atualiza a cópia lendo o engine primário (as réplicas podem estar atrasadas)."""
+        if self.due():
+            with engine.connect() as connection:
+                self.refresh(connection.execute(self.pending_statement()).all())
+
+# Cópia deste processo, usada pelo `token_in_blocklist_loader` (auth.py) e pelo modo ASGI
+token_blocklist = TokenBlocklist()
+
+def revoke(session, expires_at, jti=None, user_id=None):
+    """Registra a revogação, confirma a transação e já a aplica neste processo. Retorna a linha."""
+    row = session.execute(insert(RevokedToken).values(
+        jti=jti, user_id=user_id, revoked_at=time.time(), expires_at=expires_at).returning(*REVOKED_COLUMNS)).one()
+    session.commit()
+    token_blocklist.apply([row])
+    return row
+
+def purge_revoked(session):
+    """Apaga do banco as revogações de tokens já expirados. Retorna a quantidade."""
+    removed = session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= time.time())).rowcount
+    session.commit()
+    return removed
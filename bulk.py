@@ -0,0 +1,177 @@
+import codecs
+import json
+from itertools import chain, islice
+from marshmallow import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from models import db, User
+from schemas import UserInputSchema
+from hashing import hash_passwords
+from caching import invalidate_users
+
+READ_SIZE = 64 * 1024 # Bytes lidos do corpo da requisição por vez
+MAX_ROW_SIZE = 1024 * 1024 # Um objeto maior que isso no array é tratado como JSON inválido
+
+class MalformedRow:
+    """Linha do corpo que não pôde ser interpretada como JSON."""
+
+    def __init__(self, error):
+        self.error = error
+
+# --- Leitura incremental do corpo (NDJSON ou array JSON) ---
+def _read_text(stream):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(data)
+
+def iter_json_rows(stream):
+    """Gera os objetos de um corpo NDJSON ou array JSON, lendo o stream aos poucos.
+    O formato é detectado pelo primeiro caractere não branco (`[` indica array)."""
+    chunks = _read_text(stream)
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+    buffer = buffer.lstrip()
+    if buffer.startswith('['):
+        yield from _iter_array(buffer[1:], chunks)
+    else:
+        yield from _iter_ndjson(buffer, chunks)
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return MalformedRow(f"JSON inválido: {e}")
+
+def _iter_ndjson(buffer, chunks):
+    for chunk in chain([''], chunks):
+        buffer += chunk
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                yield _parse_line(line)
+    if buffer.strip():
+        yield _parse_line(buffer)
+
+def _iter_array(buffer, chunks):
+    decoder = json.JSONDecoder()
+    position = 0
+    after_value = False
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n':
+            position += 1
+        if position == len(buffer):
+            buffer, position = '', 0
+            chunk = next(chunks, None)
+            if chunk is None:
+                yield MalformedRow("JSON inválido: array não terminado")
+                return
+            buffer = chunk
+            continue
+
+        char = buffer[position]
+        if char == ']':
+            return
+        if char == ',' and after_value:
+            position += 1
+            after_value = False
+            continue
+
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except ValueError as e:
+            chunk = next(chunks, None) if len(buffer) - position <= MAX_ROW_SIZE else None
+            if chunk is None:
+                yield MalformedRow(f"JSON inválido: {e}")
+                return
+            # Objeto cortado entre dois blocos: junta o próximo bloco e tenta de novo
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield row
+        buffer, position = buffer[end:], 0
+        after_value = True
+
+# --- Importação em blocos ---
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def import_users(rows, chunk_size):
+    """Importa os usuários em blocos de `chunk_size`, cada um numa transação, e devolve o
+    relatório por linha ({index, status, id | errors}) junto com os totais."""
+    results = []
+    offset = 0
+    for chunk in _chunks(rows, chunk_size):
+        results.extend(_import_chunk(offset, chunk))
+        offset += len(chunk)
+    created = sum(1 for result in results if result['status'] == 'created')
+    return {'total': len(results), 'created': created, 'failed': len(results) - created, 'results': results}
+
+def _import_chunk(offset, rows):
+    report = [None] * len(rows)
+
+    # 1. Validação do bloco inteiro com o UserInputSchema
+    parsed = [row for row in rows if not isinstance(row, MalformedRow)]
+    positions = [position for position, row in enumerate(rows) if not isinstance(row, MalformedRow)]
+    try:
+        loaded, errors = UserInputSchema().load(parsed, many=True), {}
+    except ValidationError as e:
+        loaded, errors = e.valid_data, e.messages
+    candidates = []
+    for position, row in enumerate(rows):
+        if isinstance(row, MalformedRow):
+            report[position] = {'index': offset + position, 'status': 'invalid', 'errors': {'_row': [row.error]}}
+    for parsed_index, position in enumerate(positions):
+        if parsed_index in errors:
+            report[position] = {'index': offset + position, 'status': 'invalid', 'errors': errors[parsed_index]}
+        else:
+            candidates.append((position, loaded[parsed_index]))
+
+    # 2 a 4. Duplicidades, hashing em paralelo e inserção em lote (uma nova tentativa em caso de corrida)
+    for attempt in range(2):
+        try:
+            _insert_candidates(offset, candidates, report)
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
+    return report
+
+def _insert_candidates(offset, candidates, report):
+    # Uma consulta baseada em conjunto para os e-mails do bloco
+    emails = {data['email'] for _, data in candidates}
+    existing = set(db.session.scalars(select(User.email).where(User.email.in_(emails)))) if emails else set()
+    to_insert = []
+    for position, data in candidates:
+        if data['email'] in existing:
+            report[position] = {'index': offset + position, 'status': 'duplicate',
+                                'errors': {'email': ["Um usuário com este e-mail já existe."]}}
+        else:
+            existing.add(data['email']) # Repetido dentro do próprio bloco
+            to_insert.append((position, data))
+    if not to_insert:
+        return
+
+    hashes = hash_passwords([data['password'] for _, data in to_insert])
+    values = [{'name': data['name'], 'email': data['email'], 'password_hash': password_hash}
+              for (_, data), password_hash in zip(to_insert, hashes)]
+    # executemany numa única transação; RETURNING devolve os ids na ordem dos parâmetros
+    ids = db.session.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), values).all()
+    db.session.commit()
+    invalidate_users()
+    for (position, _), user_id in zip(to_insert, ids):
+        report[position] = {'index': offset + position, 'status': 'created', 'id': user_id}
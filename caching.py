@@ -0,0 +1,243 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import jsonify, current_app, request, g
+from flask_caching import Cache
+from serializers import json_body
+from conditional import etag, not_modified
+
+cache = Cache()
+
+# Backends locais ao processo: cada worker do gunicorn teria sua própria cópia e não
+# enxergaria as invalidações feitas pelos outros
+PROCESS_LOCAL_BACKENDS = ('SimpleCache', 'simple', 'flask_caching.backends.SimpleCache')
+
+# Backends em que `get_many`/`set_many` custam uma ida ao servidor (ou nenhuma). Só neles a leitura em
+# lote passa pelo cache de usuários: no FileSystemCache são dois arquivos lidos por id, mais lento que
+# um único IN no SQLite.
+MULTI_GET_BACKENDS = PROCESS_LOCAL_BACKENDS + (
+    'RedisCache', 'redis', 'flask_caching.backends.RedisCache',
+    'RedisClusterCache', 'rediscluster', 'flask_caching.backends.RedisClusterCache',
+    'MemcachedCache', 'memcached', 'flask_caching.backends.MemcachedCache',
+)
+
+class CacheStats:
+    """Contadores de acertos/faltas de um cache (por processo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+class TTLCache:
+    """Cache LRU em memória, com expiração por TTL e tamanho máximo (por processo)."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.stats.record(True)
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.stats.record(False)
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# Usuário autenticado (identidade do JWT -> dados do usuário), consultado a cada @jwt_required().
+# É local ao processo, mas a chave leva o token de geração do usuário no cache compartilhado
+# (`identity_key`): a troca feita por `invalidate_users` em qualquer worker vale em todos.
+identity_cache = TTLCache()
+
+# Backends sem armazenamento: não guardam os tokens de geração, então a identidade usa só o id
+NULL_BACKENDS = ('NullCache', 'null', 'flask_caching.backends.NullCache')
+
+# Estatísticas expostas em /cache/stats
+stats = {'responses': CacheStats(), 'identity': identity_cache.stats}
+
+def configure_cache(app):
+    """Inicializa o Flask-Caching e expõe os contadores de acerto/falta."""
+    cache.init_app(app)
+    identity_cache.maxsize = app.config.get('JWT_IDENTITY_CACHE_SIZE', 10000)
+    identity_cache.ttl = app.config.get('JWT_IDENTITY_CACHE_TTL', 60)
+    if app.config.get('CACHE_TYPE') in PROCESS_LOCAL_BACKENDS and not app.testing:
+        app.logger.warning("CACHE_TYPE local ao processo: com vários workers as invalidações não são compartilhadas.")
+
+    @app.route('/cache/stats')
+    def cache_stats():
+        """Retorna os contadores de acerto/falta dos caches deste worker."""
+        return jsonify({name: counter.snapshot() for name, counter in stats.items()})
+
+# --- Chaves do cache de respostas de usuários ---
+# Cada chave embute um "token de geração" guardado no próprio backend. Uma escrita troca o token
+# (valor único, não um contador), o que torna inalcançáveis as entradas antigas em todos os workers
+# sem corrida entre leitura e invalidação; elas saem pelo timeout ou pelo CACHE_THRESHOLD.
+LIST_GENERATION_KEY = 'users:gen:list'
+
+def _user_generation_key(user_id):
+    return f'users:gen:{user_id}'
+
+def _generation(key):
+    token = cache.get(key)
+    if token is None:
+        token = uuid.uuid4().hex
+        cache.add(key, token, timeout=0)
+        token = cache.get(key) or token # Outro worker pode ter criado o token antes
+    return token
+
+def _user_entity_key(user_id, token):
+    return f'users:entity:{user_id}:{token}'
+
+def user_cache_key(user_id):
+    """Chave da resposta de GET /v1/users/<id>."""
+    return _user_entity_key(user_id, _generation(_user_generation_key(user_id)))
+
+def identity_key(identity):
+    """Chave de `identity_cache` para a identidade do JWT: o id mais o token de geração do usuário, que
+    muda quando qualquer worker altera ou exclui o usuário (as entradas antigas saem pelo LRU/TTL)."""
+    if current_app.config.get('CACHE_TYPE') in NULL_BACKENDS:
+        return identity # Sem tokens compartilhados: só a invalidação local de `invalidate_users`
+    return f'{identity}:{_generation(_user_generation_key(identity))}'
+
+def list_cache_key(args):
+    """Chave de uma listagem, derivada dos argumentos já normalizados pelo schema."""
+    digest = hashlib.sha1(json.dumps(args, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f'users:list:{_generation(LIST_GENERATION_KEY)}:{digest}'
+
+def invalidate_users(*user_ids):
+    """Invalida as listagens, os usuários alterados e suas identidades (chamar após o commit)."""
+    tokens = {LIST_GENERATION_KEY: uuid.uuid4().hex}
+    tokens.update({_user_generation_key(user_id): uuid.uuid4().hex for user_id in user_ids})
+    cache.set_many(tokens, timeout=0)
+    for user_id in user_ids:
+        identity_cache.invalidate(str(user_id))
+
+def _scoped(key):
+    """Chave no espaço de respostas lidas de uma réplica (replicas.py), separado do primário: um cliente
+    preso ao primário depois de uma escrita lê sem `g.db_replica` e nunca recebe uma entrada de réplica
+    (que pode ser anterior à escrita mesmo com o token de geração novo)."""
+    return f'replica:{key}' if g.get('db_replica') else key
+
+def _fill_timeout():
+    """Timeout de uma entrada nova: o padrão, ou `REPLICA_CACHE_TIMEOUT` quando os dados vieram de uma
+    réplica (replicas.py), que pode estar atrasada em relação à escrita que trocou o token."""
+    return current_app.config.get('REPLICA_CACHE_TIMEOUT', 5) if g.get('db_replica') else None
+
+def cached_response(key, build, counter='responses'):
+    """Retorna a resposta JSON guardada em `key` ou gera o conteúdo com `build()` e o armazena.
+    O cache guarda o corpo já serializado, então um HIT não passa pelo encoder. Exceções (ex.: 404) não são cacheadas."""
+    key = _scoped(key)
+    body = cache.get(key)
+    hit = body is not None
+    if not hit:
+        body = json_body(build())
+        cache.set(key, body, timeout=_fill_timeout())
+    stats[counter].record(hit)
+    response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+def cached_versioned_response(key, load, counter='responses'):
+    """Como `cached_response`, para um recurso versionado: `load()` retorna (conteúdo, versão) e a versão
+    vira o ETag. Um If-None-Match com a versão atual recebe 304 sem serializar o corpo; num HIT, sem
+    consultar o banco. O cache guarda (corpo ou None, versão)."""
+    key = _scoped(key)
+    entry = cache.get(key)
+    hit = entry is not None
+    stats[counter].record(hit)
+    data = None
+    if hit:
+        body, version = entry
+    else:
+        data, version = load()
+        body = None
+    if not_modified(request.headers.get('If-None-Match'), version):
+        if not hit:
+            cache.set(key, (None, version), timeout=_fill_timeout())
+        response = current_app.response_class(status=304)
+    else:
+        if body is None:
+            if data is None: # Entrada guardada por um 304 anterior
+                data, version = load()
+            body = json_body(data)
+            cache.set(key, (body, version), timeout=_fill_timeout())
+        response = current_app.response_class(body, mimetype=current_app.json.mimetype)
+    response.headers['ETag'] = etag(version)
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+def batch_cache_enabled():
+    """Indica se a leitura em lote deve consultar o cache de usuários (ver `MULTI_GET_BACKENDS`)."""
+    return current_app.config.get('CACHE_TYPE') in MULTI_GET_BACKENDS
+
+def cached_user_bodies(user_ids, load_many, counter='responses'):
+    """Corpos JSON (bytes, sem a quebra de linha final) de vários usuários, os mesmos guardados por
+    GET /v1/users/<id>. O cache é lido com dois `get_many` (tokens de geração e entradas); o que faltar
+    vem de `load_many(ids)` -> {id: (conteúdo, versão)} e é gravado com um `set_many`. Ids sem token de
+    geração não são gravados (criar o token aqui poderia sobrescrever uma invalidação concorrente).
+    Ids inexistentes ficam de fora do resultado."""
+    tokens = cache.get_many(*[_user_generation_key(user_id) for user_id in user_ids])
+    keys = {user_id: _scoped(_user_entity_key(user_id, token)) for user_id, token in zip(user_ids, tokens) if token is not None}
+    entries = cache.get_many(*keys.values()) if keys else []
+    bodies = {user_id: entry[0] for user_id, entry in zip(keys, entries) if entry is not None and entry[0] is not None}
+    for user_id in user_ids:
+        stats[counter].record(user_id in bodies)
+
+    pending = [user_id for user_id in user_ids if user_id not in bodies]
+    if pending:
+        fresh = {}
+        for user_id, (data, version) in load_many(pending).items():
+            bodies[user_id] = json_body(data)
+            if user_id in keys:
+                fresh[keys[user_id]] = (bodies[user_id], version)
+        if fresh:
+            cache.set_many(fresh, timeout=_fill_timeout())
+    return {user_id: body.rstrip(b'\n') for user_id, body in bodies.items()}
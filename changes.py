@@ -0,0 +1,101 @@
+"""Feed de alterações de usuários (GET /v1/users/changes) para sincronização incremental.
+
+O log `user_change` é preenchido por triggers (models.py) e só cresce; cada lote devolve, para cada
+usuário alterado depois de `since`, a última operação e o estado atual da linha, então o custo de uma
+sincronização é proporcional ao número de alterações e não ao tamanho da tabela. A compactação
+(`flask compact-changes`) remove entradas substituídas por outras mais novas do mesmo usuário, o que
+não muda o resultado de nenhum `since`, e as exclusões mais antigas que `CHANGE_LOG_RETENTION`;
+quem pedir um `since` anterior às exclusões removidas recebe 410 e precisa refazer a cópia completa
+(`since=0`, que continua válido: uma cópia nova não precisa das exclusões).
+"""
+import threading
+import time
+import click
+from flask import current_app
+from sqlalchemy import select, func, delete, update
+from models import db, User, user_change, user_change_state
+
+def latest_seq():
+    """Último `seq` do log (a compactação pode ter removido a entrada mais recente, uma exclusão)."""
+    head = select(func.coalesce(func.max(user_change.c.seq), 0)).scalar_subquery()
+    return db.session.scalar(select(func.max(head, user_change_state.c.compacted_seq)).where(user_change_state.c.id == 1))
+
+def compacted_seq():
+    """Maior `seq` já removido pela compactação: `since` menor que ele pode ter perdido exclusões."""
+    return db.session.scalar(select(user_change_state.c.compacted_seq).where(user_change_state.c.id == 1)) or 0
+
+def wait_for_changes(since, timeout, interval):
+    """Long-poll: espera até `timeout` segundos por um `seq` maior que `since` e retorna o último `seq`.
+    Cada verificação é uma consulta pelo máximo da chave primária; a transação de leitura é encerrada
+    entre elas para não prender uma conexão nem um snapshot do WAL."""
+    deadline = time.monotonic() + timeout
+    while True:
+        head = latest_seq()
+        db.session.rollback()
+        remaining = deadline - time.monotonic()
+        if head > since or remaining <= 0:
+            return head
+        time.sleep(min(interval, remaining))
+
+def long_poll(since, wait):
+    """Espera por alterações (`wait_for_changes`) por até `wait` segundos, limitado a `CHANGES_MAX_WAIT`.
+    Cada espera prende uma thread do worker, então só `CHANGES_MAX_WAITERS` esperam ao mesmo tempo; com
+    as vagas ocupadas a resposta sai na hora (o cliente volta a perguntar). Retorna se esperou."""
+    config = current_app.config
+    waiters = current_app.extensions['change_waiters']
+    if not waiters.acquire(blocking=False):
+        return False
+    try:
+        wait_for_changes(since, min(wait, config.get('CHANGES_MAX_WAIT', 10)), config.get('CHANGES_POLL_INTERVAL', 0.25))
+    finally:
+        waiters.release()
+    return True
+
+def change_batch(since, limit):
+    """Até `limit` usuários alterados depois de `since`, em ordem do último `seq` de cada um.
+    Retorna (itens, há mais).
+
+    Lê o log em ordem de `seq` a partir de `since` (chave primária) e descarta as entradas com outra mais
+    nova do mesmo usuário (NOT EXISTS pelo índice `(user_id, seq)`), parando em `limit + 1`: cada lote
+    percorre só a sua janela do log, sem agrupar tudo o que veio depois de `since`."""
+    later = user_change.alias('later')
+    superseded = select(later.c.seq).where(later.c.user_id == user_change.c.user_id, later.c.seq > user_change.c.seq).exists()
+    statement = (select(user_change.c.seq, user_change.c.user_id, user_change.c.op, User.name, User.email)
+                 .outerjoin(User, User.id == user_change.c.user_id)
+                 .where(user_change.c.seq > since, ~superseded)
+                 .order_by(user_change.c.seq).limit(limit + 1))
+    rows = db.session.execute(statement).all()
+    items = [{
+        'seq': row.seq,
+        'op': row.op,
+        'id': row.user_id,
+        # Estado atual (igual ao de GET /v1/users/<id>); nulo quando a última operação é a exclusão
+        'user': {'id': row.user_id, 'name': row.name, 'email': row.email} if row.op != 'delete' and row.name is not None else None,
+    } for row in rows[:limit]]
+    return items, len(rows) > limit
+
+def compact_change_log(retention):
+    """Remove as entradas substituídas e as exclusões mais antigas que `retention` segundos.
+    Retorna (entradas removidas, novo `compacted_seq`)."""
+    superseded = db.session.execute(delete(user_change).where(user_change.c.seq.not_in(
+        select(func.max(user_change.c.seq)).group_by(user_change.c.user_id)))).rowcount
+    expired = user_change.c.op == 'delete', user_change.c.changed_at < time.time() - retention
+    horizon = db.session.scalar(select(func.max(user_change.c.seq)).where(*expired))
+    removed = db.session.execute(delete(user_change).where(*expired)).rowcount
+    if horizon is not None:
+        db.session.execute(update(user_change_state).where(user_change_state.c.id == 1).values(
+            compacted_seq=func.max(user_change_state.c.compacted_seq, horizon)))
+    db.session.commit()
+    return superseded + removed, compacted_seq()
+
+def configure_change_log(app):
+    """Cria o limite de long-polls simultâneos do worker e registra o comando `flask compact-changes` (para um cron)."""
+    app.extensions['change_waiters'] = threading.BoundedSemaphore(app.config.get('CHANGES_MAX_WAITERS', 2))
+
+    @app.cli.command('compact-changes')
+    @click.option('--retention', type=float, default=None, help="Segundos de retenção das exclusões (padrão: CHANGE_LOG_RETENTION).")
+    def compact_changes_command(retention):
+        """Compacta o log de alterações de usuários."""
+        retention = current_app.config.get('CHANGE_LOG_RETENTION', 7 * 24 * 3600) if retention is None else retention
+        removed, horizon = compact_change_log(retention)
+        click.echo(f"{removed} entradas removidas; since mínimo aceito: {horizon}")
@@ -0,0 +1,91 @@
+"""Compressão negociada das respostas da API v1 (`Accept-Encoding`).
+
+Usa a codificação aceita pelo cliente com maior `q` entre as de `COMPRESSION_ALGORITHMS` (em empate,
+a ordem da configuração). gzip vem da stdlib; br e zstd só entram com as dependências opcionais
+`brotli` e `zstandard` instaladas. Corpos menores que `COMPRESSION_MIN_SIZE` seguem sem compressão
+(o ganho não paga o custo), e respostas em stream (exportação, listagens grandes) são comprimidas
+bloco a bloco, sem juntar o corpo na memória. Respostas com ETag não são comprimidas: o ETag forte
+identifica os bytes enviados e mudaria com a codificação.
+"""
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError: # Dependência opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError: # Dependência opcional
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+DEFAULT_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+
+def supported_encodings():
+    """Codificações disponíveis neste ambiente."""
+    return {'gzip'} | ({'br'} if brotli is not None else set()) | ({'zstd'} if zstandard is not None else set())
+
+def choose_encoding(accept_encodings, preferred):
+    """Codificação de `preferred` com o maior `q` no Accept-Encoding (0 recusa); None sem nenhuma aceita."""
+    best, best_quality = None, 0
+    for encoding in preferred:
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compressor(encoding, level, flush_each=False):
+    """Retorna (compress(bytes) -> bytes, finish() -> bytes). Com `flush_each` cada bloco sai completo,
+    para o cliente receber os dados à medida que o stream avança."""
+    if encoding == 'gzip':
+        stream = zlib.compressobj(level, zlib.DEFLATED, 31) # 31: cabeçalho gzip
+        if flush_each:
+            return (lambda chunk: stream.compress(chunk) + stream.flush(zlib.Z_SYNC_FLUSH)), stream.flush
+        return stream.compress, stream.flush
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=level)
+        if flush_each:
+            return (lambda chunk: stream.process(chunk) + stream.flush()), stream.finish
+        return stream.process, stream.finish
+    stream = zstandard.ZstdCompressor(level=level).compressobj()
+    if flush_each:
+        return (lambda chunk: stream.compress(chunk) + stream.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)), stream.flush
+    return stream.compress, stream.flush
+
+def _compress_stream(chunks, encoding, level):
+    compress, finish = compressor(encoding, level, flush_each=True)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            yield compress(chunk)
+    yield finish()
+
+def compress_response(response):
+    """`after_request` do blueprint: comprime a resposta quando o cliente aceita e vale a pena."""
+    config = current_app.config
+    if (not config.get('COMPRESSION_ENABLED', True) or response.status_code != 200
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers or 'ETag' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    preferred = [encoding for encoding in config.get('COMPRESSION_ALGORITHMS', ('zstd', 'br', 'gzip'))
+                 if encoding in supported_encodings()]
+    encoding = choose_encoding(request.accept_encodings, preferred)
+    if encoding is None:
+        return response
+    level = config.get('COMPRESSION_LEVELS', {}).get(encoding, DEFAULT_LEVELS[encoding])
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < config.get('COMPRESSION_MIN_SIZE', 1024):
+            return response
+        compress, finish = compressor(encoding, level)
+        response.set_data(compress(body) + finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
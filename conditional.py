@@ -0,0 +1,30 @@
+"""Requisições condicionais sobre usuários.
+
+O ETag é a versão da linha (`User.version_id`). `If-None-Match` com a versão atual recebe 304 sem
+corpo; `If-Match` com uma versão desatualizada recebe 412. Os cabeçalhos são lidos pelo parser do
+werkzeug, então as mesmas funções servem ao modo ASGI.
+"""
+from werkzeug.http import parse_etags, quote_etag
+
+def etag(version):
+    """Valor do cabeçalho ETag (forte) de uma versão."""
+    return quote_etag(str(version))
+
+def not_modified(if_none_match, version):
+    """Indica se o `If-None-Match` recebido já tem a versão atual (comparação fraca, aceita `*`)."""
+    return bool(if_none_match) and parse_etags(if_none_match).contains_weak(str(version))
+
+def expected_versions(if_match):
+    """Versões aceitas por um `If-Match`, para usar no WHERE de uma escrita. None quando não há
+    condição (cabeçalho ausente ou `*`); lista vazia quando nenhuma versão é válida."""
+    if not if_match:
+        return None
+    etags = parse_etags(if_match)
+    if etags.star_tag:
+        return None
+    return [int(tag) for tag in etags.as_set() if tag.isdigit()]
+
+def precondition_holds(if_match, version):
+    """Indica se a versão atual satisfaz o `If-Match` (comparação forte; ausente vale sempre)."""
+    expected = expected_versions(if_match)
+    return expected is None or version in expected
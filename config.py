@@ -9,10 +9,43 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///users.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Perfil do engine SQLite (models.configure_sqlite_profile); "default" mantém o comportamento do SQLAlchemy.
+    # Pool e pre-ping valem apenas para bancos em arquivo. Valores aplicados: `flask db-profile`
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'production')
+    SQLITE_PROFILES = {
+        'default': {},
+        'production': {
+            'pragmas': {
+                'busy_timeout': 5000, # ms esperando o lock de escrita antes de "database is locked"
+                'journal_mode': 'WAL', # Leitores não bloqueiam o escritor (e vice-versa)
+                'synchronous': 'NORMAL', # Em WAL, fsync apenas nos checkpoints
+                'cache_size': -65536, # 64 MiB de cache de páginas por conexão
+                'mmap_size': 268435456, # 256 MiB lidos via mmap
+                'temp_store': 'MEMORY',
+            },
+            'engine_options': {
+                'pool_size': 10, # Conexões por worker (>= threads do gunicorn)
+                'max_overflow': 5,
+                'pool_pre_ping': True,
+                'pool_recycle': 3600,
+            },
+        },
+    }
+
+    # Réplicas de leitura (replicas.py): GET/HEAD leem delas; escritas e quem acabou de escrever ficam no primário
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_STICKY_SECONDS = 5 # Leituras no primário depois de uma escrita do mesmo cliente
+    REPLICA_CACHE_TIMEOUT = 5 # Timeout no cache de respostas das leituras feitas numa réplica
+    REPLICA_POOL_RECYCLE = 60 # Segundos até reabrir uma conexão (enxerga o snapshot novo)
+
     # Configuração do JWT 
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'uma-chave-secreta-de-fallback'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'uma-chave-jwt-muito-secreta-de-fallback'
+    JWT_IDENTITY_CACHE_SIZE = 10000 # Máximo de usuários autenticados em cache por worker
+    JWT_IDENTITY_CACHE_TTL = 60 # Segundos até reler o usuário do banco
+    JWT_BLOCKLIST_SYNC_INTERVAL = 1.0 # Segundos entre as leituras das revogações novas (blocklist.py), por worker
+    ADMIN_USER_IDS = [user_id for user_id in os.environ.get('ADMIN_USER_IDS', '').split(',') if user_id] # Podem revogar tokens
 
     # Swagger
     API_TITLE = "API de Usuários e Autenticação" # Título
@@ -37,17 +70,70 @@ class Config:
         }
     }
 
+    # Bcrypt: custo (work factor) e pool de processos dedicado ao hashing
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12)) # Hashes com outro custo são refeitos no login
+    BCRYPT_POOL_SIZE = int(os.environ.get('BCRYPT_POOL_SIZE', 2)) # Processos por worker; 0 = inline
+    BCRYPT_QUEUE_DEPTH = 16 # Tarefas aguardando além das em execução; acima disso responde 503
+    BCRYPT_TIMEOUT = 10 # Segundos
+
     # Configuração de paginação 
     PER_PAGE = 10
+    COUNT_ESTIMATE_SAMPLE = 10000 # Linhas examinadas pelo total estimado (count=estimate) de listagens filtradas
+    PUBLIC_MAX_PER_PAGE = 100 # Acima disso a listagem exige token (consumidores internos, até 10000)
+    STREAM_MIN_PER_PAGE = 1000 # Acima disso a página é gerada em stream, sem cache (serializers.stream_page)
+
+    # Compressão das respostas da API v1 (compression.py); br e zstd só com `brotli`/`zstandard` instalados
+    COMPRESSION_ENABLED = True
+    COMPRESSION_ALGORITHMS = ('zstd', 'br', 'gzip') # Preferência em empate de `q` no Accept-Encoding
+    COMPRESSION_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+    COMPRESSION_MIN_SIZE = 1024 # Bytes; corpos menores seguem sem compressão
+
+    # Importação em lote: linhas validadas, verificadas e inseridas por transação
+    BULK_IMPORT_CHUNK_SIZE = 500
+    EXPORT_BATCH_SIZE = 1000 # Linhas buscadas do cursor por vez na exportação
+    BULK_WRITE_MAX_ROWS = 1000 # Máximo de usuários atingidos por PATCH/DELETE /v1/users (acima disso, 422)
+
+    # Feed de alterações (GET /v1/users/changes, changes.py)
+    CHANGE_LOG_RETENTION = 7 * 24 * 3600 # Segundos que as exclusões ficam no log (flask compact-changes)
+    CHANGES_POLL_INTERVAL = 0.25 # Segundos entre as verificações do long-poll (`wait`)
+    # Cada long-poll prende uma thread do worker (8 no gunicorn do Dockerfile) enquanto espera: no máximo
+    # CHANGES_MAX_WAITERS esperam ao mesmo tempo por worker (os demais respondem na hora), por até CHANGES_MAX_WAIT s
+    CHANGES_MAX_WAITERS = 2
+    CHANGES_MAX_WAIT = 10
+
+    # Busca por substring em name/email via índice FTS5 trigram (somente SQLite)
+    USER_SEARCH_INDEX = True
+
+    # Logging (structured_logging.py): JSON por linha, escrito por uma thread de fundo
+    LOG_FILE = 'logs/flask_crud.log' # None desativa o arquivo
+    LOG_LEVEL = 'INFO'
+    LOG_MAX_BYTES = 10 * 1024 * 1024 # Rotação a cada 10 MiB
+    LOG_BACKUP_COUNT = 5
+    LOG_QUEUE_SIZE = 10000 # Registros aguardando a escrita; acima disso são descartados
+    LOG_SAMPLE_RATE = 10 # Com a fila acima da metade, mantém 1 a cada N registros abaixo de WARNING
+    LOG_ACCESS = True # Uma linha por requisição com status e latência
+
+    # Instrumentação: cabeçalho Server-Timing e histogramas em /metrics (por worker)
+    SERVER_TIMING = True
+    METRICS_ENABLED = True
 
     # Limiter 
     LIMITER_DEFAULT_LIMIT = "200 per day"
-    LIMITER_STORAGE_URI = "memory://"
+    # Contadores compartilhados pelos workers do host (limiter_storage.py); "memory://" é por processo
+    RATELIMIT_STORAGE_URI = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'ratelimit.db')
+    RATELIMIT_STRATEGY = "sliding-window-counter"
 
     # Cache
-    CACHE_TYPE = "SimpleCache" # "RedisCache".
+    # FileSystemCache é compartilhado pelos workers do gunicorn no mesmo host; "RedisCache" para vários hosts
+    CACHE_TYPE = "FileSystemCache"
+    CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'cache')
     CACHE_DEFAULT_TIMEOUT = 300 # Segundos
+    CACHE_THRESHOLD = 1000 # Máximo de entradas antes da remoção (SimpleCache/FileSystemCache)
 
 class TestConfig(Config): # Herda de Config para manter outras configurações
     TESTING = True # Indica que a aplicação está em modo de teste
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:' # Usa banco de dados SQLite em memória
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:' # Usa banco de dados SQLite em memória
+    CACHE_TYPE = "SimpleCache" # Cache em memória, isolado por processo de teste
+    RATELIMIT_STORAGE_URI = "memory://" # Contadores isolados por processo de teste
+    LOG_FILE = None # Sem arquivo de log nos testes
+    BCRYPT_LOG_ROUNDS = 4 # Custo mínimo para acelerar os testes
\ No newline at end of file
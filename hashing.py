@@ -0,0 +1,182 @@
+import atexit
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from instrumentation import phase
+
+# Funções executadas nos processos do pool (precisam ser importáveis no nível do módulo).
+# Recebem bytes já preparados por `encode_password`; também usadas pelo modo ASGI (asgi.py).
+def bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+def bcrypt_hash_batch(passwords, rounds):
+    return [bcrypt_hash(password, rounds) for password in passwords]
+
+def bcrypt_check(password_hash, password):
+    return bcrypt.checkpw(password, password_hash)
+
+def hash_rounds(password_hash):
+    """Custo (log rounds) de um hash bcrypt, ou None se o formato não for reconhecido."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def encode_password(password, handle_long_passwords=False):
+    # Mesmo tratamento do Flask-Bcrypt para senhas longas (prefixo SHA-256)
+    password = password.encode('utf-8')
+    if handle_long_passwords:
+        password = hashlib.sha256(password).hexdigest().encode('utf-8')
+    return password
+
+# Início dos processos do pool: forkserver onde existe (Linux), spawn nos demais
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+class HashingPool:
+    """Pool de processos dedicado ao bcrypt, com limite de fila.
+
+    Tira o hashing da thread da requisição e limita a quantidade de núcleos usados por
+    ele; quando há mais de `BCRYPT_POOL_SIZE + BCRYPT_QUEUE_DEPTH` tarefas pendentes a
+    requisição falha rápido com 503 em vez de ocupar o worker. Com `BCRYPT_POOL_SIZE = 0`
+    o hashing roda inline.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.pending = 0 # Tarefas em execução ou na fila
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('BCRYPT_LOG_ROUNDS', 12)
+        app.config.setdefault('BCRYPT_POOL_SIZE', 2)
+        app.config.setdefault('BCRYPT_QUEUE_DEPTH', 16)
+        app.config.setdefault('BCRYPT_TIMEOUT', 10)
+        app.extensions['hashing_pool'] = self
+
+    def _get_executor(self, size):
+        # Criado sob demanda em cada processo: o pool não sobrevive ao fork dos workers do gunicorn.
+        # Os filhos saem de um forkserver (ou spawn): um fork do worker gthread copiaria locks de outras threads
+        with self._lock:
+            if self._pid != os.getpid():
+                # Processo novo (fork): as tarefas contadas são do pai e nunca chamarão `_release` aqui.
+                # Num executor recriado depois de uma falha o contador segue: as tarefas do antigo ainda o liberam
+                self._executor = None
+                self._pid = os.getpid()
+                self.pending = 0
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context(START_METHOD))
+            return self._executor
+
+    def _discard(self, executor):
+        """Descarta um executor quebrado (um filho morreu); o próximo `_get_executor` cria outro."""
+        with self._lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def run(self, fn, *args):
+        return self.run_many(fn, [args])[0]
+
+    def run_many(self, fn, calls, timeout=None):
+        """Executa `fn(*args)` para cada tupla de `calls` em paralelo no pool e devolve os
+        resultados na mesma ordem. Reserva todas as vagas de uma vez ou falha com 503.
+        `timeout` é o prazo de cada chamada (padrão `BCRYPT_TIMEOUT`)."""
+        config = current_app.config
+        size = config['BCRYPT_POOL_SIZE']
+        if size <= 0:
+            return [fn(*args) for args in calls]
+
+        # Um filho morto (OOM, sinal) quebra o executor inteiro: descarta e tenta uma vez num novo
+        for _ in range(2):
+            executor = self._get_executor(size)
+            try:
+                return self._run_on(executor, fn, calls, timeout, size)
+            except BrokenProcessPool:
+                current_app.logger.warning("Pool do bcrypt quebrado (processo filho encerrado); recriando.")
+                self._discard(executor)
+        raise ServiceUnavailable("Processamento de senhas indisponível, tente novamente.")
+
+    def _run_on(self, executor, fn, calls, timeout, size):
+        config = current_app.config
+        with self._lock:
+            if self.pending + len(calls) > size + config['BCRYPT_QUEUE_DEPTH']:
+                raise ServiceUnavailable("Fila de processamento de senhas cheia, tente novamente.")
+            self.pending += len(calls)
+        futures = []
+        try:
+            for args in calls:
+                futures.append(executor.submit(fn, *args))
+        except Exception:
+            for _ in range(len(calls) - len(futures)):
+                self._release()
+            for future in futures:
+                future.add_done_callback(self._release)
+            raise
+        for future in futures:
+            future.add_done_callback(self._release)
+        # Prazo proporcional às rodadas de tarefas que cada processo executará
+        timeout = (timeout or config['BCRYPT_TIMEOUT']) * -(-len(calls) // size)
+        try:
+            return [future.result(timeout=timeout) for future in futures]
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()
+            raise ServiceUnavailable("Tempo esgotado no processamento da senha, tente novamente.")
+
+hashing_pool = HashingPool()
+atexit.register(hashing_pool.shutdown)
+
+def _encode(password):
+    return encode_password(password, current_app.config.get('BCRYPT_HANDLE_LONG_PASSWORDS', False))
+
+def hash_password(password):
+    """Gera o hash bcrypt da senha com o custo `BCRYPT_LOG_ROUNDS`."""
+    with phase('bcrypt'):
+        return hashing_pool.run(bcrypt_hash, _encode(password), current_app.config['BCRYPT_LOG_ROUNDS'])
+
+def hash_passwords(passwords):
+    """Gera os hashes de várias senhas, repartidas entre os processos do pool (uma tarefa por processo)."""
+    if not passwords:
+        return []
+    config = current_app.config
+    encoded = [_encode(password) for password in passwords]
+    parts = max(1, min(config['BCRYPT_POOL_SIZE'], len(encoded)))
+    batches = [encoded[index::parts] for index in range(parts)]
+    with phase('bcrypt'):
+        results = hashing_pool.run_many(bcrypt_hash_batch, [(batch, config['BCRYPT_LOG_ROUNDS']) for batch in batches],
+                                        timeout=config['BCRYPT_TIMEOUT'] * len(batches[0]))
+    hashes = [None] * len(encoded)
+    for index, batch_hashes in enumerate(results):
+        hashes[index::parts] = batch_hashes
+    return hashes
+
+def check_password(password_hash, password):
+    """Verifica a senha contra o hash bcrypt armazenado."""
+    if not isinstance(password, str) or not password_hash:
+        return False
+    with phase('bcrypt'):
+        return hashing_pool.run(bcrypt_check, password_hash.encode('utf-8'), _encode(password))
+
+def needs_rehash(password_hash):
+    """Indica se o hash foi gerado com um custo diferente do configurado."""
+    rounds = hash_rounds(password_hash)
+    return rounds is not None and rounds != current_app.config['BCRYPT_LOG_ROUNDS']
@@ -0,0 +1,154 @@
+"""Instrumentação por requisição: tempo por fase (argumentos, JWT, SQL, bcrypt, serialização),
+cabeçalho `Server-Timing` e histogramas no formato do Prometheus em `/metrics`.
+
+As fases são medidas com `phase(name)` (sem efeito fora de uma requisição) e, no SQL, pelos
+eventos do engine. Os histogramas são por processo: com vários workers do gunicorn cada um
+expõe os seus (raspe cada worker ou agregue por instância).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from webargs.flaskparser import FlaskParser
+
+PHASES = ('args', 'jwt', 'sql', 'bcrypt', 'serialize')
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    """Histograma cumulativo com rótulos, renderizado no formato texto do Prometheus (por processo)."""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self._lock = threading.Lock()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {} # rótulos -> [contagens por bucket, soma, total]
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                base = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{base}}} {total}')
+                lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+request_duration = Histogram('http_request_duration_seconds', 'Duração das requisições.',
+                             ('endpoint', 'method', 'status'), DURATION_BUCKETS)
+phase_duration = Histogram('http_request_phase_seconds', 'Tempo por fase da requisição.',
+                           ('endpoint', 'method', 'phase'), DURATION_BUCKETS)
+sql_queries = Histogram('http_request_sql_queries', 'Consultas SQL por requisição.',
+                        ('endpoint', 'method'), QUERY_BUCKETS)
+histograms = (request_duration, phase_duration, sql_queries)
+
+# --- Medição das fases ---
+def record(name, seconds, count=1):
+    """Soma `seconds` (e `count` ocorrências) à fase `name` da requisição atual."""
+    if not has_request_context() or 'timings' not in g:
+        return
+    entry = g.timings.setdefault(name, [0.0, 0])
+    entry[0] += seconds
+    entry[1] += count
+
+@contextmanager
+def phase(name):
+    """Mede o bloco como a fase `name`; chamadas aninhadas da mesma fase contam uma vez só."""
+    if not has_request_context() or 'timings' not in g or name in g.active_phases:
+        yield
+        return
+    g.active_phases.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        g.active_phases.discard(name)
+        record(name, time.perf_counter() - start)
+
+class TimedFlaskParser(FlaskParser):
+    """Parser do webargs que conta a leitura e validação dos argumentos na fase "args"."""
+
+    def parse(self, *args, **kwargs):
+        with phase('args'):
+            return super().parse(*args, **kwargs)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['query_start'].pop()
+    record('sql', time.perf_counter() - start)
+
+def instrument_engine(engine):
+    """Conta tempo e quantidade das consultas SQL executadas durante as requisições."""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+def server_timing(timings, total):
+    entries = []
+    for name in PHASES:
+        if name in timings:
+            seconds, count = timings[name]
+            description = f';desc="{count} queries"' if name == 'sql' else ''
+            entries.append(f"{name};dur={seconds * 1000:.2f}{description}")
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+def configure_instrumentation(app, engine):
+    """Registra a medição por requisição, o cabeçalho Server-Timing e o endpoint /metrics."""
+    app.config.setdefault('SERVER_TIMING', True)
+    app.config.setdefault('METRICS_ENABLED', True)
+    instrument_engine(engine)
+
+    @app.before_request
+    def start_timing():
+        g.request_start = time.perf_counter()
+        g.timings = {}
+        g.active_phases = set()
+
+    @app.after_request
+    def finish_timing(response):
+        if 'timings' not in g or request.endpoint == 'metrics':
+            return response
+        total = time.perf_counter() - g.request_start
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = server_timing(g.timings, total)
+        if app.config['METRICS_ENABLED']:
+            # Rótulo pela regra da rota (ex.: /v1/users/<int:user_id>), não pela URL concreta
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_duration.observe((endpoint, request.method, str(response.status_code)), total)
+            for name, (seconds, _count) in g.timings.items():
+                phase_duration.observe((endpoint, request.method, name), seconds)
+            sql_queries.observe((endpoint, request.method), g.timings.get('sql', (0, 0))[1])
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Histogramas deste worker no formato texto do Prometheus."""
+        lines = []
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4; charset=utf-8')
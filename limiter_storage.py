@@ -0,0 +1,162 @@
+"""Storage do Flask-Limiter (biblioteca `limits`) compartilhado entre os workers de um mesmo host.
+
+Os contadores ficam num arquivo SQLite em modo WAL, então todos os workers do gunicorn enxergam
+os mesmos valores e o limite é exato sem precisar de um Redis. Cada verificação é um único
+comando SQL (UPSERT com RETURNING) ou uma transação curta no sliding window, na ordem de
+microssegundos. Registra o esquema `sqlite://`:
+
+    RATELIMIT_STORAGE_URI = "sqlite:////caminho/absoluto/ratelimit.db"
+    RATELIMIT_STRATEGY = "sliding-window-counter" # ou "fixed-window"
+
+Opções na query string: `gc_interval` (segundos entre as remoções de chaves expiradas, padrão 60)
+e `busy_timeout` (ms, padrão 5000). A estratégia "moving-window" não é suportada.
+"""
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+from urllib.parse import urlparse, parse_qs, unquote
+from limits.storage.base import Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS ratelimit_counter ("
+    " key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS ratelimit_counter_expiry ON ratelimit_counter (expiry)",
+)
+
+# Incremento atômico: um contador expirado recomeça do zero com uma nova expiração
+INCR_SQL = (
+    "INSERT INTO ratelimit_counter (key, value, expiry) VALUES (:key, :amount, :now + :expiry) "
+    "ON CONFLICT (key) DO UPDATE SET "
+    " value = CASE WHEN expiry <= :now THEN excluded.value ELSE value + excluded.value END, "
+    " expiry = CASE WHEN expiry <= :now THEN excluded.expiry ELSE expiry END "
+    "RETURNING value"
+)
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Contadores de rate limit num arquivo SQLite (WAL) compartilhado pelos processos."""
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        parsed = urlparse(uri)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        query.update(options)
+        self.path = unquote(parsed.path)[1:] if parsed.path.startswith('//') else unquote(parsed.path).lstrip('/')
+        if not self.path:
+            raise ValueError("Informe o arquivo do storage: sqlite:///caminho/ratelimit.db")
+        self.gc_interval = float(query.get('gc_interval', 60))
+        self.busy_timeout = int(query.get('busy_timeout', 5000))
+        self._local = threading.local()
+        self._next_gc = 0.0
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        try:
+            connection.execute("PRAGMA journal_mode = WAL")
+            for statement in SCHEMA:
+                connection.execute(statement)
+        finally:
+            connection.close()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    def _connect(self):
+        # isolation_level=None: cada comando é a sua própria transação (autocommit)
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        connection.execute("PRAGMA synchronous = OFF") # Contadores não precisam sobreviver a uma queda do host
+        return connection
+
+    @property
+    def _connection(self):
+        # Uma conexão por thread e por processo (não pode atravessar o fork dos workers)
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _collect_garbage(self, now):
+        """Remove as chaves expiradas, no máximo a cada `gc_interval` segundos por processo."""
+        if now < self._next_gc:
+            return
+        self._next_gc = now + self.gc_interval
+        self._connection.execute("DELETE FROM ratelimit_counter WHERE expiry <= ?", (now,))
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        self._collect_garbage(now)
+        # fetchall() conclui o comando (e o autocommit) antes de retornar
+        return self._connection.execute(INCR_SQL, {'key': key, 'amount': amount, 'now': now, 'expiry': expiry}).fetchall()[0][0]
+
+    def get(self, key):
+        row = self._connection.execute(
+            "SELECT value FROM ratelimit_counter WHERE key = ? AND expiry > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connection.execute(
+            "SELECT expiry FROM ratelimit_counter WHERE key = ? AND expiry > ?", (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection.execute("DELETE FROM ratelimit_counter").rowcount
+
+    def clear(self, key):
+        self._connection.execute("DELETE FROM ratelimit_counter WHERE key = ?", (key,))
+
+    # --- Sliding window counter ---
+    def _window(self, connection, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        counts = dict(connection.execute(
+            "SELECT key, value FROM ratelimit_counter WHERE key IN (?, ?) AND expiry > ?",
+            (previous_key, current_key, now)).fetchall())
+        previous_count = counts.get(previous_key, 0)
+        current_count = counts.get(current_key, 0)
+        # Mesmas fórmulas do MemoryStorage do `limits`
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        self._collect_garbage(now)
+        connection = self._connection
+        # BEGIN IMMEDIATE: leitura e incremento sob o lock de escrita, sem corrida entre workers
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            current_key, previous_count, previous_ttl, current_count, _ = self._window(connection, key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                connection.execute("COMMIT")
+                return False
+            connection.execute(INCR_SQL, {'key': current_key, 'amount': amount, 'now': now, 'expiry': 2 * expiry}).fetchall()
+            connection.execute("COMMIT")
+            return True
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def get_sliding_window(self, key, expiry):
+        _, previous_count, previous_ttl, current_count, current_ttl = self._window(
+            self._connection, key, expiry, time.time())
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._connection.execute("DELETE FROM ratelimit_counter WHERE key IN (?, ?)", (previous_key, current_key))
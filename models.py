@@ -1,21 +1,51 @@
+import json
+import click
+from flask import g, has_request_context, current_app
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
+from sqlalchemy import event, select, and_, table, column, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateTable, CreateIndex
+from sqlalchemy.exc import OperationalError
+import hashing
 
-db = SQLAlchemy()
+class RoutingSession(Session):
+    """Sessão que envia os SELECTs de uma requisição de leitura à réplica escolhida em `g.db_replica`
+    (replicas.py); escritas e flushes ficam no primário."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context():
+            replica = g.get('db_replica')
+            if replica is not None and getattr(clause, 'is_select', False):
+                return current_app.extensions['replicas'][replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 bcrypt_obj = Bcrypt() 
 
 class User(db.Model):
+    # Ids nunca reutilizados: o ETag é só a versão, então um id reaproveitado depois de excluir o maior
+    # faria um If-None-Match/If-Match antigo valer para outro usuário (bancos antigos: `add_user_autoincrement`)
+    __table_args__ = {'sqlite_autoincrement': True}
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True) # Índice (name, rowid) atende a ordenação por keyset
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False) 
+    # Versão da linha: o ORM incrementa a cada UPDATE e confere no WHERE (concorrência otimista); vira o ETag
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version_id}
+    # O bcrypt roda no pool de processos de hashing.py (503 quando a fila está cheia)
     def set_password(self, password):
-        self.password_hash = bcrypt_obj.generate_password_hash(password).decode('utf-8')
+        self.password_hash = hashing.hash_password(password)
 
     def check_password(self, password):
-        return bcrypt_obj.check_password_hash(self.password_hash, password)
+        return hashing.check_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return hashing.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.email}>'
@@ -26,3 +56,246 @@ class User(db.Model):
             'name': self.name,
             'email': self.email
         }
+
+class RevokedToken(db.Model):
+    """Revogação de um token (`jti`) ou de todos os tokens de um usuário emitidos até `revoked_at` (blocklist.py)."""
+    __tablename__ = 'revoked_token'
+    __table_args__ = {'sqlite_autoincrement': True} # Ids nunca reutilizados: a sincronização lê `id > último visto`
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    revoked_at = db.Column(db.Float, nullable=False) # Epoch
+    expires_at = db.Column(db.Float, nullable=False, index=True) # Depois disso o token expiraria de qualquer forma
+
+# --- Índice de busca por substring (SQLite FTS5 com tokenizer trigram) ---
+# Tabela "external content": guarda apenas o índice de trigramas de name/email,
+# mantido em sincronia com `user` por triggers (cobre ORM, SQL puro e cargas em lote).
+USER_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+    "name, email, content='user', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS user_search_ai AFTER INSERT ON user BEGIN "
+    "INSERT INTO user_search(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS user_search_ad AFTER DELETE ON user BEGIN "
+    "INSERT INTO user_search(user_search, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS user_search_au AFTER UPDATE OF name, email ON user BEGIN "
+    "INSERT INTO user_search(user_search, rowid, name, email) VALUES ('delete', old.id, old.name, old.email); "
+    "INSERT INTO user_search(rowid, name, email) VALUES (new.id, new.name, new.email); END",
+)
+# O trigram só consegue usar o índice com pelo menos 3 caracteres
+SEARCH_MIN_LENGTH = 3
+
+user_search = table('user_search', column('rowid'), column('name'), column('email'))
+
+def install_search_index(connection):
+    """Cria (se preciso) o índice FTS5 e seus triggers; reconstrói o índice quando é novo.
+    Retorna False quando o banco não é SQLite ou não tem FTS5 compilado."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'").first()
+    try:
+        for statement in USER_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+    except OperationalError:
+        return False
+    if not exists:
+        connection.exec_driver_sql("INSERT INTO user_search(user_search) VALUES ('rebuild')")
+    return True
+
+def normalize_email(email):
+    """Forma canônica do e-mail gravado e consultado: sem espaços nas pontas e em minúsculas."""
+    return email.strip().lower() if isinstance(email, str) else email
+
+def normalize_emails(connection):
+    """E-mails gravados antes da normalização: passa para minúsculas os que não colidem com outro usuário.
+    Retorna quantos continuaram com maiúsculas (colisões a resolver manualmente)."""
+    connection.exec_driver_sql(
+        "UPDATE user SET email = lower(trim(email)), version_id = version_id + 1 WHERE email != lower(trim(email)) AND NOT EXISTS "
+        "(SELECT 1 FROM user AS other WHERE other.id != user.id AND lower(trim(other.email)) = lower(trim(user.email)))")
+    return connection.exec_driver_sql("SELECT COUNT(*) FROM user WHERE email != lower(trim(email))").scalar()
+
+def add_version_column(connection):
+    """Bancos criados antes do versionamento: adiciona `user.version_id` (linhas existentes ficam na versão 1)."""
+    columns = {column['name'] for column in inspect(connection).get_columns('user')}
+    if 'version_id' in columns:
+        return False
+    connection.exec_driver_sql("ALTER TABLE user ADD COLUMN version_id INTEGER NOT NULL DEFAULT 1")
+    return True
+
+def add_user_autoincrement(connection):
+    """Bancos criados antes do AUTOINCREMENT em `user`: recria a tabela (o SQLite não altera a chave) com
+    as mesmas linhas e índices. A sequência começa no maior id já visto, inclusive os excluídos que
+    aparecem no log de alterações. Os triggers da tabela antiga somem com ela; os `install_*` seguintes
+    os recriam. Retorna False fora do SQLite ou quando a tabela já está atualizada."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    ddl = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'user'").scalar()
+    if ddl is None or 'AUTOINCREMENT' in ddl.upper():
+        return False
+    names = ', '.join(f'"{column.name}"' for column in User.__table__.columns)
+    connection.exec_driver_sql("ALTER TABLE user RENAME TO user_before_autoincrement")
+    connection.exec_driver_sql(str(CreateTable(User.__table__).compile(dialect=connection.dialect)))
+    connection.exec_driver_sql(f"INSERT INTO user ({names}) SELECT {names} FROM user_before_autoincrement ORDER BY id")
+    connection.exec_driver_sql("DROP TABLE user_before_autoincrement")
+    for index in User.__table__.indexes:
+        connection.exec_driver_sql(str(CreateIndex(index).compile(dialect=connection.dialect)))
+    connection.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'user', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'user')")
+    if connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_change'").first():
+        connection.exec_driver_sql(
+            "UPDATE sqlite_sequence SET seq = max(seq, (SELECT coalesce(max(user_id), 0) FROM user_change)) WHERE name = 'user'")
+    return True
+
+def install_user_indexes(connection):
+    """Bancos criados antes dos índices de `User` (ex.: `name`, usado pela paginação por cursor com
+    `sort_by=name`): cria os que faltam. O `create_all` só cria índices junto com uma tabela nova."""
+    for index in User.__table__.indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+# --- Contador de usuários mantido por triggers (total da listagem sem COUNT(*)) ---
+# Atualizado na mesma transação de cada INSERT/DELETE, inclusive SQL puro e cargas em lote.
+USER_COUNT_DDL = (
+    "CREATE TABLE IF NOT EXISTS user_count (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)",
+    "CREATE TRIGGER IF NOT EXISTS user_count_ai AFTER INSERT ON user BEGIN "
+    "UPDATE user_count SET total = total + 1 WHERE id = 1; END",
+    "CREATE TRIGGER IF NOT EXISTS user_count_ad AFTER DELETE ON user BEGIN "
+    "UPDATE user_count SET total = total - 1 WHERE id = 1; END",
+)
+
+user_count = table('user_count', column('id'), column('total'))
+
+def install_user_counter(connection):
+    """Cria (se preciso) o contador e seus triggers e o inicializa com o COUNT(*) atual.
+    Retorna False quando o banco não é SQLite."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    for statement in USER_COUNT_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT OR IGNORE INTO user_count (id, total) SELECT 1, COUNT(*) FROM user")
+    return True
+
+# --- Log de alterações (feed de GET /v1/users/changes) ---
+# Só acrescenta linhas, na mesma transação de cada escrita em `user` (triggers). AUTOINCREMENT garante
+# que um `seq` nunca é reutilizado, mesmo depois da compactação (changes.py).
+NOW_EPOCH = "((julianday('now') - 2440587.5) * 86400.0)"
+USER_CHANGE_DDL = (
+    "CREATE TABLE IF NOT EXISTS user_change_state (id INTEGER PRIMARY KEY CHECK (id = 1), compacted_seq INTEGER NOT NULL)",
+    "CREATE TRIGGER IF NOT EXISTS user_change_ai AFTER INSERT ON user BEGIN "
+    f"INSERT INTO user_change (user_id, op, changed_at) VALUES (new.id, 'insert', {NOW_EPOCH}); END",
+    "CREATE TRIGGER IF NOT EXISTS user_change_au AFTER UPDATE OF name, email ON user "
+    "WHEN old.name IS NOT new.name OR old.email IS NOT new.email BEGIN "
+    f"INSERT INTO user_change (user_id, op, changed_at) VALUES (new.id, 'update', {NOW_EPOCH}); END",
+    "CREATE TRIGGER IF NOT EXISTS user_change_ad AFTER DELETE ON user BEGIN "
+    f"INSERT INTO user_change (user_id, op, changed_at) VALUES (old.id, 'delete', {NOW_EPOCH}); END",
+    "INSERT OR IGNORE INTO user_change_state (id, compacted_seq) VALUES (1, 0)",
+    # Última entrada de cada usuário (changes.change_batch e a compactação)
+    "CREATE INDEX IF NOT EXISTS ix_user_change_user_seq ON user_change (user_id, seq)",
+)
+
+user_change = table('user_change', column('seq'), column('user_id'), column('op'), column('changed_at'))
+user_change_state = table('user_change_state', column('id'), column('compacted_seq'))
+
+def install_change_log(connection):
+    """Cria (se preciso) o log de alterações e seus triggers; num log novo registra os usuários já
+    existentes como inserções, para que `since=0` reproduza a tabela inteira. Retorna False fora do SQLite."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_change'").first()
+    connection.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS user_change (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "user_id INTEGER NOT NULL, op TEXT NOT NULL, changed_at REAL NOT NULL)")
+    for statement in USER_CHANGE_DDL:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        connection.exec_driver_sql(
+            f"INSERT INTO user_change (user_id, op, changed_at) SELECT id, 'insert', {NOW_EPOCH} FROM user ORDER BY id")
+    return True
+
+@event.listens_for(User.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    install_search_index(connection)
+    install_user_counter(connection)
+    install_change_log(connection)
+
+@event.listens_for(User.__table__, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql("DROP TABLE IF EXISTS user_search")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS user_count")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS user_change")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS user_change_state")
+
+def substring_filter(attribute, term, use_index=True):
+    """Filtro equivalente a `attribute.ilike('%term%')`. Com o índice (`use_index`, só em SQLite),
+    os candidatos vêm do FTS5 (busca por rowid) e o ilike apenas confirma, mantendo a mesma semântica."""
+    condition = attribute.ilike(f"%{term}%")
+    if not use_index or len(term) < SEARCH_MIN_LENGTH or '%' in term or '_' in term:
+        return condition
+    candidates = select(user_search.c.rowid).where(user_search.c[attribute.key].like(f"%{term}%"))
+    return and_(User.id.in_(candidates), condition)
+
+# --- Perfil do engine SQLite (SQLITE_PROFILE / SQLITE_PROFILES em config.py) ---
+def is_memory_database(url):
+    """Indica se a URI aponta para um SQLite em memória (uma conexão só, sem pool de arquivos)."""
+    url = make_url(url)
+    database = url.database or ''
+    return database in ('', ':memory:') or url.query.get('mode') == 'memory' or 'mode=memory' in database
+
+def sqlite_engine_profile(config, uri=None):
+    """Retorna (nome, opções do engine, pragmas) do perfil configurado. Fora do SQLite o perfil
+    é ignorado; em bancos em memória só os pragmas valem (o pool padrão é um StaticPool)."""
+    uri = uri or config['SQLALCHEMY_DATABASE_URI']
+    name = config.get('SQLITE_PROFILE', 'default')
+    if make_url(uri).get_backend_name() != 'sqlite':
+        return name, {}, {}
+    try:
+        profile = config.get('SQLITE_PROFILES', {})[name]
+    except KeyError:
+        raise RuntimeError(f"SQLITE_PROFILE desconhecido: {name!r}") from None
+    engine_options = {} if is_memory_database(uri) else dict(profile.get('engine_options', {}))
+    engine_options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    return name, engine_options, dict(profile.get('pragmas', {}))
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Executa os PRAGMAs em cada nova conexão do engine (síncrono ou `AsyncEngine.sync_engine`)."""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+def begin_immediate(session):
+    """Abre a transação da sessão com BEGIN IMMEDIATE no SQLite: o lock de escrita é tomado (esperando
+    até o `busy_timeout`) antes da primeira leitura. Uma transação DEFERRED que lê e depois escreve
+    falha na hora com SQLITE_BUSY se outro escritor confirmou no meio, sem esperar o timeout.
+    Não faz nada fora do SQLite ou se a transação já estiver aberta."""
+    connection = session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+def read_sqlite_pragmas(connection, names):
+    """Valores efetivos dos PRAGMAs numa conexão (ex.: journal_mode fica 'memory' em :memory:)."""
+    return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
+
+def configure_sqlite_profile(app):
+    """Grava as opções do perfil em `SQLALCHEMY_ENGINE_OPTIONS` (chamar antes de `db.init_app`) e
+    registra o comando `flask db-profile`. O perfil aplicado fica em `app.extensions['sqlite_profile']`;
+    os pragmas são instalados no engine com `apply_sqlite_pragmas` depois do `db.init_app`."""
+    name, engine_options, pragmas = sqlite_engine_profile(app.config)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    app.extensions['sqlite_profile'] = {'profile': name, 'engine_options': engine_options, 'pragmas': pragmas}
+
+    @app.cli.command('db-profile')
+    def db_profile_command():
+        """Mostra o perfil do engine SQLite e os valores efetivos dos PRAGMAs."""
+        applied = app.extensions['sqlite_profile']
+        with db.engine.connect() as connection:
+            effective = read_sqlite_pragmas(connection, applied['pragmas']) if connection.dialect.name == 'sqlite' else {}
+        click.echo(json.dumps(dict(applied, effective=effective), indent=2, default=str))
@@ -0,0 +1,107 @@
+"""Consultas de usuários compartilhadas pela API Flask (routes.py) e pelo modo ASGI (asgi.py).
+
+As funções só montam `select()`s; quem executa é a sessão de cada modo (síncrona ou assíncrona).
+"""
+import math
+from sqlalchemy import select, func, tuple_, cast, Integer
+from models import User, substring_filter, user_count
+
+def user_filters(args, use_index=True):
+    """Condições SQL dos filtros de `UserFilterArgsSchema` (busca parcial por e-mail e nome)."""
+    conditions = []
+    if args.get('email'):
+        conditions.append(substring_filter(User.email, args['email'], use_index))
+    if args.get('name'):
+        conditions.append(substring_filter(User.name, args['name'], use_index))
+    return conditions
+
+def output_columns(fields, sort_by='id'):
+    """Colunas do SELECT para os campos de saída pedidos, mais o id e a coluna de ordenação (usados pelo cursor)."""
+    names = list(dict.fromkeys([*fields, 'id', sort_by]))
+    return [getattr(User, name) for name in names]
+
+def list_statement(args, use_index=True, fields=None):
+    """Listagem filtrada e ordenada pelos argumentos de `UserQueryArgsSchema`. Com `fields` as linhas
+    são `Row`s só com essas colunas (mais id e ordenação), em vez de instâncias de `User`."""
+    sort_by = args.get('sort_by', 'id')
+    order = args.get('order', 'asc')
+    statement = select(*output_columns(fields, sort_by or 'id')) if fields else select(User)
+    statement = statement.where(*user_filters(args, use_index))
+    if sort_by:
+        if order == 'desc':
+            statement = statement.order_by(getattr(User, sort_by).desc())
+        else:
+            statement = statement.order_by(getattr(User, sort_by).asc())
+    return statement
+
+def count_statement(statement):
+    """COUNT(*) sobre uma listagem (sem a ordenação)."""
+    return select(func.count()).select_from(statement.order_by(None).subquery())
+
+def page_count(total, per_page):
+    """Total de páginas, como em `flask_sqlalchemy.pagination.Pagination.pages` (None sem o total)."""
+    if total is None:
+        return None
+    return math.ceil(total / per_page) if total else 0
+
+def has_filters(args):
+    return bool(args.get('email') or args.get('name'))
+
+def total_statement(args, statement, use_counter=True, sample=10000):
+    """Consulta do total de uma listagem conforme `count` (exact, estimate ou none); None quando omitido.
+
+    Sem filtros o total vem do contador mantido por triggers (`user_count`, O(1)). Com filtros, `exact`
+    conta as linhas e `estimate` conta só entre as `sample` primeiras linhas da tabela (por id) e
+    extrapola pelo total; com até `sample` usuários a estimativa é exata."""
+    mode = args.get('count', 'exact')
+    if mode == 'none':
+        return None
+    table_total = select(user_count.c.total) if use_counter else select(func.count()).select_from(User)
+    if not has_filters(args):
+        return table_total
+    if mode == 'exact':
+        return count_statement(statement)
+    bound = select(User.id).order_by(User.id).limit(1).offset(sample - 1).scalar_subquery()
+    matches = count_statement(statement.where(User.id <= func.coalesce(bound, User.id))).scalar_subquery()
+    total = table_total.scalar_subquery()
+    scanned = func.max(func.min(total, sample), 1)
+    return select(cast(func.round(matches * total * 1.0 / scanned), Integer))
+
+def keyset_statement(args, per_page, use_index=True, fields=None):
+    """Paginação por keyset em (coluna de ordenação, id): sem OFFSET nem COUNT(*),
+    o custo de cada página independe da profundidade. Retorna (statement, sort_by, order);
+    o statement busca um item extra para indicar se há próxima página. Com `fields` seleciona só
+    essas colunas (mais as do cursor)."""
+    cursor = args['cursor']
+    # `UserQueryArgsSchema` garante que o cursor foi emitido com esta mesma ordenação
+    sort_by = args.get('sort_by', 'id')
+    order = args.get('order', 'asc')
+    column = getattr(User, sort_by)
+    descending = order == 'desc'
+
+    if sort_by == 'id':
+        key, keys = User.id, [User.id]
+        position = cursor.get('id')
+    else:
+        key, keys = tuple_(column, User.id), [column, User.id]
+        position = tuple_(cursor.get('value'), cursor.get('id')) if cursor else None
+
+    statement = select(*output_columns(fields, sort_by)) if fields else select(User)
+    statement = statement.where(*user_filters(args, use_index))
+    if cursor:
+        statement = statement.where(key < position if descending else key > position)
+    statement = statement.order_by(*[k.desc() if descending else k.asc() for k in keys]).limit(per_page + 1)
+    return statement, sort_by, order
+
+def keyset_page(items, per_page, sort_by, order):
+    """Remove o item extra da consulta por keyset e monta o `next_cursor` (None na última página)."""
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = {'sort_by': sort_by, 'order': order, 'value': getattr(last, sort_by), 'id': last.id}
+    return {
+        'per_page': per_page,
+        'items': items,
+        'next_cursor': next_cursor
+    }
@@ -0,0 +1,109 @@
+"""Leitura em réplicas do banco (`SQLALCHEMY_REPLICA_URIS`).
+
+Requisições GET/HEAD executam os SELECTs numa réplica sorteada por requisição (`models.RoutingSession`);
+escritas, flushes e os demais métodos continuam no primário. Depois de uma escrita bem-sucedida o
+cliente (token de acesso ou, sem ele, o IP) fica preso ao primário por `REPLICA_STICKY_SECONDS`, para
+ler o que acabou de gravar; a marca fica no cache compartilhado, então vale em todos os workers. Respostas lidas de
+uma réplica vão para o cache de respostas em chaves próprias (`caching._scoped`), que um cliente preso
+ao primário não lê, e com `REPLICA_CACHE_TIMEOUT`, limitando quanto tempo um dado atrasado pode ficar lá.
+
+Para um SQLite local, a réplica é uma cópia do arquivo do primário atualizada periodicamente:
+
+    SQLALCHEMY_REPLICA_URIS = ["sqlite:////srv/app/instance/users-replica.db"]
+    flask replica-snapshot --every 5 # (ou num cron, sem --every)
+"""
+import hashlib
+import os
+import random
+import sqlite3
+import time
+import click
+from flask import g, request
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from caching import cache
+from instrumentation import instrument_engine
+from models import db, sqlite_engine_profile, is_memory_database, apply_sqlite_pragmas
+
+READ_METHODS = ('GET', 'HEAD')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+def replica_pragmas(pragmas):
+    """Pragmas do perfil para uma réplica: somente leitura e sem mexer no journal do arquivo."""
+    pragmas = {name: value for name, value in pragmas.items() if name not in ('journal_mode', 'synchronous')}
+    pragmas['query_only'] = 'ON'
+    return pragmas
+
+def replica_url(app, uri):
+    """URL da réplica; um caminho SQLite relativo fica na pasta instance, como no Flask-SQLAlchemy."""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and not is_memory_database(url) and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
+def _sticky_key():
+    client = request.headers.get('Authorization') or request.remote_addr or ''
+    return 'replica:sticky:' + hashlib.sha1(client.encode('utf-8')).hexdigest()
+
+def snapshot_database(source_path, target_path):
+    """Copia o SQLite `source_path` para `target_path` pela API de backup (um snapshot consistente,
+    sem bloquear escritores em WAL). A cópia é gravada ao lado e trocada com `os.replace`; ela sai em
+    journal_mode=DELETE para que conexões antigas e novas não dividam arquivos -wal/-shm."""
+    temp_path = f'{target_path}.tmp'
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(temp_path)
+    try:
+        source.backup(target)
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.replace(temp_path, target_path)
+
+def configure_replicas(app):
+    """Cria os engines das réplicas em `app.extensions['replicas']` (nome -> engine; sem conectar), o
+    roteamento por requisição e o comando `flask replica-snapshot`. Sem `SQLALCHEMY_REPLICA_URIS` nada muda.
+    Os engines ficam fora de `SQLALCHEMY_BINDS`: assim `db.create_all()` e as migrações não os tocam."""
+    pragmas = replica_pragmas(app.extensions['sqlite_profile']['pragmas'])
+    replicas = app.extensions['replicas'] = {}
+    for index, uri in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or ()):
+        url = replica_url(app, uri)
+        _, engine_options, _ = sqlite_engine_profile(app.config, url)
+        engine_options['pool_recycle'] = app.config.get('REPLICA_POOL_RECYCLE', 60)
+        engine = replicas[f'replica{index}'] = create_engine(url, **engine_options)
+        if url.get_backend_name() == 'sqlite':
+            apply_sqlite_pragmas(engine, pragmas)
+        instrument_engine(engine)
+    keys = list(replicas)
+
+    @app.cli.command('replica-snapshot')
+    @click.option('--every', type=float, default=None, help="Repete a cada N segundos (sem a opção, copia uma vez).")
+    def replica_snapshot_command(every):
+        """Atualiza as réplicas SQLite em arquivo com uma cópia do primário."""
+        source = db.engine.url.database
+        targets = [engine.url.database for engine in replicas.values()
+                   if engine.url.get_backend_name() == 'sqlite' and not is_memory_database(engine.url)]
+        if db.engine.url.get_backend_name() != 'sqlite' or is_memory_database(db.engine.url) or not targets:
+            raise click.ClickException("Nenhuma réplica SQLite em arquivo configurada.")
+        while True:
+            start = time.perf_counter()
+            for target in targets:
+                snapshot_database(source, target)
+            click.echo(f"{len(targets)} réplica(s) atualizada(s) em {time.perf_counter() - start:.3f}s")
+            if every is None:
+                return
+            time.sleep(every)
+
+    if not keys:
+        return
+
+    @app.before_request
+    def choose_replica():
+        if request.method in READ_METHODS and not cache.get(_sticky_key()):
+            g.db_replica = random.choice(keys)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            cache.set(_sticky_key(), 1, timeout=app.config.get('REPLICA_STICKY_SECONDS', 5))
+        return response
@@ -1,25 +1,44 @@
 import sys
-from flask import jsonify, request, current_app
+import csv
+import io
+import json
+from flask import jsonify, request, current_app, Response, stream_with_context
 from flask.views import MethodView 
-from models import db, User # Importe User para as operações de DB
-from schemas import UserSchema, UserInputSchema, PaginatedUserSchema, UserQueryArgsSchema 
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import PreconditionFailed, UnprocessableEntity
+from models import db, User, begin_immediate # Importe User para as operações de DB
+import queries
+from queries import list_statement, total_statement, page_count, keyset_statement, keyset_page
+from schemas import UserSchema, UserInputSchema, PaginatedUserSchema, UserQueryArgsSchema, UserExportArgsSchema, BulkImportResultSchema, UserBatchGetSchema, UserBatchResultSchema, UserEmailPathSchema, UserUpsertSchema, UserChangesArgsSchema, UserChangesSchema, UserBulkWriteArgsSchema, UserBulkUpdateSchema, BulkWriteResultSchema, USER_FIELDS
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from flask_smorest import Blueprint, abort 
 from flask_limiter import Limiter 
-from flask_caching import Cache 
+import limiter_storage # Registra o esquema sqlite:// do RATELIMIT_STORAGE_URI
+from caching import (cache, cached_response, cached_versioned_response, cached_user_bodies, batch_cache_enabled,
+                     user_cache_key, list_cache_key, invalidate_users)
+from bulk import iter_json_rows, import_users
+from compression import compress_response
+from changes import latest_seq, compacted_seq, long_poll, change_batch
+from serializers import selected_fields, dump_user, dump_page, stream_page, json_body, json_response
+from conditional import etag, expected_versions
+from hashing import hash_password
+from instrumentation import TimedFlaskParser
 
 limiter = Limiter(key_func=lambda: request.remote_addr) # key_func padrão
-cache = Cache()
 
 # Crie um Blueprint do Smorest
 blp_v1 = Blueprint(
     'api_v1', __name__, url_prefix='/v1', # __name__ como segundo argumento para o Blueprint
     description='Operações da API de Usuários (Versão 1)'
 )
+blp_v1.ARGUMENTS_PARSER = TimedFlaskParser() # Conta o parsing dos argumentos no Server-Timing
+blp_v1.after_request(compress_response) # gzip/br/zstd conforme o Accept-Encoding (compression.py)
 
 @blp_v1.errorhandler(400) 
 def handle_smorest_bad_request(error):
-    current_app.logger.error(f"Smorest Bad Request: {error.messages}")
+    current_app.logger.error("Smorest Bad Request: %s", error.messages)
     return jsonify({
         'message': 'Dados de entrada inválidos',
         'errors': error.messages # `error.messages` contém os detalhes da validação
@@ -27,13 +46,67 @@ def handle_smorest_bad_request(error):
 
 @blp_v1.errorhandler(409) 
 def handle_smorest_conflict(error):
-    current_app.logger.error(f"Smorest Conflict: {error}")
+    current_app.logger.error("Smorest Conflict: %s", error)
     return jsonify({
         'message': 'Um usuário com este e-mail já existe',
         'error': f"{error}"
     }), 409
 
 
+def search_index_enabled():
+    """Indica se os filtros de busca parcial podem usar o índice FTS5 (somente SQLite)."""
+    return current_app.config.get('USER_SEARCH_INDEX', True) and db.engine.dialect.name == 'sqlite'
+
+def user_counter_enabled():
+    """Indica se o total da listagem pode vir do contador mantido por triggers (somente SQLite)."""
+    return db.engine.dialect.name == 'sqlite'
+
+def user_filters(args):
+    """Condições SQL dos filtros de `UserFilterArgsSchema` para a configuração atual."""
+    return queries.user_filters(args, search_index_enabled())
+
+USER_COLUMNS = (User.id, User.name, User.email, User.version_id)
+
+def execute_write(statement):
+    """Executa e confirma uma escrita com RETURNING (em BEGIN IMMEDIATE) e devolve as linhas; a violação
+    do índice UNIQUE do e-mail vira o 409 de sempre."""
+    try:
+        begin_immediate(db.session)
+        rows = db.session.execute(statement, execution_options={'synchronize_session': False}).all()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        abort(409, {'message':"Um usuário com este e-mail já existe."})
+    return rows
+
+def bulk_write(statement, args):
+    """Escrita em conjunto (UPDATE/DELETE sem WHERE) restrita aos filtros e ids de `args`, num único
+    comando com RETURNING. Antes, conta os usuários atingidos até `BULK_WRITE_MAX_ROWS` + 1: o dry_run
+    só devolve a contagem e acima do limite a resposta é 422. O cache é invalidado após o commit."""
+    conditions = user_filters(args)
+    if args.get('ids'):
+        conditions.append(User.id.in_(args['ids']))
+    if not args['dry_run']:
+        begin_immediate(db.session) # A contagem e a escrita na mesma transação, já com o lock de escrita
+    max_rows = current_app.config.get('BULK_WRITE_MAX_ROWS', 1000)
+    matched = db.session.scalar(select(func.count()).select_from(
+        select(User.id).where(*conditions).limit(max_rows + 1).subquery()))
+    if args['dry_run']:
+        db.session.rollback()
+        return {'matched': matched, 'affected': 0, 'dry_run': True, 'ids': []}
+    if matched > max_rows:
+        db.session.rollback()
+        raise UnprocessableEntity(description=f"A seleção atinge mais de {max_rows} usuários; refine os filtros.")
+    ids = [row.id for row in execute_write(statement.where(*conditions).returning(User.id))]
+    invalidate_users(*ids)
+    return {'matched': matched, 'affected': len(ids), 'dry_run': False, 'ids': ids}
+
+def versioned_json(row, status=200):
+    """Resposta de um usuário (linha com `USER_COLUMNS`) com o ETag da versão."""
+    response = json_response(dump_user(row), status)
+    response.headers['ETag'] = etag(row.version_id)
+    return response
+
 # --- RECURSO: Listagem e Criação de Usuários ---
 @blp_v1.route('/users')
 class UserList(MethodView):
@@ -42,95 +115,320 @@ class UserList(MethodView):
     @blp_v1.response(200, PaginatedUserSchema) # Schema para a resposta paginada
     @limiter.limit("10/minute")
     def get(self, args):
-        query = User.query
-        if args.get('email'):
-            query = query.filter(User.email.ilike(f"%{args['email']}%"))
-        if args.get('name'):
-            query = query.filter(User.name.ilike(f"%{args['name']}%"))
-
-        sort_by = args.get('sort_by', 'id')
-        order = args.get('order', 'asc')
-        if sort_by:
-            if order == 'desc':
-                query = query.order_by(getattr(User, sort_by).desc())
-            else:
-                query = query.order_by(getattr(User, sort_by).asc())
+        fields = selected_fields(args)
+        per_page = args.get('per_page', current_app.config.get('PER_PAGE', 10))
+        if per_page > current_app.config.get('PUBLIC_MAX_PER_PAGE', 100):
+            verify_jwt_in_request() # Páginas maiores só para consumidores autenticados (lotes internos)
+        if per_page > current_app.config.get('STREAM_MIN_PER_PAGE', 1000):
+            return self._stream(args, fields, per_page)
+        return cached_response(list_cache_key(args), lambda: dump_page(self._list(args, fields), fields))
 
-        page = args.get('page', 1)
+    @staticmethod
+    def _stream(args, fields, per_page):
+        """Página grande em stream (`serializers.stream_page`): os itens saem do cursor em lotes de
+        `EXPORT_BATCH_SIZE`, sem montar a página na memória nem passar pelo cache de respostas."""
+        use_index = search_index_enabled()
+        if 'cursor' in args:
+            statement, sort_by, order = keyset_statement(args, per_page, use_index, fields)
+            meta = lambda last: {'per_page': per_page, 'next_cursor': None if last is None else
+                                 {'sort_by': sort_by, 'order': order, 'value': getattr(last, sort_by), 'id': last.id}}
+        else:
+            page = args.get('page', 1)
+            listing = list_statement(args, use_index, fields)
+            counting = total_statement(args, listing, user_counter_enabled(), current_app.config.get('COUNT_ESTIMATE_SAMPLE', 10000))
+            total = db.session.scalar(counting) if counting is not None else None
+            db.session.rollback() # Encerra a leitura antes do stream, que usa a própria conexão
+            statement = listing.limit(per_page).offset((page - 1) * per_page)
+            meta = lambda last: {'page': page, 'per_page': per_page, 'total_pages': page_count(total, per_page), 'total_items': total}
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+
+        def generate():
+            with db.engine.connect() as connection:
+                result = connection.execution_options(yield_per=batch_size).execute(statement)
+                yield from stream_page(result.partitions(), fields, per_page, meta)
+
+        return current_app.response_class(stream_with_context(generate()), mimetype=current_app.json.mimetype)
+
+    @staticmethod
+    def _list(args, fields=USER_FIELDS):
+        # Só as colunas pedidas: as linhas vêm como `Row`s, sem instâncias do ORM
+        use_index = search_index_enabled()
         per_page = args.get('per_page', current_app.config.get('PER_PAGE', 10))
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        if 'cursor' in args:
+            statement, sort_by, order = keyset_statement(args, per_page, use_index, fields)
+            return keyset_page(db.session.execute(statement).all(), per_page, sort_by, order)
+
+        page = args.get('page', 1)
+        statement = list_statement(args, use_index, fields)
+        counting = total_statement(args, statement, user_counter_enabled(), current_app.config.get('COUNT_ESTIMATE_SAMPLE', 10000))
+        total = db.session.scalar(counting) if counting is not None else None
+        items = db.session.execute(statement.limit(per_page).offset((page - 1) * per_page)).all()
 
         return {
-            'page': pagination.page,
-            'per_page': pagination.per_page,
-            'total_pages': pagination.pages,
-            'total_items': pagination.total,
-            'items': pagination.items # Usando 'items' do Smorest
+            'page': page,
+            'per_page': per_page,
+            'total_pages': page_count(total, per_page),
+            'total_items': total,
+            'items': items # Usando 'items' do Smorest
         }
 
     @blp_v1.doc(description='Cria um novo usuário.')
     @blp_v1.arguments(UserInputSchema) 
     @blp_v1.response(201, UserSchema, description="Usuário criado com sucesso")
+    @blp_v1.alt_response(409, description="Um usuário com este e-mail já existe")
     @jwt_required() 
     def post(self, new_user_data): 
         current_user_id = get_jwt_identity()
-        current_app.logger.info(f"Usuário {current_user_id} tentando adicionar um novo usuário.")
+        current_app.logger.info("Usuário %s tentando adicionar um novo usuário.", current_user_id)
 
-        if User.query.filter_by(email=new_user_data['email']).first():
-            abort(409, {'message':"Um usuário com este e-mail já existe."}) # Use abort do Smorest
+        # Um único INSERT ... RETURNING: o e-mail repetido é detectado pelo índice UNIQUE (inclusive em corridas)
+        statement = insert(User).values(name=new_user_data['name'], email=new_user_data['email'],
+                                        password_hash=hash_password(new_user_data['password'])).returning(*USER_COLUMNS)
+        row, = execute_write(statement)
+        invalidate_users()
+        return versioned_json(row, 201)
 
-        user = User(name=new_user_data['name'], email=new_user_data['email'])
-        user.set_password(new_user_data['password']) # Hash da senha usando bcrypt
-        db.session.add(user)
-        db.session.commit()
-        return user 
+    @blp_v1.doc(description='Altera o nome de todos os usuários selecionados pelos filtros `email`/`name` e/ou '
+                            '`ids` num único UPDATE (a versão de cada um é incrementada). Com `dry_run` só conta.')
+    @blp_v1.arguments(UserBulkWriteArgsSchema, location='query')
+    @blp_v1.arguments(UserBulkUpdateSchema)
+    @blp_v1.response(200, BulkWriteResultSchema)
+    @blp_v1.alt_response(422, description="Seleção vazia ou acima de BULK_WRITE_MAX_ROWS")
+    @jwt_required()
+    def patch(self, args, data):
+        current_app.logger.info("Usuário %s alterando usuários em conjunto.", get_jwt_identity())
+        result = bulk_write(update(User).values(version_id=User.version_id + 1, **data), args)
+        current_app.logger.info("Alteração em conjunto: %s de %s usuários.", result['affected'], result['matched'])
+        return result
+
+    @blp_v1.doc(description='Exclui todos os usuários selecionados pelos filtros `email`/`name` e/ou `ids` num '
+                            'único DELETE. Com `dry_run` só conta.')
+    @blp_v1.arguments(UserBulkWriteArgsSchema, location='query')
+    @blp_v1.response(200, BulkWriteResultSchema)
+    @blp_v1.alt_response(422, description="Seleção vazia ou acima de BULK_WRITE_MAX_ROWS")
+    @jwt_required()
+    def delete(self, args):
+        current_app.logger.info("Usuário %s excluindo usuários em conjunto.", get_jwt_identity())
+        result = bulk_write(delete(User), args)
+        current_app.logger.info("Exclusão em conjunto: %s de %s usuários.", result['affected'], result['matched'])
+        return result
+
+# --- RECURSO: Exportação Completa de Usuários ---
+EXPORT_COLUMNS = ('id', 'name', 'email')
+
+@blp_v1.route('/users/export')
+class UserExport(MethodView):
+    @blp_v1.doc(description='Exporta todos os usuários (com os mesmos filtros da listagem) em NDJSON ou CSV. '
+                            'A resposta é gerada em stream, com memória constante independente do volume.')
+    @blp_v1.arguments(UserExportArgsSchema, location='query')
+    @blp_v1.response(200, description="Arquivo NDJSON ou CSV com um usuário por linha")
+    @jwt_required()
+    def get(self, args):
+        current_user_id = get_jwt_identity()
+        current_app.logger.info("Usuário %s exportando usuários em %s.", current_user_id, args['format'])
+
+        # Apenas colunas: as linhas vêm do cursor sem criar instâncias do ORM
+        statement = select(*[getattr(User, name) for name in EXPORT_COLUMNS]).where(*user_filters(args)).order_by(User.id)
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+        encode = self._csv_lines if args['format'] == 'csv' else self._ndjson_lines
+
+        def generate():
+            with db.engine.connect() as connection:
+                result = connection.execution_options(yield_per=batch_size).execute(statement)
+                yield from encode(result.partitions())
+
+        mimetype = 'text/csv' if args['format'] == 'csv' else 'application/x-ndjson'
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f"attachment; filename=users.{args['format']}"
+        return response
+
+    @staticmethod
+    def _ndjson_lines(partitions):
+        for rows in partitions:
+            yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n' for row in rows)
+
+    @staticmethod
+    def _csv_lines(partitions):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in partitions:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+# --- RECURSO: Importação de Usuários em Lote ---
+@blp_v1.route('/users/bulk')
+class UserBulkImport(MethodView):
+    @blp_v1.doc(description='Importa usuários em lote. O corpo (NDJSON ou array JSON de objetos no formato de '
+                            'criação) é lido como stream e processado em blocos, cada um em sua transação.')
+    @blp_v1.response(200, BulkImportResultSchema, description="Relatório da importação por linha")
+    @jwt_required()
+    def post(self):
+        current_user_id = get_jwt_identity()
+        current_app.logger.info("Usuário %s iniciando importação de usuários em lote.", current_user_id)
+
+        report = import_users(iter_json_rows(request.stream), current_app.config.get('BULK_IMPORT_CHUNK_SIZE', 500))
+        current_app.logger.info("Importação em lote: %s criados, %s rejeitados.", report['created'], report['failed'])
+        return report
+
+# --- RECURSO: Leitura de Usuários em Lote ---
+@blp_v1.route('/users:batchGet')
+class UserBatchGet(MethodView):
+    @blp_v1.doc(description='Retorna vários usuários (até 1000 ids) numa única consulta `IN`, na ordem dos ids '
+                            'pedidos, e informa os ids inexistentes em `missing`.')
+    @blp_v1.arguments(UserBatchGetSchema)
+    @blp_v1.response(200, UserBatchResultSchema)
+    @jwt_required()
+    def post(self, args):
+        user_ids = list(dict.fromkeys(args['ids'])) # Sem repetições, na ordem recebida
+        if not batch_cache_enabled():
+            found = {row.id: row for row in self._rows(user_ids)}
+            return json_response({'items': [dump_user(found[user_id]) for user_id in user_ids if user_id in found],
+                                  'missing': [user_id for user_id in user_ids if user_id not in found]})
+
+        # Com o cache de usuários, a resposta é montada com os corpos já serializados de cada usuário
+        bodies = cached_user_bodies(user_ids, lambda pending: {row.id: (dump_user(row), row.version_id)
+                                                               for row in self._rows(pending)})
+        missing = json_body([user_id for user_id in user_ids if user_id not in bodies]).rstrip(b'\n')
+        items = b','.join(bodies[user_id] for user_id in user_ids if user_id in bodies)
+        body = b'{"items":[' + items + b'],"missing":' + missing + b'}\n'
+        return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
+    @staticmethod
+    def _rows(user_ids):
+        return db.session.execute(select(*USER_COLUMNS).where(User.id.in_(user_ids))).all()
+
+# --- RECURSO: Feed de Alterações de Usuários ---
+@blp_v1.route('/users/changes')
+class UserChanges(MethodView):
+    @blp_v1.doc(description='Alterações de usuários depois de `since`, para sincronização incremental: cada usuário '
+                            'aparece uma vez, com a última operação e o estado atual. Repita com `since=next_since` '
+                            'enquanto `has_more`; com `wait` a requisição aguarda novas alterações (long-poll). '
+                            '410 quando `since` é anterior ao log compactado: refaça a cópia com `since=0`.')
+    @blp_v1.arguments(UserChangesArgsSchema, location='query')
+    @blp_v1.response(200, UserChangesSchema)
+    @jwt_required()
+    def get(self, args):
+        since, horizon = args['since'], compacted_seq()
+        if 0 < since < horizon: # Com since=0 o cliente não tem o que excluir
+            return json_response({'message': 'Alterações anteriores a este ponto foram compactadas; sincronize de novo com since=0.',
+                                  'min_since': horizon, 'code': 410}, 410)
+        if args['wait']:
+            long_poll(since, args['wait'])
+        items, has_more = change_batch(since, args['limit'])
+        return json_response({'items': items, 'next_since': items[-1]['seq'] if items else since,
+                              'has_more': has_more, 'latest_seq': latest_seq()})
 
 # --- RECURSO: Detalhes, Atualização e Exclusão de Usuários ---
+# ETag = `User.version_id`. GET com If-None-Match recebe 304; PUT e DELETE com If-Match levam a versão
+# esperada para o WHERE da própria escrita (sem leitura prévia) e recebem 412 se ela mudou.
+
 @blp_v1.route('/users/<int:user_id>')
 class UserResource(MethodView): 
-    @blp_v1.doc(description='Retorna os detalhes de um usuário específico.')
+    @blp_v1.doc(description='Retorna os detalhes de um usuário específico. A resposta traz o ETag da versão; '
+                            'com `If-None-Match` igual a resposta é 304, sem corpo.')
     @blp_v1.response(200, UserSchema)
+    @blp_v1.alt_response(304, description="Usuário não modificado")
     @blp_v1.alt_response(404, description="Usuário não encontrado") # Documenta um possível 404
     def get(self, user_id):
-        user = User.query.get_or_404(user_id, description="Usuário não encontrado.")
-        return user 
+        def load():
+            user = User.query.get_or_404(user_id, description="Usuário não encontrado.")
+            return dump_user(user), user.version_id
+        return cached_versioned_response(user_cache_key(user_id), load)
 
-    @blp_v1.doc(description='Atualiza um usuário existente.')
+    @blp_v1.doc(description='Atualiza um usuário existente. Com `If-Match` a atualização só ocorre se o '
+                            'ETag ainda for o atual.')
     @blp_v1.arguments(UserInputSchema(partial=True)) # partial=True permite atualizações parciais
     @blp_v1.response(200, UserSchema, description="Usuário atualizado com sucesso")
     @blp_v1.alt_response(404, description="Usuário não encontrado")
+    @blp_v1.alt_response(412, description="O usuário foi alterado desde a versão informada em If-Match")
     @jwt_required() # Protegido por JWT
     def put(self, update_data, user_id): 
         current_user_id = get_jwt_identity()
-        current_app.logger.info(f"Usuário {current_user_id} tentando atualizar o usuário {user_id}.")
-
-        user = User.query.get_or_404(user_id, description="Usuário não encontrado.")
-
-        if 'email' in update_data and update_data['email'] != user.email:
-            if User.query.filter(User.email == update_data['email'], User.id != user_id).first():
-                abort(409, {'message':"Um usuário com este e-mail já existe."})
+        current_app.logger.info("Usuário %s tentando atualizar o usuário %s.", current_user_id, user_id)
 
-        for key, value in update_data.items():
-            if key == 'password':
-                user.set_password(value) # Hash da senha
-            else:
-                setattr(user, key, value)
+        values = dict(update_data)
+        if 'password' in values:
+            values['password_hash'] = hash_password(values.pop('password')) # Hash da senha
+        # Um único UPDATE ... RETURNING: a unicidade do e-mail fica a cargo do índice UNIQUE
+        statement = self._where_current(update(User), user_id).values(
+            version_id=User.version_id + 1, **values).returning(*USER_COLUMNS)
+        rows = execute_write(statement)
+        if not rows:
+            self._missing_or_stale(user_id)
+        invalidate_users(user_id)
+        return versioned_json(rows[0])
 
-        db.session.commit()
-        return user 
-
-    @blp_v1.doc(description='Exclui um usuário existente.')
+    @blp_v1.doc(description='Exclui um usuário existente. Com `If-Match` a exclusão só ocorre se o ETag '
+                            'ainda for o atual.')
     @blp_v1.response(204, description="Usuário excluído com sucesso") 
     @blp_v1.alt_response(404, description="Usuário não encontrado")
+    @blp_v1.alt_response(412, description="O usuário foi alterado desde a versão informada em If-Match")
     @jwt_required() # Protegido por JWT
     def delete(self, user_id):
         current_user_id = get_jwt_identity()
-        current_app.logger.info(f"Usuário {current_user_id} tentando deletar o usuário {user_id}.")
+        current_app.logger.info("Usuário %s tentando deletar o usuário %s.", current_user_id, user_id)
 
-        user = User.query.get_or_404(user_id, description="Usuário não encontrado.")
-        db.session.delete(user)
-        db.session.commit()
+        if not execute_write(self._where_current(delete(User), user_id).returning(User.id)):
+            self._missing_or_stale(user_id)
+        invalidate_users(user_id)
         return '', 204
 
+    @staticmethod
+    def _where_current(statement, user_id):
+        """Restringe a escrita ao usuário e, com If-Match, às versões aceitas."""
+        statement = statement.where(User.id == user_id)
+        expected = expected_versions(request.headers.get('If-Match'))
+        if expected is not None:
+            statement = statement.where(User.version_id.in_(expected))
+        return statement
+
+    @staticmethod
+    def _missing_or_stale(user_id):
+        """A escrita não afetou nenhuma linha: 404 se o usuário não existe, senão 412 (versão mudou)."""
+        db.session.rollback()
+        if db.session.scalar(select(User.id).where(User.id == user_id)) is None:
+            abort(404, message="Usuário não encontrado.")
+        raise PreconditionFailed(description="O usuário foi alterado por outra requisição; "
+                                             "obtenha a versão atual (ETag) e tente novamente.")
+
+# --- RECURSO: Upsert por E-mail ---
+@blp_v1.route('/users/by-email/<email>')
+class UserByEmail(MethodView):
+    @blp_v1.doc(description='Cria ou atualiza, de forma idempotente, o usuário com este e-mail num único comando '
+                            '(INSERT ... ON CONFLICT DO UPDATE ... RETURNING). Responde 201 ao criar e 200 ao '
+                            'atualizar. Com `If-Match` apenas atualiza, e só se o ETag ainda for o atual.')
+    @blp_v1.arguments(UserEmailPathSchema, location='path')
+    @blp_v1.arguments(UserUpsertSchema)
+    @blp_v1.response(200, UserSchema, description="Usuário atualizado")
+    @blp_v1.alt_response(201, description="Usuário criado")
+    @blp_v1.alt_response(412, description="If-Match não corresponde à versão atual do usuário")
+    @jwt_required()
+    def put(self, path_args, data, email):
+        current_user_id = get_jwt_identity()
+        email = path_args['email'] # Normalizado pelo schema
+        current_app.logger.info("Usuário %s gravando o usuário %s.", current_user_id, email)
+
+        values = {'name': data['name'], 'password_hash': hash_password(data['password'])}
+        expected = expected_versions(request.headers.get('If-Match'))
+        if expected is None:
+            statement = sqlite_insert(User).values(email=email, **values)
+            statement = statement.on_conflict_do_update(index_elements=[User.email], set_={
+                'name': statement.excluded.name, 'password_hash': statement.excluded.password_hash,
+                'version_id': User.version_id + 1})
+        else:
+            statement = update(User).where(User.email == email, User.version_id.in_(expected)).values(
+                version_id=User.version_id + 1, **values)
+        rows = execute_write(statement.returning(*USER_COLUMNS))
+        if not rows:
+            raise PreconditionFailed(description="O usuário não existe ou foi alterado desde a versão informada em If-Match.")
+        row = rows[0]
+        invalidate_users(row.id)
+        return versioned_json(row, 201 if row.version_id == 1 else 200) # Versão 1: acabou de ser inserido
+
 def configure_routes_smorest(api_instance):
     api_instance.register_blueprint(blp_v1)
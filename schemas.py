@@ -1,34 +1,190 @@
+import base64
+import binascii
+import json
 from flask_marshmallow import Marshmallow
-from marshmallow import fields, validate
-from models import User 
+from marshmallow import fields, validate, validates_schema, ValidationError
+from webargs.fields import DelimitedList
+from models import User, normalize_email
+from instrumentation import phase
 ma = Marshmallow()
 
+# Colunas aceitas na ordenação da listagem (e, portanto, nos cursores)
+SORTABLE_FIELDS = ('id', 'name', 'email')
+
+# Campo para o cursor opaco da paginação por keyset
+class CursorField(fields.String):
+    """Serializa o dict {sort_by, order, value, id} em base64 url-safe e vice-versa.
+    Um cursor vazio (`?cursor=`) inicia a paginação por cursor na primeira página."""
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        if value is None:
+            return None
+        raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        value = super()._deserialize(value, attr, data, **kwargs)
+        if not value:
+            return {}
+        try:
+            raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+            cursor = json.loads(raw)
+        except (binascii.Error, ValueError):
+            raise ValidationError("Cursor inválido.")
+        if (not isinstance(cursor, dict)
+                or cursor.get('sort_by') not in SORTABLE_FIELDS
+                or cursor.get('order') not in ('asc', 'desc')
+                or not _is_column_value(User.__table__.c.id, cursor.get('id'))
+                or 'value' not in cursor
+                or not _is_column_value(User.__table__.c[cursor['sort_by']], cursor['value'])):
+            raise ValidationError("Cursor inválido.")
+        return cursor
+
+def _is_column_value(column, value):
+    """Indica se `value` (vindo do JSON do cursor) cabe na coluna: o tipo Python dela (bool não vale como
+    int) ou nulo, se a coluna aceitar. Evita que um cursor adulterado chegue à consulta."""
+    if value is None:
+        return column.nullable
+    return isinstance(value, column.type.python_type) and not isinstance(value, bool)
+
+class TimedDumpMixin:
+    """Conta o `dump` (inclusive o feito pelo `@blp.response`) na fase "serialize" do Server-Timing."""
+
+    def dump(self, obj, *, many=None):
+        with phase('serialize'):
+            return super().dump(obj, many=many)
+
+class EmailField(fields.String):
+    """E-mail normalizado (`normalize_email`) antes da validação, para que o índice UNIQUE não diferencie maiúsculas."""
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        return normalize_email(super()._deserialize(value, attr, data, **kwargs))
+
 # Schema para validação de entrada de usuário (criação/atualização)
 class UserInputSchema(ma.Schema):
-    email = fields.String(required=True, validate=validate.Email())
+    email = EmailField(required=True, validate=validate.Email())
     password = fields.String(required=True, load_only=True, validate=validate.Length(min=6)) # load_only: não será serializado na saída
     name = fields.String(required=True)
 
 # Schema para saída de usuário (detalhes do usuário)
-class UserSchema(ma.SQLAlchemyAutoSchema): # Use SQLAlchemyAutoSchema para gerar automaticamente campos do modelo
+class UserSchema(TimedDumpMixin, ma.SQLAlchemyAutoSchema): # Use SQLAlchemyAutoSchema para gerar automaticamente campos do modelo
     class Meta:
         model = User
         load_instance = True 
         include_fk = True
         load_only = ('password_hash',)
         dump_only = ('id',)
+        exclude = ('version_id',) # Exposta no cabeçalho ETag
+
+# Campos de saída de UserSchema (aceitos em `fields=` e usados pelo caminho rápido de serializers.py)
+USER_FIELDS = tuple(UserSchema().dump_fields)
 
 # Schema para paginação de usuários (saída)
-class PaginatedUserSchema(ma.Schema):
+class PaginatedUserSchema(TimedDumpMixin, ma.Schema):
     page = fields.Integer(dump_only=True, metadata={"description": "Número da página"})
     per_page = fields.Integer(dump_only=True, metadata={"description": "Itens por página"})
-    total_pages = fields.Integer(dump_only=True, metadata={"description": "Número total de páginas"})
-    total_items = fields.Integer(dump_only=True, metadata={"description": "Total de itens"})
+    total_pages = fields.Integer(dump_only=True, allow_none=True, metadata={"description": "Número total de páginas (nulo com count=none)"})
+    total_items = fields.Integer(dump_only=True, allow_none=True, metadata={"description": "Total de itens (estimado com count=estimate, nulo com count=none)"})
     items = fields.List(fields.Nested(UserSchema), dump_only=True,metadata={"description": "Itens da página"})
+    next_cursor = CursorField(dump_only=True, allow_none=True, metadata={"description": "Cursor da próxima página (somente no modo cursor, nulo na última página)"})
 
 # Schema para filtros de usuário (entrada - query parameters)
-class UserQueryArgsSchema(ma.Schema):
+class UserFilterArgsSchema(ma.Schema):
     email = fields.String(metadata={"description": "Filtrar por e-mail (busca parcial)"})
     name = fields.String(metadata={"description": "Filtrar por nome (busca parcial)"})
+
+# Schema para filtros e paginação da listagem (entrada - query parameters)
+class UserQueryArgsSchema(UserFilterArgsSchema):
     page = fields.Integer(load_default=1, validate=validate.Range(min=1), metadata={"description": "Número da página"})
-    per_page = fields.Integer(load_default=10, validate=validate.Range(min=1, max=100), metadata={"description": "Itens por página"})
\ No newline at end of file
+    per_page = fields.Integer(load_default=10, validate=validate.Range(min=1, max=10000),
+                              metadata={"description": "Itens por página; acima de 100 exige token e acima de 1000 a página vem em stream"})
+    sort_by = fields.String(load_default='id', validate=validate.OneOf(SORTABLE_FIELDS), metadata={"description": "Coluna de ordenação"})
+    order = fields.String(load_default='asc', validate=validate.OneOf(['asc', 'desc']), metadata={"description": "Direção da ordenação"})
+    cursor = CursorField(metadata={"description": "Paginação por cursor: envie vazio na primeira página e depois o `next_cursor` recebido "
+                                                  "com os mesmos `sort_by` e `order` (ignora `page`)"})
+    count = fields.String(load_default='exact', validate=validate.OneOf(['exact', 'estimate', 'none']),
+                          metadata={"description": "Total com filtros: exact (COUNT), estimate (por amostragem) ou none (omitido). Sem filtros o total é sempre exato e O(1)"})
+    sparse_fields = DelimitedList(fields.String(validate=validate.OneOf(USER_FIELDS)), data_key='fields', validate=validate.Length(min=1),
+                                  metadata={"description": "Campos dos itens separados por vírgula (ex.: `id,email`); padrão: todos"})
+
+    @validates_schema
+    def cursor_matches_sort(self, data, **kwargs):
+        # O cursor só posiciona na ordenação com que foi emitido
+        cursor = data.get('cursor')
+        if cursor and (cursor['sort_by'] != data['sort_by'] or cursor['order'] != data['order']):
+            raise ValidationError("O cursor foi emitido com outra ordenação (`sort_by`/`order`).", 'cursor')
+
+# Schema para a exportação completa (entrada - query parameters)
+class UserExportArgsSchema(UserFilterArgsSchema):
+    format = fields.String(load_default='ndjson', validate=validate.OneOf(['ndjson', 'csv']), metadata={"description": "Formato do arquivo: ndjson ou csv"})
+
+# Schemas das escritas em conjunto (PATCH e DELETE /v1/users)
+class UserBulkWriteArgsSchema(UserFilterArgsSchema):
+    ids = DelimitedList(fields.Integer(validate=validate.Range(min=1)), validate=validate.Length(min=1, max=1000),
+                        metadata={"description": "Ids separados por vírgula (até 1000), combinados com os filtros"})
+    dry_run = fields.Boolean(load_default=False, metadata={"description": "Só conta os usuários atingidos, sem alterar nada"})
+
+    @validates_schema
+    def require_selection(self, data, **kwargs):
+        # Sem filtro nem ids a escrita atingiria a tabela inteira
+        if not (data.get('email') or data.get('name') or data.get('ids')):
+            raise ValidationError("Informe `email`, `name` ou `ids`.", '_schema')
+
+class UserBulkUpdateSchema(ma.Schema):
+    name = fields.String(required=True, metadata={"description": "Novo nome dos usuários selecionados"})
+
+class BulkWriteResultSchema(TimedDumpMixin, ma.Schema):
+    matched = fields.Integer(dump_only=True, metadata={"description": "Usuários que atendem à seleção"})
+    affected = fields.Integer(dump_only=True, metadata={"description": "Usuários alterados ou excluídos (0 no dry_run)"})
+    dry_run = fields.Boolean(dump_only=True)
+    ids = fields.List(fields.Integer(), dump_only=True, metadata={"description": "Ids alterados ou excluídos"})
+
+# Schemas para a importação em lote (saída)
+class BulkImportRowSchema(ma.Schema):
+    index = fields.Integer(dump_only=True, metadata={"description": "Posição da linha no corpo da requisição"})
+    status = fields.String(dump_only=True, metadata={"description": "created, invalid ou duplicate"})
+    id = fields.Integer(dump_only=True, metadata={"description": "Id do usuário criado"})
+    errors = fields.Dict(dump_only=True, metadata={"description": "Erros de validação da linha"})
+
+class BulkImportResultSchema(TimedDumpMixin, ma.Schema):
+    total = fields.Integer(dump_only=True, metadata={"description": "Linhas recebidas"})
+    created = fields.Integer(dump_only=True, metadata={"description": "Usuários criados"})
+    failed = fields.Integer(dump_only=True, metadata={"description": "Linhas rejeitadas"})
+    results = fields.List(fields.Nested(BulkImportRowSchema), dump_only=True, metadata={"description": "Resultado por linha"})
+
+# Schemas da leitura em lote (POST /v1/users:batchGet)
+class UserBatchGetSchema(ma.Schema):
+    ids = fields.List(fields.Integer(validate=validate.Range(min=1)), required=True, validate=validate.Length(min=1, max=1000),
+                      metadata={"description": "Ids dos usuários (até 1000); repetições são ignoradas"})
+
+class UserBatchResultSchema(TimedDumpMixin, ma.Schema):
+    items = fields.List(fields.Nested(UserSchema), dump_only=True, metadata={"description": "Usuários encontrados, na ordem dos ids pedidos"})
+    missing = fields.List(fields.Integer(), dump_only=True, metadata={"description": "Ids pedidos que não existem"})
+
+# Schemas do feed de alterações (GET /v1/users/changes)
+class UserChangesArgsSchema(ma.Schema):
+    since = fields.Integer(load_default=0, validate=validate.Range(min=0),
+                           metadata={"description": "Último `seq` já aplicado pelo cliente (`next_since` do lote anterior); 0 para a cópia completa"})
+    limit = fields.Integer(load_default=100, validate=validate.Range(min=1, max=1000), metadata={"description": "Máximo de usuários no lote"})
+    wait = fields.Float(load_default=0, validate=validate.Range(min=0, max=30),
+                        metadata={"description": "Segundos de espera (long-poll) quando não há alterações depois de `since` (limitado a `CHANGES_MAX_WAIT`)"})
+
+class UserChangeSchema(ma.Schema):
+    seq = fields.Integer(dump_only=True, metadata={"description": "Posição da última alteração do usuário no log"})
+    op = fields.String(dump_only=True, metadata={"description": "insert, update ou delete"})
+    id = fields.Integer(dump_only=True)
+    user = fields.Nested(UserSchema, dump_only=True, allow_none=True, metadata={"description": "Estado atual; nulo quando excluído"})
+
+class UserChangesSchema(TimedDumpMixin, ma.Schema):
+    items = fields.List(fields.Nested(UserChangeSchema), dump_only=True)
+    next_since = fields.Integer(dump_only=True, metadata={"description": "Valor de `since` para o próximo lote"})
+    has_more = fields.Boolean(dump_only=True, metadata={"description": "Há mais alterações depois deste lote"})
+    latest_seq = fields.Integer(dump_only=True, metadata={"description": "Último `seq` do log"})
+
+# Schemas do upsert por e-mail (PUT /v1/users/by-email/<email>)
+class UserEmailPathSchema(ma.Schema):
+    email = EmailField(required=True, validate=validate.Email(), metadata={"description": "E-mail do usuário (sem diferenciar maiúsculas)"})
+
+class UserUpsertSchema(ma.Schema):
+    name = fields.String(required=True)
+    password = fields.String(required=True, load_only=True, validate=validate.Length(min=6))
@@ -0,0 +1,104 @@
+"""Caminho rápido de serialização das respostas de usuários.
+
+Equivale a `UserSchema`/`PaginatedUserSchema` seguidos do `jsonify`, mas monta os dicts direto das
+linhas (os campos de saída de `UserSchema` são Integer/String, sem conversão) e codifica com orjson
+quando disponível. A saída é idêntica em bytes à do `jsonify`: quando o orjson geraria algo diferente
+(caracteres fora do ASCII imprimível, tipos que o Flask converte de outro jeito, modo debug com
+indentação) o encoder padrão do Flask é usado.
+"""
+import json
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from schemas import USER_FIELDS, CursorField
+from instrumentation import phase
+
+try:
+    import orjson
+except ImportError: # Dependência opcional
+    orjson = None
+
+if orjson is not None:
+    # Tipos que o orjson serializaria diferente do Flask (ex.: datetime) levantam TypeError e caem no fallback
+    ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                      | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS)
+
+_cursor_field = CursorField()
+
+def selected_fields(args):
+    """Campos pedidos em `fields=` (sem repetição, na ordem recebida) ou todos os de `UserSchema`."""
+    return tuple(dict.fromkeys(args.get('sparse_fields') or USER_FIELDS))
+
+def dump_user(user, fields=USER_FIELDS):
+    """Equivalente a `UserSchema(only=fields).dump(user)`; aceita instâncias ou linhas (`Row`)."""
+    return {name: getattr(user, name) for name in fields}
+
+def dump_page(page, fields=USER_FIELDS):
+    """Equivalente a `PaginatedUserSchema().dump(page)` com os itens restritos a `fields`."""
+    with phase('serialize'):
+        data = dict(page)
+        data['items'] = [dump_user(item, fields) for item in page['items']]
+        if 'next_cursor' in data:
+            data['next_cursor'] = _cursor_field._serialize(data['next_cursor'], 'next_cursor', page)
+    return data
+
+def stream_page(partitions, fields, limit, meta):
+    """Versão incremental de `json_body(dump_page(page, fields))` para páginas grandes: emite os itens
+    à medida que os lotes de linhas (`partitions`) chegam do cursor, sem montar a página na memória, e
+    gera os mesmos bytes. Lê até `limit` linhas; uma linha a mais indica a próxima página. No fim,
+    `meta(last)` dá os demais campos da página, com `last` sendo a última linha emitida quando há mais
+    linhas (None caso contrário). Funciona porque `items` é a primeira chave na ordem alfabética."""
+    yield b'{"items":['
+    count, last, more = 0, None, False
+    for rows in partitions:
+        if count + len(rows) > limit:
+            rows, more = rows[:limit - count], True
+        if rows:
+            with phase('serialize'):
+                chunk = json_body([dump_user(row, fields) for row in rows])[1:-2] # Sem "[", "]" e a quebra de linha
+            yield (b',' + chunk) if count else chunk
+            count += len(rows)
+            last = rows[-1]
+        if more:
+            break
+    data = meta(last if more else None)
+    if 'next_cursor' in data:
+        data['next_cursor'] = _cursor_field._serialize(data['next_cursor'], 'next_cursor', data)
+    yield b'],' + json_body(data)[1:]
+
+def encode(data):
+    """JSON compacto, com chaves ordenadas e ASCII, como o `jsonify` fora do debug (com a quebra de
+    linha final). Retorna None quando o orjson não está disponível ou não geraria os mesmos bytes."""
+    if orjson is None:
+        return None
+    try:
+        body = orjson.dumps(data, option=ORJSON_OPTIONS)
+    except TypeError: # orjson.JSONEncodeError
+        return None
+    # O json da stdlib com ensure_ascii escapa tudo fora de 0x20-0x7E (inclusive o DEL)
+    if not body.isascii() or b'\x7f' in body:
+        return None
+    return body + b'\n'
+
+def _uses_default_output(app):
+    provider = app.json
+    if type(provider) is not DefaultJSONProvider:
+        return False
+    compact = provider.compact is True or (provider.compact is None and not app.debug)
+    return compact and provider.ensure_ascii and provider.sort_keys
+
+def json_body(data):
+    """Corpo em bytes idêntico ao de `jsonify(data)`."""
+    app = current_app._get_current_object()
+    with phase('serialize'):
+        body = encode(data) if _uses_default_output(app) else None
+        if body is None:
+            body = app.json.response(data).get_data()
+    return body
+
+def json_response(data, status=200):
+    """Substituto de `jsonify(data)` pelo caminho rápido."""
+    return current_app.response_class(json_body(data), status=status, mimetype=current_app.json.mimetype)
+
+def stdlib_encode(data):
+    """Mesma saída de `encode` com o json da stdlib (usado fora de uma aplicação Flask)."""
+    return (json.dumps(data, ensure_ascii=True, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
@@ -0,0 +1,171 @@
+"""Logging estruturado e não bloqueante.
+
+As threads das requisições só colocam o registro numa fila limitada (`LOG_QUEUE_SIZE`); uma thread
+de fundo (`QueueListener`) monta o JSON e escreve no arquivo com rotação. Sob sobrecarga os registros
+abaixo de WARNING são amostrados (1 a cada `LOG_SAMPLE_RATE`) quando a fila passa da metade, e com
+a fila cheia qualquer registro é descartado; a quantidade descartada é registrada em seguida.
+Cada linha traz o request id (cabeçalho `X-Request-ID`), a rota e, no log de acesso, status e latência.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+REQUEST_FIELDS = ('request_id', 'method', 'route', 'status', 'latency_ms')
+
+class JSONFormatter(logging.Formatter):
+    """Uma linha JSON por registro (executado na thread do listener)."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'location': f'{record.pathname}:{record.lineno}',
+        }
+        for field in REQUEST_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Anexa request id, método e rota ao registro (roda na thread da requisição)."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = getattr(record, 'request_id', None) or g.get('request_id')
+            record.method = getattr(record, 'method', None) or request.method
+            record.route = getattr(record, 'route', None) or (request.url_rule.rule if request.url_rule else request.path)
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler que nunca bloqueia: amostra com a fila acima da metade e descarta com ela cheia."""
+
+    def __init__(self, log_queue, sample_rate=10):
+        super().__init__(log_queue)
+        self._lock = threading.Lock()
+        self.sample_rate = max(1, sample_rate)
+        self.sample_threshold = max(1, log_queue.maxsize // 2) if log_queue.maxsize else None
+        self._sampled = 0
+        self.dropped = 0 # Descartados desde o último aviso
+        self.dropped_total = 0
+
+    def prepare(self, record):
+        # Só resolve a mensagem (args no estilo %) e a exceção; o JSON é montado no listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+            self.dropped_total += 1
+
+    def enqueue(self, record):
+        if self.sample_threshold is not None and record.levelno < logging.WARNING \
+                and self.queue.qsize() >= self.sample_threshold:
+            with self._lock:
+                self._sampled += 1
+                keep = self._sampled % self.sample_rate == 0
+            if not keep:
+                self._drop()
+                return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop()
+            return
+        if self.dropped:
+            self._report_dropped()
+
+    def _report_dropped(self):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if not dropped:
+            return
+        notice = logging.LogRecord('structured_logging', logging.WARNING, __file__, 0,
+                                   "%d registros de log descartados por sobrecarga", (dropped,), None)
+        try:
+            self.queue.put_nowait(self.prepare(notice))
+        except queue.Full:
+            with self._lock:
+                self.dropped += dropped
+
+class LogPipeline:
+    """Fila, handler e listener ligados ao logger do app; `stop()` esvazia a fila e os remove."""
+
+    def __init__(self, logger, handler, listener, replaced=()):
+        self.logger = logger
+        self.handler = handler
+        self.listener = listener
+        self.replaced = list(replaced) # Handlers tirados do logger enquanto o pipeline está ativo
+
+    def stop(self):
+        if self.listener is not None:
+            self.logger.removeHandler(self.handler)
+            for handler in self.replaced:
+                self.logger.addHandler(handler)
+            self.listener.stop() # Processa o que restou na fila
+            self.listener.handlers[0].close()
+            self.listener = None
+
+def configure_logging(app):
+    """Request id em todas as respostas e, fora do debug e com `LOG_FILE` definido, o pipeline de log em arquivo."""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.log_start = time.perf_counter()
+
+    @app.after_request
+    def access_log(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+            if app.config.get('LOG_ACCESS', True):
+                latency_ms = round((time.perf_counter() - g.log_start) * 1000, 2)
+                app.logger.info("%s %s %s %.2fms", request.method, request.path, response.status_code, latency_ms,
+                                extra={'status': response.status_code, 'latency_ms': latency_ms})
+        return response
+
+    log_file = app.config.get('LOG_FILE')
+    if app.debug or not log_file:
+        return None
+
+    directory = os.path.dirname(os.path.abspath(log_file))
+    os.makedirs(directory, exist_ok=True)
+    file_handler = RotatingFileHandler(log_file, maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+                                       backupCount=app.config.get('LOG_BACKUP_COUNT', 5), encoding='utf-8')
+    file_handler.setFormatter(JSONFormatter())
+    log_queue = queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000))
+    queue_handler = DroppingQueueHandler(log_queue, app.config.get('LOG_SAMPLE_RATE', 10))
+    queue_handler.addFilter(RequestContextFilter())
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+
+    # O handler padrão do Flask escreve no stderr na thread da requisição: com o pipeline, só a fila
+    replaced = [default_handler] if default_handler in app.logger.handlers else []
+    for handler in replaced:
+        app.logger.removeHandler(handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    pipeline = LogPipeline(app.logger, queue_handler, listener, replaced)
+    app.extensions['log_pipeline'] = pipeline
+    atexit.register(pipeline.stop)
+    return pipeline
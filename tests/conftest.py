@@ -2,9 +2,16 @@ import pytest
 from app import create_app
 from models import db, User, bcrypt_obj
 from config import TestConfig
+from routes import limiter
+from caching import cache, identity_cache
+from blocklist import token_blocklist
 import os
-from sqlalchemy import text
-import sys
+import sqlite3
+from sqlalchemy import text, insert
+import hashing
+
+# Usuários gerados no banco grande (`large_client`), para testes de desempenho
+LARGE_DATASET_USERS = int(os.environ.get('TEST_LARGE_DATASET_USERS', 10000))
 
 
 @pytest.fixture(scope='session')
@@ -18,12 +25,14 @@ def app():
         yield app
         db.drop_all()
 
-@pytest.fixture(scope='function')
-def client(app):
+def build_template(app, generated_users=0):
     """
-    Cria um cliente de teste
+    Monta o banco de teste uma vez (tabelas, dump, usuário de teste e `generated_users` usuários extras)
+    e devolve uma cópia dele num SQLite em memória separado, restaurada a cada teste por `restore_template`.
+    Cada worker do pytest-xdist é um processo com seu próprio banco em memória, então não há disputa.
     """
     with app.app_context():
+        db.session.remove()
         db.drop_all()
         db.create_all()
 
@@ -31,61 +40,91 @@ def client(app):
         if os.path.exists(dump_file_path):
             with open(dump_file_path, 'r') as f:
                 sql_script = f.read()
-            
+
             # Arquivo .sql está separando os comandos por ; para facilitar a depuração
             statements = [s.strip() for s in sql_script.split(';') if s.strip()]
-            
             for statement in statements:
-                try:
-                    db.session.execute(text(statement))
-                except Exception as e:
-                    raise 
-            
-            db.session.commit()
-        
-        test_user = User.query.filter_by(email='test@example.com').first()
-        if not test_user:
-            test_user = User(name='Test User', email='test@example.com')
-            test_user.set_password('password')
-            db.session.add(test_user)
-            db.session.commit()
-        else:
-            print("conftest.py: client fixture - test_user já existe", file=sys.stderr)
+                db.session.execute(text(statement))
 
+        test_user = User(name='Test User', email='test@example.com')
+        test_user.set_password('password')
+        db.session.add(test_user)
 
-        yield app.test_client() # Retorna o cliente de teste
+        if generated_users:
+            # Um hash só para todos: o bcrypt não é o que se mede com esses dados
+            password_hash = hashing.hash_password('password')
+            db.session.execute(insert(User), [
+                {'name': f'Usuário Gerado {index:06d}', 'email': f'gerado{index:06d}@example.com', 'password_hash': password_hash}
+                for index in range(generated_users)])
+        db.session.commit()
+
+        template = sqlite3.connect(':memory:', check_same_thread=False)
+        live = db.engine.raw_connection()
+        try:
+            live.driver_connection.backup(template)
+        finally:
+            live.close()
+        return template
+
+def restore_template(app, template):
+    """
+    Substitui o banco em memória do app pela cópia do template (API de backup do SQLite, página a página),
+    no lugar de drop_all/create_all e da execução do dump a cada teste
+    """
+    limiter.reset() # Zera os contadores do rate limit entre os testes
+    cache.clear() # O banco é restaurado, então as respostas em cache ficam obsoletas
+    identity_cache.clear()
+    token_blocklist.clear() # A tabela de revogações é restaurada
+    with app.app_context():
+        db.session.remove()
+        live = db.engine.raw_connection()
+        try:
+            template.backup(live.driver_connection)
+        finally:
+            live.close()
+
+@pytest.fixture(scope='session')
+def template(app):
+    """
+    Banco com o dump e o usuário de teste, montado uma vez por sessão
+    """
+    template = build_template(app)
+    yield template
+    template.close()
+
+@pytest.fixture(scope='session')
+def large_template(app):
+    """
+    Banco com o dump e mais LARGE_DATASET_USERS usuários gerados, montado uma vez por sessão (só se usado)
+    """
+    template = build_template(app, LARGE_DATASET_USERS)
+    yield template
+    template.close()
 
 @pytest.fixture(scope='function')
-def auth_client(app):
+def client(app, template):
     """
-    Cria um cliente de teste autenticado
+    Cria um cliente de teste
     """
+    restore_template(app, template)
     with app.app_context():
-        db.drop_all()
-        db.create_all()
-        dump_file_path = os.path.join(os.path.dirname(__file__), 'test_data_dump.sql')
-        if os.path.exists(dump_file_path):
-            with open(dump_file_path, 'r') as f:
-                sql_script = f.read()
-            
-            statements = [s.strip() for s in sql_script.split(';') if s.strip()]
-            for statement in statements:
-                try:
-                    db.session.execute(text(statement))
-                except Exception as e:
-                    raise
+        yield app.test_client() # Retorna o cliente de teste
 
-            db.session.commit()
-        
-        test_user = User.query.filter_by(email='test@example.com').first()
-        if not test_user:
-            test_user = User(name='Test User', email='test@example.com')
-            test_user.set_password('password')
-            db.session.add(test_user)
-            db.session.commit()
-        else:
-            print("conftest.py: auth_client fixture - test_user já existe", file=sys.stderr)
+@pytest.fixture(scope='function')
+def large_client(app, large_template):
+    """
+    Cria um cliente de teste sobre o banco com muitos usuários
+    """
+    restore_template(app, large_template)
+    with app.app_context():
+        yield app.test_client()
 
+@pytest.fixture(scope='function')
+def auth_client(app, template):
+    """
+    Cria um cliente de teste autenticado
+    """
+    restore_template(app, template)
     with app.test_client() as client:
         response = client.post('/login', json={'email': 'test@example.com', 'password': 'password'})
         if response.status_code != 200:
@@ -0,0 +1,239 @@
+import json
+import os
+import subprocess
+import sys
+from app import create_app, bootstrap_database
+from config import TestConfig
+from models import db, read_sqlite_pragmas
+
+def test_sqlite_production_profile(tmp_path):
+    """Testa o perfil "production" do engine SQLite num banco em arquivo (WAL, pragmas e pool)."""
+    config = type('ProfileTestConfig', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'profile.db'}",
+        'SQLITE_PROFILE': 'production'
+    })
+    app = create_app(config_object=config)
+    applied = app.extensions['sqlite_profile']
+    assert applied['profile'] == 'production'
+    assert applied['engine_options']['pool_pre_ping'] is True
+
+    with app.app_context():
+        assert db.engine.pool.size() == applied['engine_options']['pool_size']
+        with db.engine.connect() as connection:
+            effective = read_sqlite_pragmas(connection, applied['pragmas'])
+        db.engine.dispose()
+    assert effective['journal_mode'] == 'wal'
+    assert effective['synchronous'] == 1 # NORMAL
+    assert effective['busy_timeout'] == 5000
+
+    result = app.test_cli_runner().invoke(args=['db-profile'])
+    assert result.exit_code == 0
+    assert json.loads(result.output)['effective']['journal_mode'] == 'wal'
+
+def test_sqlite_profile_in_memory_skips_pool_options(app):
+    """Testa que o banco em memória dos testes não recebe opções de pool."""
+    assert app.extensions['sqlite_profile']['engine_options'] == {}
+
+def test_server_timing_header(client):
+    """Testa as fases do Server-Timing: argumentos, SQL (com contagem), serialização e bcrypt."""
+    response = client.get('/v1/users?per_page=2')
+    timing = response.headers['Server-Timing']
+    assert 'args;dur=' in timing
+    assert 'sql;dur=' in timing and 'desc="2 queries"' in timing # COUNT(*) + página
+    assert 'serialize;dur=' in timing
+    assert 'total;dur=' in timing
+
+    response = client.post('/login', json={'email': 'test@example.com', 'password': 'password'})
+    assert 'bcrypt;dur=' in response.headers['Server-Timing']
+
+def test_metrics_endpoint(auth_client):
+    """Testa os histogramas do /metrics rotulados pela rota do blueprint."""
+    auth_client.put('/v1/users/2', json={'name': 'Fulano Medido'})
+    auth_client.get('/v1/users/2')
+    response = auth_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_duration_seconds_count{endpoint="/v1/users/<int:user_id>",method="GET",status="200"}' in body
+    assert 'http_request_phase_seconds_bucket{endpoint="/v1/users/<int:user_id>",method="PUT",phase="jwt",le="+Inf"}' in body
+    assert 'http_request_sql_queries_count{endpoint="/v1/users/<int:user_id>",method="PUT"}' in body
+
+def test_structured_access_log(tmp_path):
+    """Testa o log JSON escrito pela thread de fundo com request id, rota, status e latência."""
+    log_file = tmp_path / 'app.log'
+    config = type('LogTestConfig', (TestConfig,), {'LOG_FILE': str(log_file)})
+    app = create_app(config_object=config)
+    bootstrap_database(app)
+    pipeline = app.extensions['log_pipeline']
+    assert app.logger.handlers == [pipeline.handler] # Nada escrito de forma síncrona na thread da requisição
+    try:
+        response = app.test_client().get('/v1/users/1', headers={'X-Request-ID': 'req-123'})
+        assert response.headers['X-Request-ID'] == 'req-123'
+    finally:
+        app.extensions['log_pipeline'].stop() # Esvazia a fila e remove o handler do logger
+    records = [json.loads(line) for line in log_file.read_text(encoding='utf-8').splitlines()]
+    access = [record for record in records if record.get('request_id') == 'req-123' and 'status' in record]
+    assert len(access) == 1
+    assert access[0]['route'] == '/v1/users/<int:user_id>'
+    assert access[0]['status'] == 200
+    assert access[0]['latency_ms'] >= 0
+
+def test_log_queue_drops_under_overload():
+    """Testa que o handler descarta (sem bloquear) com a fila cheia e avisa a quantidade depois."""
+    import logging
+    import queue
+    from structured_logging import DroppingQueueHandler
+    log_queue = queue.Queue(maxsize=4)
+    handler = DroppingQueueHandler(log_queue, sample_rate=2)
+    logger = logging.getLogger('test_log_queue_drops')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for index in range(20):
+            logger.warning("registro %d", index)
+        assert log_queue.qsize() == 4
+        assert handler.dropped_total == 16
+
+        while not log_queue.empty():
+            log_queue.get_nowait()
+        logger.warning("depois da sobrecarga")
+        messages = [log_queue.get_nowait().getMessage() for _ in range(log_queue.qsize())]
+        assert messages == ["depois da sobrecarga", "16 registros de log descartados por sobrecarga"]
+    finally:
+        logger.removeHandler(handler)
+
+def test_create_app_does_not_touch_database(tmp_path):
+    """Testa que o create_app() não abre conexões: tabelas e usuário de teste só no bootstrap."""
+    db_path = tmp_path / 'fresh.db'
+    config = type('FreshTestConfig', (TestConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}"})
+    app = create_app(config_object=config)
+    assert not db_path.exists()
+
+    result = app.test_cli_runner().invoke(args=['bootstrap'])
+    assert result.exit_code == 0
+    response = app.test_client().post('/login', json={'email': 'test@example.com', 'password': 'password'})
+    assert response.status_code == 200
+    with app.app_context():
+        db.engine.dispose()
+
+def test_worker_startup_time():
+    """Testa a partida de um worker num processo novo (benchmarks/bench_startup.py) contra limites folgados."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, os.path.join(root, 'benchmarks', 'bench_startup.py'), '--runs', '1', '--json'],
+                            cwd=root, check=True, capture_output=True, text=True).stdout
+    run = json.loads(output)['runs'][0]
+    assert run['status'] == 200
+    assert run['factory_connects'] == 0
+    assert run['import_s'] < 10
+    assert run['create_app_s'] < 2
+    assert run['first_request_s'] < 2
+
+def test_read_replica_routing(tmp_path):
+    """Testa as réplicas de leitura: GET lê do snapshot, quem acabou de escrever lê do primário e o
+    `flask replica-snapshot` atualiza a cópia."""
+    config = type('ReplicaTestConfig', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+        'SQLALCHEMY_REPLICA_URIS': [f"sqlite:///{tmp_path / 'replica.db'}"],
+    })
+    app = create_app(config_object=config)
+    bootstrap_database(app)
+    runner = app.test_cli_runner()
+    with app.app_context():
+        assert runner.invoke(args=['replica-snapshot']).exit_code == 0
+
+    writer = app.test_client()
+    token = writer.post('/login', json={'email': 'test@example.com', 'password': 'password'}).json['access_token']
+    writer.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    assert writer.put('/v1/users/1', json={'name': 'Primário', 'email': 'test@example.com'}).status_code == 200
+    assert writer.get('/v1/users/1').json['name'] == 'Primário' # Preso ao primário depois da escrita
+
+    reader = app.test_client()
+    reader.environ_base['REMOTE_ADDR'] = '10.0.0.2' # Outro cliente (o login do writer prende o IP dele)
+    assert reader.get('/v1/users?per_page=5').json['items'][0]['name'] == 'Test User' # Snapshot anterior
+    with app.app_context():
+        result = runner.invoke(args=['replica-snapshot'])
+    assert result.exit_code == 0 and '1 réplica(s) atualizada(s)' in result.output
+    app.extensions['replicas']['replica0'].dispose() # Em produção as conexões são recicladas (REPLICA_POOL_RECYCLE)
+    assert reader.get('/v1/users?per_page=6').json['items'][0]['name'] == 'Primário'
+    app.extensions['replicas']['replica0'].dispose()
+    with app.app_context():
+        db.engine.dispose()
+
+def test_read_replica_cache_read_your_writes(tmp_path):
+    """Testa que uma resposta lida da réplica por outro cliente não chega, pelo cache, a quem acabou de escrever."""
+    config = type('ReplicaCacheTestConfig', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+        'SQLALCHEMY_REPLICA_URIS': [f"sqlite:///{tmp_path / 'replica.db'}"],
+    })
+    app = create_app(config_object=config)
+    bootstrap_database(app)
+    with app.app_context():
+        assert app.test_cli_runner().invoke(args=['replica-snapshot']).exit_code == 0
+
+    writer = app.test_client()
+    token = writer.post('/login', json={'email': 'test@example.com', 'password': 'password'}).json['access_token']
+    writer.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    assert writer.put('/v1/users/1', json={'name': 'Primário', 'email': 'test@example.com'}).status_code == 200
+
+    reader = app.test_client()
+    reader.environ_base['REMOTE_ADDR'] = '10.0.0.2'
+    stale = reader.get('/v1/users/1') # Réplica ainda sem a escrita: vai para o cache das réplicas
+    assert stale.json['name'] == 'Test User' and stale.headers['X-Cache'] == 'MISS'
+    fresh = writer.get('/v1/users/1')
+    assert fresh.json['name'] == 'Primário' and fresh.headers['ETag'] == '"2"'
+    assert reader.get('/v1/users/1').headers['X-Cache'] == 'HIT'
+    app.extensions['replicas']['replica0'].dispose()
+    with app.app_context():
+        db.engine.dispose()
+
+def test_bootstrap_adds_user_autoincrement(tmp_path):
+    """Testa a migração de um banco antigo (sem AUTOINCREMENT nem version_id) pelo `bootstrap_database`."""
+    import sqlite3
+    db_path = tmp_path / 'legacy.db'
+    legacy = sqlite3.connect(db_path)
+    legacy.executescript(
+        "CREATE TABLE user (id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, email VARCHAR(120) NOT NULL, "
+        "password_hash VARCHAR(128) NOT NULL, PRIMARY KEY (id), UNIQUE (email));"
+        "INSERT INTO user (name, email, password_hash) VALUES ('Antigo Um', 'um@example.com', 'x'), ('Antigo Dois', 'dois@example.com', 'x');")
+    legacy.close()
+    config = type('LegacyTestConfig', (TestConfig,), {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    app = create_app(config_object=config)
+    bootstrap_database(app)
+    bootstrap_database(app) # Idempotente
+
+    client = app.test_client()
+    assert client.get('/v1/users?name=Antigo').json['total_items'] == 2 # Índice de busca e contador
+    assert client.get('/v1/users/3').json['email'] == 'test@example.com'
+    with app.app_context():
+        with db.engine.begin() as connection:
+            assert 'AUTOINCREMENT' in connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'user'").scalar()
+            assert connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'ix_user_name'").first()
+            connection.exec_driver_sql("DELETE FROM user WHERE id = 3")
+            new_id = connection.exec_driver_sql(
+                "INSERT INTO user (name, email, password_hash) VALUES ('Novo', 'novo@example.com', 'x') RETURNING id").scalar()
+        db.engine.dispose()
+    assert new_id == 4
+
+def test_bootstrap_adds_missing_user_indexes(tmp_path):
+    """Testa que o `bootstrap_database` cria o índice de `name` (cursor com sort_by=name) num banco que não o tem."""
+    config = type('IndexTestConfig', (TestConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'index.db'}"})
+    app = create_app(config_object=config)
+    bootstrap_database(app)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("DROP INDEX ix_user_name")
+    bootstrap_database(app)
+    with app.app_context():
+        with db.engine.connect() as connection:
+            plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN SELECT id FROM user ORDER BY name, id LIMIT 10").all()
+        db.engine.dispose()
+    assert any('ix_user_name' in row[-1] for row in plan)
+
+def test_openapi_list_response_has_no_input_cursor(client):
+    """Testa que o modelo de resposta da listagem traz só o `next_cursor` (o `cursor` é parâmetro de entrada)."""
+    spec = client.get('/openapi.json').json
+    properties = spec['components']['schemas']['PaginatedUser']['properties']
+    assert 'next_cursor' in properties and 'cursor' not in properties
+    parameters = [parameter['name'] for parameter in spec['paths']['/v1/users']['get']['parameters']]
+    assert {'cursor', 'sort_by', 'order'} <= set(parameters)
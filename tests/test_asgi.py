@@ -0,0 +1,67 @@
+import pytest
+from starlette.testclient import TestClient
+from app import create_app, bootstrap_database
+from asgi import create_asgi_app
+from config import TestConfig
+from blocklist import token_blocklist
+
+@pytest.fixture
+def asgi_client(tmp_path):
+    """
+    Cria um cliente do modo ASGI sobre um banco em arquivo preparado pelo app Flask
+    """
+    config = type('AsgiTestConfig', (TestConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'asgi.db'}"})
+    bootstrap_database(create_app(config_object=config)) # Cria as tabelas e o usuário de teste
+    token_blocklist.clear() # Banco novo: a sincronização recomeça do id 0
+    with TestClient(create_asgi_app(config)) as client:
+        yield client
+
+def login(client):
+    response = client.post('/login', json={'email': 'test@example.com', 'password': 'password'})
+    assert response.status_code == 200
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+def test_asgi_crud(asgi_client):
+    """Testa o ciclo completo de criação, leitura, atualização e exclusão no modo ASGI."""
+    headers = login(asgi_client)
+    response = asgi_client.post('/v1/users', json={'name': 'Async', 'email': 'async@example.com', 'password': 'asyncpass'}, headers=headers)
+    assert response.status_code == 201
+    user_id = response.json()['id']
+
+    response = asgi_client.put(f'/v1/users/{user_id}', json={'name': 'Async Atualizado'}, headers=headers)
+    assert response.json() == {'id': user_id, 'name': 'Async Atualizado', 'email': 'async@example.com'}
+    assert response.headers['ETag'] == '"2"'
+    assert asgi_client.get(f'/v1/users/{user_id}').json()['name'] == 'Async Atualizado'
+    assert asgi_client.get(f'/v1/users/{user_id}', headers={'If-None-Match': '"2"'}).status_code == 304
+
+    stale = dict(headers, **{'If-Match': '"1"'})
+    assert asgi_client.put(f'/v1/users/{user_id}', json={'name': 'X'}, headers=stale).status_code == 412
+    assert asgi_client.delete(f'/v1/users/{user_id}', headers=dict(headers, **{'If-Match': '"2"'})).status_code == 204
+    response = asgi_client.get(f'/v1/users/{user_id}')
+    assert response.status_code == 404
+    assert response.json() == {'message': 'Recurso não encontrado', 'code': 404}
+
+def test_asgi_list_and_errors(asgi_client):
+    """Testa a listagem paginada e os payloads de erro iguais aos da API Flask."""
+    response = asgi_client.get('/v1/users?per_page=5')
+    assert response.json()['total_items'] == 1
+    assert response.json()['items'][0]['email'] == 'test@example.com'
+
+    assert asgi_client.get('/v1/users?per_page=0').status_code == 422
+    response = asgi_client.post('/v1/users', json={'name': 'Sem Token', 'email': 'x@example.com', 'password': 'segredo'})
+    assert response.status_code == 401
+    assert response.json()['message'] == 'Autenticação inválida'
+    response = asgi_client.post('/v1/users', json={'name': 'Dup', 'email': 'test@example.com', 'password': 'segredo'}, headers=login(asgi_client))
+    assert response.status_code == 409
+    assert response.json()['message'] == 'Um usuário com este e-mail já existe'
+
+def test_asgi_list_query_parity(asgi_client, tmp_path):
+    """Testa que a listagem responde igual nos dois modos, inclusive com parâmetros de query desconhecidos."""
+    config = type('AsgiParityConfig', (TestConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'asgi.db'}"})
+    flask_client = create_app(config_object=config).test_client()
+    for path in ('/v1/users?per_page=5&_=1700000000', '/v1/users?sort_by=email&order=desc&nocache=x', '/v1/users?per_page=0&_=1'):
+        expected = flask_client.get(path)
+        response = asgi_client.get(path)
+        assert response.status_code == expected.status_code, path
+        if expected.status_code == 200:
+            assert response.json() == expected.json
@@ -0,0 +1,45 @@
+import multiprocessing
+import time
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+from limiter_storage import SQLiteStorage
+
+def _hit_many(uri, count, results):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    results.put(sum(limiter.hit(parse('100/minute'), 'shared') for _ in range(count)))
+
+def test_storage_registered_for_sqlite_scheme(tmp_path):
+    """Testa o registro do esquema sqlite:// e o compartilhamento dos contadores entre instâncias."""
+    uri = f"sqlite:///{tmp_path / 'limits.db'}"
+    first, second = storage_from_string(uri), storage_from_string(uri)
+    assert isinstance(first, SQLiteStorage)
+    item = parse('3/minute')
+    assert [FixedWindowRateLimiter(first).hit(item, 'ip') for _ in range(2)] == [True, True]
+    assert [FixedWindowRateLimiter(second).hit(item, 'ip') for _ in range(2)] == [True, False]
+    assert FixedWindowRateLimiter(first).get_window_stats(item, 'ip').remaining == 0
+    first.reset()
+    assert FixedWindowRateLimiter(second).get_window_stats(item, 'ip').remaining == 3
+
+def test_sliding_window_exact_across_processes(tmp_path):
+    """Testa que o limite é exato com vários processos disputando a mesma chave."""
+    uri = f"sqlite:///{tmp_path / 'limits.db'}"
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=_hit_many, args=(uri, 60, results)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    allowed = sum(results.get(timeout=30) for _ in processes)
+    for process in processes:
+        process.join()
+    assert allowed == 100
+
+def test_expired_keys_are_collected(tmp_path):
+    """Testa a remoção das chaves expiradas."""
+    storage = storage_from_string(f"sqlite:///{tmp_path / 'limits.db'}?gc_interval=0")
+    storage.incr('old', expiry=0.01)
+    time.sleep(0.02)
+    assert storage.get('old') == 0
+    storage.incr('new', expiry=60)
+    keys = [row[0] for row in storage._connection.execute("SELECT key FROM ratelimit_counter")]
+    assert keys == ['new']
@@ -1,6 +1,11 @@
 import pytest
-from models import db, User
+import bcrypt
+from models import db, User, RevokedToken
+from blocklist import token_blocklist
+from flask_jwt_extended import create_access_token, decode_token
+from hashing import hashing_pool
 import time
+import json
 
 def test_get_users_empty(client):
     """Testa se retorna uma lista vazia quando não há usuários (após o dump).
@@ -89,9 +94,10 @@ def test_get_users_sort_email_desc(client, auth_client):
     response = client.get('/v1/users?sort_by=email&order=desc')
     assert response.status_code == 200
     emails = [user['email'] for user in response.json['items']]
-    assert emails[0] == 'primeiro@example.com' 
-    assert emails[1] == 'fulano@example.com'
-    assert emails[2] == 'ciclana@example.com'
+    assert emails[0] == 'test@example.com'
+    assert emails[1] == 'primeiro@example.com'
+    assert emails[2] == 'fulano@example.com'
+    assert emails[3] == 'ciclana@example.com'
 
 def test_login_success(client):
     """Testa o login com credenciais válidas (usuário do dump)."""
@@ -112,3 +118,558 @@ def test_rate_limit_get_users(client):
         response = client.get('/v1/users')
     assert response.status_code == 429 # Too Many Requests
 
+
+def test_get_users_cursor_pagination(client):
+    """Testa a paginação por cursor: percorre todas as páginas sem repetir usuários."""
+    response = client.get('/v1/users?cursor=&per_page=3')
+    assert response.status_code == 200
+    assert 'total_items' not in response.json
+    ids = [user['id'] for user in response.json['items']]
+    assert len(ids) == 3
+
+    response = client.get(f"/v1/users?per_page=3&cursor={response.json['next_cursor']}")
+    assert response.status_code == 200
+    ids += [user['id'] for user in response.json['items']]
+    assert ids == [1, 2, 3, 4] # 3 usuários do dump + usuário de teste
+    assert response.json['next_cursor'] is None
+
+def test_get_users_cursor_sorted_by_name(client):
+    """Testa a paginação por cursor ordenada por nome, nos dois sentidos."""
+    for order in ('asc', 'desc'):
+        names, cursor = [], ''
+        while cursor is not None:
+            page = client.get(f'/v1/users?cursor={cursor}&per_page=3&sort_by=name&order={order}').json
+            names += [user['name'] for user in page['items']]
+            cursor = page['next_cursor']
+        assert names == sorted(['Test User', 'Fulano de Tal', 'Ciclana Souza', 'Test User'], reverse=order == 'desc')
+
+    first = client.get('/v1/users?cursor=&per_page=2&sort_by=name').json
+    response = client.get(f"/v1/users?cursor={first['next_cursor']}&per_page=2&sort_by=name&order=desc")
+    assert response.status_code == 422 # Cursor emitido com order=asc
+
+def test_get_users_invalid_cursor(client):
+    """Testa a rejeição de um cursor malformado ou adulterado (422, não 500)."""
+    import base64
+    response = client.get('/v1/users?cursor=nao-e-um-cursor')
+    assert response.status_code == 422
+    for cursor in ({'sort_by': 'name', 'order': 'asc', 'value': [1, 2], 'id': 1},
+                   {'sort_by': 'name', 'order': 'asc', 'value': {'a': 1}, 'id': 1},
+                   {'sort_by': 'name', 'order': 'asc', 'value': None, 'id': 1},
+                   {'sort_by': 'id', 'order': 'asc', 'value': None, 'id': True},
+                   {'sort_by': 'id', 'order': 'asc', 'value': 'x', 'id': 1}):
+        token = base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode().rstrip('=')
+        response = client.get(f"/v1/users?cursor={token}&sort_by={cursor['sort_by']}")
+        assert response.status_code == 422, cursor
+
+def test_get_users_filter_uses_search_index(client, auth_client):
+    """Testa a busca por substring (índice FTS5) sem diferenciar maiúsculas e após atualização."""
+    response = client.get('/v1/users?name=FULANO')
+    assert [user['id'] for user in response.json['items']] == [2]
+
+    auth_client.put('/v1/users/2', json={'name': 'Beltrano Souza', 'email': 'beltrano@example.com'})
+    response = client.get('/v1/users?name=fulano')
+    assert response.json['items'] == []
+    response = client.get('/v1/users?name=souza&email=example')
+    assert [user['id'] for user in response.json['items']] == [2, 3]
+
+def test_get_single_user_cache_invalidation(client, auth_client):
+    """Testa o cache da leitura de usuário e sua invalidação após a atualização."""
+    assert client.get('/v1/users/2').headers['X-Cache'] == 'MISS'
+    response = client.get('/v1/users/2')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.json['name'] == 'Fulano de Tal'
+
+    auth_client.put('/v1/users/2', json={'name': 'Fulano Atualizado'})
+    response = client.get('/v1/users/2')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json['name'] == 'Fulano Atualizado'
+    assert client.get('/cache/stats').json['responses']['hits'] >= 1
+
+def test_login_rehashes_outdated_cost(client):
+    """Testa a atualização transparente de um hash com custo antigo no login."""
+    with client.application.app_context():
+        user = User.query.filter_by(email='test@example.com').first()
+        user.password_hash = bcrypt.hashpw(b'password', bcrypt.gensalt(5)).decode('utf-8')
+        db.session.commit()
+
+    response = client.post('/login', json={'email': 'test@example.com', 'password': 'password'})
+    assert response.status_code == 200
+    with client.application.app_context():
+        user = User.query.filter_by(email='test@example.com').first()
+        assert not user.password_needs_rehash()
+        assert user.check_password('password')
+
+def test_login_hashing_backpressure(client, monkeypatch):
+    """Testa a resposta 503 quando a fila do pool de bcrypt está cheia."""
+    monkeypatch.setattr(hashing_pool, 'pending', 10**6)
+    response = client.post('/login', json={'email': 'test@example.com', 'password': 'password'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+def test_login_after_hashing_child_dies(client, monkeypatch):
+    """Testa que o pool de bcrypt é recriado quando um processo filho morre (OOM, sinal)."""
+    import os
+    import signal
+    monkeypatch.setitem(client.application.config, 'BCRYPT_POOL_SIZE', 2)
+    hashing_pool.shutdown()
+    credentials = {'email': 'test@example.com', 'password': 'password'}
+    assert client.post('/login', json=credentials).status_code == 200
+    broken = hashing_pool._executor
+    os.kill(next(iter(broken._processes)), signal.SIGKILL)
+    time.sleep(0.2) # O executor percebe a morte do filho e se marca como quebrado
+
+    assert client.post('/login', json=credentials).status_code == 200
+    assert hashing_pool._executor is not broken
+    assert client.post('/login', json=credentials).status_code == 200
+    deadline = time.monotonic() + 2
+    while hashing_pool.pending and time.monotonic() < deadline: # Os callbacks rodam na thread do executor
+        time.sleep(0.01)
+    assert hashing_pool.pending == 0 # Nem negativo: o limite de fila (503) continua valendo
+
+    hashing_pool._discard(hashing_pool._executor)
+    hashing_pool.pending = 1 # Tarefa do executor descartado, que ainda chamará `_release`
+    hashing_pool._get_executor(2)
+    assert hashing_pool.pending == 1 # O executor novo não zera o contador
+    hashing_pool.pending = 0
+    hashing_pool.shutdown()
+
+def test_identity_cache_invalidated_on_delete(auth_client):
+    """Testa o cache da identidade do JWT e sua invalidação quando o próprio usuário é excluído."""
+    with auth_client.application.app_context():
+        test_user_id = User.query.filter_by(email='test@example.com').first().id
+    assert auth_client.put('/v1/users/2', json={'name': 'Primeira Escrita'}).status_code == 200
+    assert auth_client.put('/v1/users/2', json={'name': 'Segunda Escrita'}).status_code == 200
+    assert auth_client.get('/cache/stats').json['identity']['hits'] >= 1
+
+    assert auth_client.delete(f'/v1/users/{test_user_id}').status_code == 204
+    response = auth_client.put('/v1/users/2', json={'name': 'Sem Dono'})
+    assert response.status_code == 401
+
+def test_identity_cache_shared_invalidation(auth_client):
+    """Testa que a exclusão feita por outro worker (só o token de geração compartilhado muda) derruba a identidade em cache."""
+    from caching import cache, _user_generation_key
+    assert auth_client.put('/v1/users/2', json={'name': 'Com Cache'}).status_code == 200
+    app = auth_client.application
+    with app.app_context():
+        db.session.execute(db.delete(User).filter_by(id=4)) # Escrita do outro worker
+        db.session.commit()
+        cache.set(_user_generation_key(4), 'outro-worker', timeout=0) # `invalidate_users` lá, sem tocar neste processo
+    assert auth_client.put('/v1/users/2', json={'name': 'Sem Dono'}).status_code == 401
+
+def test_bulk_import_ndjson(auth_client):
+    """Testa a importação em lote via NDJSON com linhas válidas, inválidas e duplicadas."""
+    body = '\n'.join([
+        '{"name": "Lote Um", "email": "lote1@example.com", "password": "senha123"}',
+        '{"name": "Lote Dois", "email": "invalido", "password": "senha123"}',
+        '{"name": "Repetido", "email": "fulano@example.com", "password": "senha123"}',
+        'isto não é json',
+        '{"name": "Lote Um Bis", "email": "lote1@example.com", "password": "senha123"}',
+    ])
+    response = auth_client.post('/v1/users/bulk', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.json['created'] == 1
+    assert [row['status'] for row in response.json['results']] == ['created', 'invalid', 'duplicate', 'invalid', 'duplicate']
+    with auth_client.application.app_context():
+        user = db.session.get(User, response.json['results'][0]['id'])
+        assert user.email == 'lote1@example.com'
+        assert user.check_password('senha123')
+
+def test_bulk_import_json_array(auth_client, monkeypatch):
+    """Testa a importação em lote via array JSON lido em vários blocos."""
+    monkeypatch.setattr('bulk.READ_SIZE', 16)
+    monkeypatch.setitem(auth_client.application.config, 'BULK_IMPORT_CHUNK_SIZE', 2)
+    rows = [{'name': f'Array {i}', 'email': f'array{i}@example.com', 'password': 'senha123'} for i in range(5)]
+    response = auth_client.post('/v1/users/bulk', json=rows)
+    assert response.status_code == 200
+    assert response.json['total'] == 5
+    assert response.json['created'] == 5
+    assert [row['index'] for row in response.json['results']] == [0, 1, 2, 3, 4]
+
+def test_export_users_ndjson_filtered(auth_client):
+    """Testa a exportação em NDJSON com os filtros da listagem."""
+    response = auth_client.get('/v1/users/export?email=example.com&name=a')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines == [
+        {'id': 2, 'name': 'Fulano de Tal', 'email': 'fulano@example.com'},
+        {'id': 3, 'name': 'Ciclana Souza', 'email': 'ciclana@example.com'},
+    ]
+
+def test_export_users_csv(auth_client):
+    """Testa a exportação completa em CSV."""
+    response = auth_client.get('/v1/users/export?format=csv')
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == 'id,name,email'
+    assert lines[1] == '1,Test User,primeiro@example.com'
+    assert len(lines) == 5 # Cabeçalho + 3 usuários do dump + usuário de teste
+
+def test_list_serialization_matches_jsonify(client, auth_client):
+    """Testa que o caminho rápido gera os mesmos bytes de PaginatedUserSchema + jsonify (inclusive fora do ASCII)."""
+    from flask import jsonify
+    from schemas import PaginatedUserSchema, UserSchema
+    auth_client.post('/v1/users', json={'name': 'Zoë Ç  del\x7f "aspas"', 'email': 'zoe@example.com', 'password': 'zoepassword'})
+
+    response = client.get('/v1/users?per_page=3&page=2')
+    with client.application.test_request_context():
+        pagination = db.paginate(db.select(User).order_by(User.id), page=2, per_page=3, error_out=False)
+        expected = jsonify(PaginatedUserSchema().dump({
+            'page': 2, 'per_page': 3, 'total_pages': pagination.pages,
+            'total_items': pagination.total, 'items': pagination.items
+        })).get_data()
+        expected_user = jsonify(UserSchema().dump(db.session.get(User, 5))).get_data()
+    assert response.data == expected
+    assert client.get('/v1/users/5').data == expected_user
+    assert client.get('/v1/users/1').data == client.get('/v1/users/1').data # MISS e HIT iguais
+
+def test_get_users_sparse_fields(client):
+    """Testa o parâmetro fields= nos dois modos de paginação e a rejeição de campos desconhecidos."""
+    from sqlalchemy import event
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    with client.application.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/v1/users?fields=id,email&per_page=2')
+    finally:
+        with client.application.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    assert [sorted(user) for user in response.json['items']] == [['email', 'id'], ['email', 'id']]
+    assert response.json['total_items'] == 4
+    assert not any('password_hash' in statement for statement in statements)
+
+    response = client.get('/v1/users?fields=email&cursor=&per_page=3')
+    assert [list(user) for user in response.json['items']] == [['email']] * 3
+    response = client.get(f"/v1/users?fields=email&per_page=3&cursor={response.json['next_cursor']}")
+    assert response.json['items'] == [{'email': 'test@example.com'}]
+
+    assert client.get('/v1/users?fields=id,password_hash').status_code == 422
+
+def test_get_single_user_etag_not_modified(client, auth_client):
+    """Testa o ETag da versão do usuário e o 304 com If-None-Match, inclusive após uma atualização."""
+    response = client.get('/v1/users/2')
+    version = response.headers['ETag']
+    assert version == '"1"'
+
+    response = client.get('/v1/users/2', headers={'If-None-Match': version})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == version
+
+    response = auth_client.put('/v1/users/2', json={'name': 'Fulano Atualizado'})
+    assert response.headers['ETag'] == '"2"'
+    response = client.get('/v1/users/2', headers={'If-None-Match': version})
+    assert response.status_code == 200
+    assert response.json['name'] == 'Fulano Atualizado'
+
+def test_update_user_if_match(auth_client):
+    """Testa a concorrência otimista: If-Match com versão antiga recebe 412 e a atual atualiza."""
+    response = auth_client.put('/v1/users/2', json={'name': 'Primeira'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+
+    response = auth_client.put('/v1/users/2', json={'name': 'Segunda'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 412
+    assert response.json['code'] == 412
+    assert auth_client.delete('/v1/users/2', headers={'If-Match': '"1"'}).status_code == 412
+    assert auth_client.put('/v1/users/99', json={'name': 'X'}, headers={'If-Match': '"1"'}).status_code == 404
+
+    assert auth_client.delete('/v1/users/2', headers={'If-Match': '"2"'}).status_code == 204
+
+def test_conditional_requests_after_recreate(auth_client):
+    """Testa que um id excluído não é reutilizado: ETags antigos não valem para o usuário criado depois."""
+    created = auth_client.post('/v1/users', json={'name': 'Efêmero', 'email': 'efemero@example.com', 'password': 'password'}).json['id']
+    assert auth_client.delete(f'/v1/users/{created}').status_code == 204 # Era o maior id
+    recreated = auth_client.put('/v1/users/by-email/outro@example.com', json={'name': 'Outro', 'password': 'password'})
+    assert recreated.status_code == 201 and recreated.json['id'] > created
+
+    assert auth_client.get(f'/v1/users/{created}', headers={'If-None-Match': '"1"'}).status_code == 404
+    assert auth_client.put(f'/v1/users/{created}', json={'name': 'X'}, headers={'If-Match': '"1"'}).status_code == 404
+    assert auth_client.get(f"/v1/users/{recreated.json['id']}").json['name'] == 'Outro'
+
+def test_update_user_duplicate_email(auth_client):
+    """Testa o 409 vindo do índice UNIQUE do e-mail na atualização (sem consulta prévia)."""
+    response = auth_client.put('/v1/users/2', json={'email': 'ciclana@example.com'})
+    assert response.status_code == 409
+    assert 'Um usuário com este e-mail já existe' in response.json['message']
+    assert auth_client.get('/v1/users/2').json['email'] == 'fulano@example.com'
+
+def test_batch_get_users(client, auth_client):
+    """Testa a leitura em lote: ordem dos ids pedidos, ids inexistentes e o cache compartilhado com GET /v1/users/<id>."""
+    client.get('/v1/users/3') # Usuário 3 no cache
+    auth_client.put('/v1/users/2', json={'name': 'Fulano Atualizado'}) # Usuário 2 invalidado
+    response = auth_client.post('/v1/users:batchGet', json={'ids': [3, 99, 1, 3, 2]})
+    assert response.status_code == 200
+    assert [item['id'] for item in response.json['items']] == [3, 1, 2]
+    assert response.json['items'][0] == {'id': 3, 'name': 'Ciclana Souza', 'email': 'ciclana@example.com'}
+    assert response.json['items'][2]['name'] == 'Fulano Atualizado'
+    assert response.json['missing'] == [99]
+    assert client.get('/cache/stats').json['responses']['hits'] >= 1
+
+    response = client.get('/v1/users/2') # Gravado pela leitura em lote
+    assert response.headers['X-Cache'] == 'HIT'
+    assert response.json['name'] == 'Fulano Atualizado'
+
+def test_batch_get_users_validation(auth_client, monkeypatch):
+    """Testa os limites da leitura em lote e o caminho sem cache (FileSystemCache)."""
+    assert auth_client.post('/v1/users:batchGet', json={'ids': []}).status_code == 422
+    assert auth_client.post('/v1/users:batchGet', json={'ids': list(range(1, 1002))}).status_code == 422
+    monkeypatch.setitem(auth_client.application.config, 'CACHE_TYPE', 'FileSystemCache')
+    response = auth_client.post('/v1/users:batchGet', json={'ids': [2, 1]})
+    assert [item['id'] for item in response.json['items']] == [2, 1]
+
+def test_get_users_total_from_counter(client, auth_client):
+    """Testa o total sem filtros vindo do contador mantido por triggers (ORM, SQL puro e exclusões)."""
+    with client.application.app_context():
+        assert db.session.execute(db.text("SELECT total FROM user_count")).scalar() == 4
+    auth_client.post('/v1/users', json={'name': 'Novo', 'email': 'novo@example.com', 'password': 'novapassword'})
+    auth_client.delete('/v1/users/3')
+    with client.application.app_context():
+        db.session.execute(db.text("INSERT INTO user (name, email, password_hash) VALUES ('SQL', 'sql@example.com', 'x')"))
+        db.session.commit()
+    response = client.get('/v1/users?per_page=2')
+    assert response.json['total_items'] == 5
+    assert response.json['total_pages'] == 3
+
+def test_get_users_count_modes(client, monkeypatch):
+    """Testa count=exact|estimate|none nas listagens filtradas."""
+    exact = client.get('/v1/users?email=example.com&count=exact').json
+    assert exact['total_items'] == 4
+    assert client.get('/v1/users?email=example.com&count=estimate').json['total_items'] == 4 # Amostra cobre a tabela
+    response = client.get('/v1/users?email=example.com&count=none').json
+    assert response['total_items'] is None and response['total_pages'] is None
+    assert len(response['items']) == 4
+
+    # Amostra de 2 linhas (ids 1 e 2, uma com "fulano"): 1 * 4 / 2
+    monkeypatch.setitem(client.application.config, 'COUNT_ESTIMATE_SAMPLE', 2)
+    assert client.get('/v1/users?email=fulano&count=estimate').json['total_items'] == 2
+    assert client.get('/v1/users?count=bogus').status_code == 422
+
+def test_add_user_email_normalized(auth_client):
+    """Testa a normalização do e-mail: o índice UNIQUE barra variações de maiúsculas (409) e o login as aceita."""
+    response = auth_client.post('/v1/users', json={'name': 'Caixa', 'email': ' Caixa@Example.COM ', 'password': 'caixapassword'})
+    assert response.status_code == 201
+    assert response.json['email'] == 'caixa@example.com'
+    assert response.headers['ETag'] == '"1"'
+
+    response = auth_client.post('/v1/users', json={'name': 'Outro', 'email': 'CAIXA@example.com', 'password': 'caixapassword'})
+    assert response.status_code == 409
+    assert 'Um usuário com este e-mail já existe' in response.json['message']
+    assert auth_client.post('/login', json={'email': 'Caixa@example.com', 'password': 'caixapassword'}).status_code == 200
+
+def test_upsert_user_by_email(auth_client):
+    """Testa o upsert idempotente por e-mail: 201 ao criar, 200 ao atualizar e If-Match com 412."""
+    payload = {'name': 'Upsert', 'password': 'upsertpassword'}
+    response = auth_client.put('/v1/users/by-email/Upsert@Example.com', json=payload)
+    assert response.status_code == 201
+    user_id = response.json['id']
+    assert response.json == {'id': user_id, 'name': 'Upsert', 'email': 'upsert@example.com'}
+
+    response = auth_client.put('/v1/users/by-email/upsert@example.com', json=dict(payload, name='Upsert 2'))
+    assert response.status_code == 200
+    assert response.json['id'] == user_id
+    assert response.headers['ETag'] == '"2"'
+    assert auth_client.get(f'/v1/users/{user_id}').json['name'] == 'Upsert 2'
+
+    stale = {'If-Match': '"1"'}
+    assert auth_client.put('/v1/users/by-email/upsert@example.com', json=payload, headers=stale).status_code == 412
+    assert auth_client.put('/v1/users/by-email/nobody@example.com', json=payload, headers=stale).status_code == 412
+    assert auth_client.put('/v1/users/by-email/upsert@example.com', json=payload, headers={'If-Match': '"2"'}).status_code == 200
+    assert auth_client.put('/v1/users/by-email/not-an-email', json=payload).status_code == 422
+    assert auth_client.put('/v1/users/by-email/x@example.com', json={'name': 'Sem senha'}).status_code == 422
+
+
+def test_user_changes_feed(auth_client):
+    """Testa o feed de alterações: cópia completa com since=0, lotes com next_since e uma entrada por usuário."""
+    response = auth_client.get('/v1/users/changes?since=0&limit=3')
+    assert response.status_code == 200
+    assert [item['id'] for item in response.json['items']] == [1, 2, 3]
+    assert response.json['has_more'] is True
+    assert response.json['items'][0] == {'seq': 1, 'op': 'insert', 'id': 1,
+                                         'user': {'id': 1, 'name': 'Test User', 'email': 'primeiro@example.com'}}
+    since = response.json['next_since']
+    response = auth_client.get(f'/v1/users/changes?since={since}')
+    assert [item['id'] for item in response.json['items']] == [4]
+    assert response.json['has_more'] is False
+    since = response.json['next_since']
+    assert since == response.json['latest_seq']
+
+    auth_client.put('/v1/users/2', json={'name': 'Fulano Atualizado', 'email': 'fulano_novo@example.com'})
+    auth_client.put('/v1/users/2', json={'name': 'Fulano de Novo', 'email': 'fulano_novo@example.com'})
+    auth_client.delete('/v1/users/3')
+    auth_client.put('/v1/users/by-email/feed@example.com', json={'name': 'Feed', 'password': 'feedpassword'})
+    items = auth_client.get(f'/v1/users/changes?since={since}').json['items']
+    assert [(item['id'], item['op']) for item in items] == [(2, 'update'), (3, 'delete'), (5, 'insert')]
+    assert items[0]['user']['name'] == 'Fulano de Novo'
+    assert items[1]['user'] is None
+
+    # Long-poll sem alterações termina no prazo, sem itens
+    latest = auth_client.get('/v1/users/changes').json['latest_seq']
+    start = time.perf_counter()
+    response = auth_client.get(f'/v1/users/changes?since={latest}&wait=0.3')
+    assert 0.25 <= time.perf_counter() - start < 2
+    assert response.json['items'] == [] and response.json['next_since'] == latest
+    assert auth_client.get('/v1/users/changes?wait=60').status_code == 422
+    assert auth_client.application.test_client().get('/v1/users/changes').status_code == 401
+
+def test_user_changes_long_poll_limits(auth_client, app, monkeypatch):
+    """Testa os limites do long-poll: sem vaga livre responde na hora; com vaga, espera no máximo CHANGES_MAX_WAIT."""
+    import threading
+    latest = auth_client.get('/v1/users/changes').json['latest_seq']
+    monkeypatch.setitem(app.extensions, 'change_waiters', threading.BoundedSemaphore(1))
+    app.extensions['change_waiters'].acquire() # A única vaga está ocupada
+    start = time.monotonic()
+    assert auth_client.get(f'/v1/users/changes?since={latest}&wait=20').json['items'] == []
+    assert time.monotonic() - start < 1
+    app.extensions['change_waiters'].release()
+
+    monkeypatch.setitem(app.config, 'CHANGES_MAX_WAIT', 0.2)
+    start = time.monotonic()
+    assert auth_client.get(f'/v1/users/changes?since={latest}&wait=20').json['items'] == []
+    assert 0.2 <= time.monotonic() - start < 2
+
+def test_user_changes_compaction(auth_client):
+    """Testa a compactação: entradas substituídas somem sem mudar o feed, e um since anterior às exclusões removidas recebe 410."""
+    auth_client.put('/v1/users/2', json={'name': 'Fulano Atualizado', 'email': 'fulano_novo@example.com'})
+    auth_client.delete('/v1/users/3')
+    before = auth_client.get('/v1/users/changes').json
+
+    result = auth_client.application.test_cli_runner().invoke(args=['compact-changes', '--retention', '-1'])
+    assert result.exit_code == 0, result.output
+    assert '3 entradas removidas' in result.output # Inserções de 2 e 3 substituídas e a exclusão de 3
+
+    after = auth_client.get('/v1/users/changes?since=0').json
+    assert [(item['id'], item['op']) for item in after['items']] == [(1, 'insert'), (4, 'insert'), (2, 'update')]
+    assert after['latest_seq'] == before['latest_seq']
+    response = auth_client.get('/v1/users/changes?since=4')
+    assert response.status_code == 410
+    assert response.json['min_since'] == 6
+    assert auth_client.get('/v1/users/changes?since=6').status_code == 200
+
+def test_bulk_update_and_delete_by_filter(auth_client, monkeypatch):
+    """Testa PATCH/DELETE /v1/users: dry_run, limite de linhas, versão incrementada e cache invalidado."""
+    assert auth_client.get('/v1/users/2').json['name'] == 'Fulano de Tal' # Preenche o cache
+    response = auth_client.patch('/v1/users?email=fulano&dry_run=true', json={'name': 'Coorte'})
+    assert response.status_code == 200
+    assert response.json == {'matched': 1, 'affected': 0, 'dry_run': True, 'ids': []}
+
+    response = auth_client.patch('/v1/users?ids=1,2', json={'name': 'Coorte'})
+    assert response.json == {'matched': 2, 'affected': 2, 'dry_run': False, 'ids': [1, 2]}
+    response = auth_client.get('/v1/users/2')
+    assert response.json['name'] == 'Coorte' and response.headers['ETag'] == '"2"'
+
+    monkeypatch.setitem(auth_client.application.config, 'BULK_WRITE_MAX_ROWS', 1)
+    assert auth_client.delete('/v1/users?name=Coorte').status_code == 422
+    assert auth_client.delete('/v1/users').status_code == 422 # Sem seleção
+    monkeypatch.setitem(auth_client.application.config, 'BULK_WRITE_MAX_ROWS', 1000)
+    response = auth_client.delete('/v1/users?name=Coorte&ids=2,3')
+    assert response.json == {'matched': 1, 'affected': 1, 'dry_run': False, 'ids': [2]}
+    assert auth_client.get('/v1/users/2').status_code == 404
+    assert auth_client.get('/v1/users').json['total_items'] == 3
+
+def test_bulk_write_begins_immediate(auth_client, app):
+    """Testa que a escrita em conjunto toma o lock de escrita (BEGIN IMMEDIATE) antes da contagem."""
+    from sqlalchemy import event
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(' '.join(statement.split()[:2]).upper())
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        assert auth_client.patch('/v1/users?ids=2,3', json={'name': 'Em Lote'}).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    begin = statements.index('BEGIN IMMEDIATE')
+    assert statements[begin + 1].startswith('SELECT') and statements[begin + 2].startswith('UPDATE')
+
+def test_logout_revokes_token(auth_client):
+    """Testa o /logout: o token usado deixa de valer e a verificação não consulta o banco a cada requisição."""
+    assert auth_client.post('/v1/users', json={'name': 'Antes', 'email': 'antes@example.com', 'password': 'antespassword'}).status_code == 201
+    response = auth_client.post('/logout')
+    assert response.status_code == 200
+    response = auth_client.post('/v1/users', json={'name': 'Depois', 'email': 'depois@example.com', 'password': 'depoispassword'})
+    assert response.status_code == 401
+    assert response.json['errors'] == "Seu token de autorização foi revogado."
+
+    with auth_client.application.app_context():
+        db.session.execute(db.delete(RevokedToken)) # Outro worker não enxerga a exclusão até a próxima sincronização...
+        db.session.commit()
+    assert auth_client.post('/logout').status_code == 401 # ...e a cópia em memória continua valendo
+
+def test_admin_revokes_user_tokens(auth_client, monkeypatch):
+    """Testa a revogação administrativa (por jti e por usuário), a sincronização incremental e a limpeza."""
+    app = auth_client.application
+    assert auth_client.post('/admin/tokens/revoke', json={'user_id': 2}).status_code == 403
+    monkeypatch.setitem(app.config, 'ADMIN_USER_IDS', ['4'])
+    assert auth_client.post('/admin/tokens/revoke', json={}).status_code == 422
+
+    with app.app_context():
+        victim = create_access_token(identity=2)
+    headers = {'Authorization': f'Bearer {victim}'}
+    assert auth_client.post('/v1/users:batchGet', json={'ids': [1]}, headers=headers).status_code == 200
+    response = auth_client.post('/admin/tokens/revoke', json={'user_id': 2})
+    assert response.status_code == 200 and response.json['user_id'] == 2
+    assert auth_client.post('/v1/users:batchGet', json={'ids': [1]}, headers=headers).status_code == 401
+
+    # Revogação gravada por outro worker: chega na próxima sincronização, lendo só as linhas novas
+    with app.app_context():
+        other = create_access_token(identity=3)
+        claims = decode_token(other)
+        revoke_row = RevokedToken(jti=claims['jti'], revoked_at=time.time(), expires_at=time.time() - 1)
+        db.session.add(revoke_row)
+        db.session.commit()
+        revoke_id = revoke_row.id
+    token_blocklist._next_sync = 0
+    headers = {'Authorization': f'Bearer {other}'}
+    assert auth_client.post('/v1/users:batchGet', json={'ids': [1]}, headers=headers).status_code == 200 # Já expirada: descartada
+    assert claims['jti'] not in token_blocklist.jtis and token_blocklist.last_id == revoke_id
+
+    result = app.test_cli_runner().invoke(args=['purge-revoked-tokens'])
+    assert result.exit_code == 0 and '1 revogações expiradas removidas' in result.output
+
+def test_large_dataset_listing(large_client):
+    """Testa a listagem sobre o banco grande (template montado uma vez por sessão): total, busca e páginas profundas."""
+    from conftest import LARGE_DATASET_USERS
+    response = large_client.get('/v1/users?per_page=100&page=50')
+    assert response.json['total_items'] == LARGE_DATASET_USERS + 4
+    assert len(response.json['items']) == 100
+    assert large_client.get('/v1/users?name=Gerado 00001').json['total_items'] == 10 # 000010 a 000019
+    first = large_client.get('/v1/users?cursor=&per_page=100&sort_by=name').json
+    second = large_client.get(f"/v1/users?cursor={first['next_cursor']}&per_page=100&sort_by=name").json
+    assert first['items'][-1]['name'] < second['items'][0]['name']
+
+def test_get_users_compression(client, auth_client):
+    """Testa a compressão negociada: gzip acima de COMPRESSION_MIN_SIZE, identidade abaixo e sem Accept-Encoding."""
+    import gzip
+    for index in range(20):
+        auth_client.post('/v1/users', json={'name': f'Comprimido {index}', 'email': f'comprimido{index}@example.com', 'password': 'password'})
+
+    plain = client.get('/v1/users?per_page=30')
+    assert 'Content-Encoding' not in plain.headers and 'Accept-Encoding' in plain.headers['Vary']
+    compressed = client.get('/v1/users?per_page=30', headers={'Accept-Encoding': 'gzip, br;q=0'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert len(compressed.data) < len(plain.data) and gzip.decompress(compressed.data) == plain.data
+    small = client.get('/v1/users?per_page=1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers # Abaixo do tamanho mínimo
+    assert 'Content-Encoding' not in client.get('/v1/users?per_page=30', headers={'Accept-Encoding': 'gzip;q=0'}).headers
+
+def test_get_users_streamed_page(large_client, monkeypatch):
+    """Testa que páginas acima de STREAM_MIN_PER_PAGE saem em stream com os mesmos bytes da página montada."""
+    import gzip
+    app = large_client.application
+    assert large_client.get('/v1/users?per_page=101').status_code == 401 # Acima de PUBLIC_MAX_PER_PAGE exige token
+    headers = {'Authorization': f'Bearer {create_access_token(identity=4)}'}
+
+    streamed = large_client.get('/v1/users?per_page=2000&page=2', headers=headers)
+    assert 'Content-Length' not in streamed.headers and len(streamed.json['items']) == 2000 and streamed.json['items'][0]['id'] == 2001
+    by_cursor = large_client.get('/v1/users?cursor=&per_page=1500&sort_by=email', headers=headers)
+    compressed = large_client.get('/v1/users?per_page=2000&page=2', headers=headers | {'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip' and gzip.decompress(compressed.data) == streamed.data
+
+    monkeypatch.setitem(app.config, 'STREAM_MIN_PER_PAGE', 10000)
+    buffered = large_client.get('/v1/users?per_page=2000&page=2', headers=headers)
+    assert 'Content-Length' in buffered.headers and buffered.data == streamed.data
+    assert large_client.get('/v1/users?cursor=&per_page=1500&sort_by=email', headers=headers).data == by_cursor.data